@@ -3,28 +3,218 @@ AI Handler Module
 Handles Gemini AI integration for general-purpose AI conversations
 """
 
+import asyncio
 import logging
+import re
+import time
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
+from cache import TTLCache
+import metrics
+import tracing
 
 logger = logging.getLogger(__name__)
 
+try:
+    from config import AI_CACHE_SIZE
+except ImportError:
+    AI_CACHE_SIZE = 1000  # Maximum number of cached answers
+
+try:
+    from config import AI_CACHE_TTL
+except ImportError:
+    AI_CACHE_TTL = 24 * 3600  # Seconds an answer stays valid
+
+try:
+    from config import AI_CACHE_MAX_BYTES
+except ImportError:
+    AI_CACHE_MAX_BYTES = 10 * 1024 * 1024  # Memory cap for cached answers
+
+try:
+    from config import AI_CACHE_FILE
+except ImportError:
+    AI_CACHE_FILE = "ai_cache.json"  # Set to None to keep the cache in memory only
+
+MODEL_NAME = 'gemini-pro'
+GEMINI_HOST = 'generativelanguage.googleapis.com'
+
+# Telegram allows 4096 characters per message; keep some room for closing fences
+MESSAGE_LIMIT = 4000
+
+# Minimum seconds between edits of a streaming reply (Telegram rate-limits edits)
+EDIT_INTERVAL = 1.0
+
+RESPONSE_HEADER = "🤖 **AI Response:**\n\n"
+
+# Long-lived Gemini model, configured once on first use
+_model = None
+
+# Answers keyed on the normalized query text
+answer_cache = TTLCache(
+    maxsize=AI_CACHE_SIZE,
+    ttl=AI_CACHE_TTL,
+    max_bytes=AI_CACHE_MAX_BYTES,
+    path=AI_CACHE_FILE
+)
+metrics.register_cache('ai_answers', answer_cache)
+
+
+def normalize_query(query):
+    """Normalize a query so trivially different phrasings share a cache entry"""
+    query = re.sub(r'\s+', ' ', query.casefold()).strip()
+    return query.rstrip('?!. ')
+
+
+def get_model():
+    """Return the shared Gemini model, configuring the SDK on first use"""
+    global _model
+    if _model is None:
+        import google.generativeai as genai
+        from config import GEMINI_API_KEY
+
+        genai.configure(api_key=GEMINI_API_KEY)
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+async def stream_answer(query):
+    """Yield the Gemini answer to query as text chunks arrive"""
+    start = time.perf_counter()
+    span = tracing.start_span(f"stream {GEMINI_HOST}", model=MODEL_NAME)
+    failed = True
+    try:
+        response = await get_model().generate_content_async(query, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. blocked by safety filters)
+                continue
+            if text:
+                yield text
+        failed = False
+    finally:
+        metrics.observe_upstream(GEMINI_HOST, time.perf_counter() - start, failed)
+        if span is not None:
+            if failed:
+                span.error = 'stream failed'
+            span.finish()
+
+
+def split_markdown(text, limit=MESSAGE_LIMIT):
+    """
+    Split text into a head that fits in one message and the remainder.
+
+    The cut is made at the last paragraph break, line break or space before
+    the limit. If the cut falls inside a ``` code block, the block is closed
+    in the head and reopened at the start of the remainder.
+    """
+    if len(text) <= limit:
+        return text, ''
+
+    window = text[:limit]
+    cut = window.rfind('\n\n')
+    if cut < limit // 2:
+        cut = window.rfind('\n')
+    if cut < limit // 2:
+        cut = window.rfind(' ')
+    if cut <= 0:
+        cut = limit
+
+    head, rest = text[:cut], text[cut:].lstrip('\n ')
+    fences = head.split('```')
+    if len(fences) % 2 == 0:
+        # Odd number of fences: reopen the block with its language tag
+        language = fences[-1].split('\n', 1)[0].strip()
+        head += '\n```'
+        rest = f"```{language}\n{rest}"
+    return head, rest
+
+
+class StreamingReply:
+    """A reply that is edited in place as the answer streams in"""
+
+    def __init__(self, message, header=RESPONSE_HEADER):
+        self.message = message
+        self.text = header
+        self.answer = ''
+        self._current = None
+        self._shown = ''
+        self._last_edit = 0.0
+
+    async def append(self, chunk):
+        """Add a chunk, moving full messages out and throttling edits"""
+        await self._add(chunk)
+        if time.monotonic() - self._last_edit >= EDIT_INTERVAL:
+            await self._show(self.text, final=False)
+
+    async def deliver(self, answer):
+        """Send a complete answer without intermediate edits"""
+        await self._add(answer)
+        await self.finish()
+
+    async def _add(self, chunk):
+        """Append text, sending every full message that overflows the limit"""
+        self.answer += chunk
+        self.text += chunk
+        while len(self.text) > MESSAGE_LIMIT:
+            head, self.text = split_markdown(self.text)
+            await self._show(head, final=True)
+            self._current = None
+            self._shown = ''
+
+    async def finish(self):
+        """Render the last message with Markdown formatting"""
+        await self._show(self.text, final=True)
+
+    async def _show(self, text, final):
+        """Send or edit the current message; partial text is sent unformatted"""
+        if not text.strip() or (not final and text == self._shown):
+            return
+        self._last_edit = time.monotonic()
+        try:
+            await self._send(text, 'Markdown' if final else None)
+        except RetryAfter as e:
+            if not final:
+                return
+            logger.warning(f"Rate limited while streaming AI response, waiting {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+            await self._send(text, 'Markdown')
+        except BadRequest:
+            if not final:
+                raise
+            # Unbalanced Markdown in the model output: fall back to plain text
+            await self._send(text, None)
+        self._shown = text
+
+    async def _send(self, text, parse_mode):
+        """Send the first message or edit the current one"""
+        if self._current is None:
+            self._current = await self.message.reply_text(text, parse_mode=parse_mode)
+        else:
+            try:
+                await self._current.edit_text(text, parse_mode=parse_mode)
+            except BadRequest as e:
+                if 'not modified' not in str(e).lower():
+                    raise
+
 
 async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle AI messages starting with @rbot"""
     try:
         if not update.message or not update.message.text:
             return
-        
+
         message_text = update.message.text.strip()
-        
+
         # Check if message starts with @rbot
         if not message_text.lower().startswith('@rbot'):
             return
-        
+
         # Extract the query (remove @rbot prefix)
         query = message_text[6:].strip()  # Remove '@rbot' (6 characters)
-        
+
         if not query:
             await update.message.reply_text(
                 "🤖 **AI Assistant**\n\n"
@@ -34,35 +224,30 @@ async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode='Markdown'
             )
             return
-        
+
+        reply = StreamingReply(update.message)
+
+        # Repeat questions are answered from the cache without an API call
+        cache_key = normalize_query(query)
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            await reply.deliver(cached)
+            return
+
         # Show typing indicator
         await update.message.chat.send_action(action="typing")
-        
+
         try:
-            import google.generativeai as genai
-            from config import GEMINI_API_KEY
-            
-            # Configure Gemini
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # Create model instance
-            model = genai.GenerativeModel('gemini-pro')
-            
-            # Generate response
-            response = model.generate_content(query)
-            
-            # Get the text response
-            ai_response = response.text
-            
-            # Limit response length (Telegram has a 4096 character limit per message)
-            if len(ai_response) > 4000:
-                ai_response = ai_response[:4000] + "\n\n... (response truncated)"
-            
-            await update.message.reply_text(
-                f"🤖 **AI Response:**\n\n{ai_response}",
-                parse_mode='Markdown'
-            )
-            
+            # Stream the answer, editing the reply as chunks arrive
+            async for chunk in stream_answer(query):
+                await reply.append(chunk)
+
+            if not reply.answer:
+                await update.message.reply_text("🤖 The AI returned an empty response. Please rephrase your question.")
+                return
+            await reply.finish()
+            answer_cache.set(cache_key, reply.answer)
+
         except ImportError:
             await update.message.reply_text(
                 "❌ Gemini AI not configured.\n"
@@ -75,9 +260,8 @@ async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"❌ Error getting AI response: {str(e)}\n\n"
                 "Please try again later."
             )
-            
+
     except Exception as e:
         logger.error(f"Error in AI handler: {e}")
         if update.message:
             await update.message.reply_text(f"❌ Error: {str(e)}")
-
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+"""
+Dispatch Benchmark
+Replays synthetic updates for every command, button and waiting_for state
+through the bot's registered handlers, with all upstream services stubbed
+locally, and reports throughput, latency percentiles and peak memory.
+
+    python benchmarks/bench_dispatch.py
+    python benchmarks/bench_dispatch.py --concurrency 1 16 64 --sessions 400
+    python benchmarks/bench_dispatch.py --compare benchmarks/results/<previous>.json
+
+Pings, sweeps, traceroutes and port checks go to loopback addresses, so they
+stay on this machine; benchmark users count as the owner so loopback is allowed.
+
+Upstream stubs:
+    HTTP       a local asyncio server; http_client requests are routed to it
+               and answered by original host with --upstream-latency delay
+    DNS        a local UDP nameserver answering every query with one
+               synthetic record after --upstream-latency
+    speedtest  a Python subprocess that sleeps for --speedtest-latency
+    Gemini     a stub model streaming chunks after --gemini-latency
+    Telegram   a Bot whose API calls return synthetic results after
+               --telegram-latency
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+BENCH_USER_BASE = 100000
+WOL_MAC = '00:1B:44:11:3A:B7'
+
+
+def install_config(db_file):
+    """
+    Provide a benchmark config module before the bot modules import it.
+
+    Real API keys are never used; caches, trace files and the offline IP
+    database are disabled so every run starts from the same state.
+    """
+    config = types.ModuleType('config')
+    config.BOT_TOKEN = '123456:BENCHMARK'
+    config.IPINFO_API_TOKEN = 'benchmark'
+    config.WEATHERAPI_KEY = 'benchmark'
+    config.GEMINI_API_KEY = 'benchmark'
+    # No benchmark user is authorized, and magic packets could only reach loopback anyway
+    config.ALLOWED_USER_ID = 1
+    config.WOL_BROADCASTS = ['127.0.0.1']
+    # The stub nameserver; its port is set on dns_resolver once it is listening
+    config.DNS_SERVERS = ['127.0.0.1']
+    config.AI_CACHE_SIZE = 1000
+    config.AI_CACHE_TTL = 86400
+    config.AI_CACHE_MAX_BYTES = 10 * 1024 * 1024
+    config.AI_CACHE_FILE = None
+    config.DB_FILE = db_file
+    config.IPDB_FILE = None
+    config.SPEEDTEST_CACHE_TTL = 0
+    config.TRACE_SLOW_MS = None
+    config.TRACE_SLOW_LOG_FILE = None
+    config.TRACE_SAMPLE_RATE = 0
+    config.TRACE_FILE = None
+    sys.modules['config'] = config
+
+
+# ---------------------------------------------------------------------------
+# Upstream HTTP stub
+# ---------------------------------------------------------------------------
+
+def _stub_response(host, path, query):
+    """Return (status, content_type, body) for a request to an upstream API"""
+    params = {name: values[0] for name, values in parse_qs(query).items()}
+    if host == 'ipinfo.io':
+        ip = path.strip('/').split('/')[0]
+        data = {
+            'ip': ip, 'city': 'Mountain View', 'region': 'California', 'country': 'US',
+            'postal': '94043', 'loc': '37.4056,-122.0775', 'org': 'AS15169 Google LLC',
+            'timezone': 'America/Los_Angeles',
+        }
+        return 200, 'application/json', json.dumps(data).encode()
+    if host == 'api.weatherapi.com':
+        data = {
+            'location': {'name': params.get('q', 'Bench City'), 'country': 'Benchland'},
+            'current': {
+                'last_updated_epoch': int(time.time()), 'temp_c': 21.0, 'temp_f': 69.8,
+                'feelslike_c': 21.0, 'feelslike_f': 69.8, 'condition': {'text': 'Sunny'},
+                'wind_kph': 9.0, 'wind_mph': 5.6, 'wind_dir': 'NE', 'humidity': 40,
+                'pressure_mb': 1015.0, 'vis_km': 10.0, 'uv': 5.0, 'dewpoint_c': 7.0,
+            },
+        }
+        return 200, 'application/json', json.dumps(data).encode()
+    if host == 'api.quotable.io':
+        count = int(params.get('limit', 1))
+        data = [{'content': f"Benchmark quote {n}.", 'author': 'Bench'} for n in range(count)]
+        return 200, 'application/json', json.dumps(data).encode()
+    return 404, 'text/plain', b'not found'
+
+
+class UpstreamStub:
+    """Local HTTP/1.1 server answering for every upstream API host"""
+
+    def __init__(self, latency, host_latency):
+        self.latency = latency
+        self.host_latency = host_latency
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._server.wait_closed(), 1)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0) or 0):
+                    await reader.readexactly(int(headers['content-length']))
+
+                host = headers.get('host', '').split(':')[0]
+                path, _, query = target.partition('?')
+                self.requests += 1
+                await asyncio.sleep(self.host_latency.get(host, self.latency))
+                status, content_type, body = _stub_response(host, path, query)
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+# DNS type -> synthetic answer RDATA (0xC00C points at the queried name)
+DNS_STUB_RDATA = {
+    1: socket.inet_pton(socket.AF_INET, '192.0.2.1'),
+    28: socket.inet_pton(socket.AF_INET6, '2001:db8::1'),
+    15: struct.pack('!H', 10) + b'\x04mail\xc0\x0c',
+    16: b'\x0bv=spf1 -all',
+    12: b'\xc0\x0c',
+}
+
+
+def _dns_stub_response(query):
+    """Answer a DNS query with one synthetic record (none for other types)"""
+    query_id = struct.unpack_from('!H', query)[0]
+    end = query.index(b'\x00', 12) + 5  # Question: name, type, class
+    qtype = struct.unpack_from('!H', query, end - 4)[0]
+    rdata = DNS_STUB_RDATA.get(qtype)
+    response = struct.pack('!HHHHHH', query_id, 0x8180, 1, 1 if rdata else 0, 0, 0) + query[12:end]
+    if rdata:
+        response += struct.pack('!HHHIH', 0xC00C, qtype, 1, 300, len(rdata)) + rdata
+    return response
+
+
+class NameserverStub(asyncio.DatagramProtocol):
+    """Local UDP nameserver answering every query after a delay"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.queries = 0
+        self.transport = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=('127.0.0.1', 0))
+        return self.transport.get_extra_info('sockname')[1]
+
+    def stop(self):
+        self.transport.close()
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, _dns_stub_response(data), addr)
+
+
+def make_transport(port):
+    """httpx transport that sends every request to the local stub, keeping its Host header"""
+    import httpx
+    import http_client
+
+    class StubTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self._transport = httpx.AsyncHTTPTransport(limits=http_client.POOL_LIMITS)
+
+        async def handle_async_request(self, request):
+            request.url = request.url.copy_with(scheme='http', host='127.0.0.1', port=port)
+            return await self._transport.handle_async_request(request)
+
+        async def aclose(self):
+            await self._transport.aclose()
+
+    return StubTransport()
+
+
+# ---------------------------------------------------------------------------
+# Gemini and Telegram stubs
+# ---------------------------------------------------------------------------
+
+class StubChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for the Gemini model: streams a fixed answer in chunks"""
+
+    def __init__(self, latency, chunks=5, chunk_delay=0.02):
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+
+    async def generate_content_async(self, query, stream=False):
+        await asyncio.sleep(self.latency)
+        return self._stream(query)
+
+    async def _stream(self, query):
+        for n in range(self.chunks):
+            if n:
+                await asyncio.sleep(self.chunk_delay)
+            yield StubChunk(f"Part {n + 1} of the answer to *{query[:40]}*.\n\n")
+
+
+def make_bot(latency):
+    """ExtBot whose Bot API calls are answered locally"""
+    from telegram.ext import ExtBot
+
+    class BenchmarkBot(ExtBot):
+        calls = 0
+        _message_id = 0
+
+        async def _post(self, endpoint, data=None, **kwargs):
+            BenchmarkBot.calls += 1
+            if latency:
+                await asyncio.sleep(latency)
+            data = data or {}
+            if endpoint == 'getMe':
+                return {
+                    'id': 123456, 'is_bot': True, 'first_name': 'Benchmark',
+                    'username': 'benchmark_bot', 'can_join_groups': True,
+                    'can_read_all_group_messages': False, 'supports_inline_queries': False,
+                }
+            if endpoint.startswith(('send', 'edit')):
+                BenchmarkBot._message_id += 1
+                chat_id = int(data.get('chat_id', 0) or 0)
+                return {
+                    'message_id': BenchmarkBot._message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'text': str(data.get('text', '')),
+                }
+            return True
+
+    return BenchmarkBot('123456:BENCHMARK')
+
+
+# ---------------------------------------------------------------------------
+# Synthetic updates
+# ---------------------------------------------------------------------------
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}
+
+
+def _message(user_id, text):
+    data = {
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': _user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        data['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return data
+
+
+def text_update(user_id, text):
+    return {'update_id': 0, 'message': _message(user_id, text)}
+
+
+def callback_update(user_id, data):
+    message = _message(user_id, 'menu')
+    message['from'] = {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark'}
+    return {
+        'update_id': 0,
+        'callback_query': {
+            'id': str(user_id), 'from': _user(user_id), 'chat_instance': 'bench',
+            'data': data, 'message': message,
+        },
+    }
+
+
+def _ip(n):
+    return f"8.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+# Scenario name -> function(user_id, n) returning the session's updates in order.
+# Arguments vary with n so cached lookups still reach the upstream stubs.
+SCENARIOS = {
+    'cmd_start': lambda u, n: [text_update(u, '/start')],
+    'cmd_help': lambda u, n: [text_update(u, '/help')],
+    'cmd_ping': lambda u, n: [text_update(u, f'/ping 127.0.{(n >> 8) & 255}.{n & 255 or 1}')],
+    'cmd_traceroute': lambda u, n: [text_update(u, f'/traceroute 127.2.{(n >> 8) & 255}.{n & 255 or 1}')],
+    'cmd_pingsweep': lambda u, n: [text_update(u, f'/pingsweep 127.6.{(n >> 6) & 255}.{(n & 63) * 4}/30')],
+    'cmd_portcheck': lambda u, n: [text_update(u, f'/portcheck 127.4.{(n >> 8) & 255}.{n & 255 or 1} 1-16')],
+    'cmd_dns': lambda u, n: [text_update(u, f'/dns host{n}.bench.example')],
+    'cmd_ipinfo': lambda u, n: [text_update(u, f'/ipinfo {_ip(n)}')],
+    'cmd_ipinfo_bulk': lambda u, n: [text_update(u, '/ipinfo ' + ' '.join(_ip(n * 8 + i) for i in range(8)))],
+    'cmd_speedtest': lambda u, n: [text_update(u, '/speedtest')],
+    'cmd_wol': lambda u, n: [text_update(u, f'/wol {WOL_MAC}')],
+    'cmd_wake_pc': lambda u, n: [text_update(u, f'/wake_pc {WOL_MAC}')],
+    'cmd_reminder': lambda u, n: [text_update(u, f'/reminder in 30 minutes Benchmark {n}')],
+    'cmd_reminders': lambda u, n: [text_update(u, '/reminders')],
+    'cmd_todo': lambda u, n: [
+        text_update(u, f'/todo add Benchmark task {n}'),
+        text_update(u, '/todo list'),
+        text_update(u, '/todo remove 1'),
+    ],
+    'cmd_weather': lambda u, n: [text_update(u, f'/weather City {n}')],
+    'cmd_weather_multi': lambda u, n: [text_update(u, f'/weather City {n}a; City {n}b; City {n}c')],
+    'cmd_quote': lambda u, n: [text_update(u, '/quote')],
+    'button_menus': lambda u, n: [
+        callback_update(u, 'network_tools'),
+        callback_update(u, 'productivity_tools'),
+        callback_update(u, 'main_menu'),
+        callback_update(u, 'cmd_todo'),
+    ],
+    'button_speedtest': lambda u, n: [callback_update(u, 'cmd_speedtest')],
+    'button_quote': lambda u, n: [callback_update(u, 'cmd_quote')],
+    'button_portcheck': lambda u, n: [callback_update(u, 'cmd_portcheck')],
+    'wait_ping': lambda u, n: [callback_update(u, 'cmd_ping'), text_update(u, f'127.1.{(n >> 8) & 255}.{n & 255 or 1}')],
+    'wait_traceroute': lambda u, n: [callback_update(u, 'cmd_traceroute'), text_update(u, f'127.3.{(n >> 8) & 255}.{n & 255 or 1}')],
+    'wait_portcheck': lambda u, n: [callback_update(u, 'cmd_portcheck'), text_update(u, f'127.5.{(n >> 8) & 255}.{n & 255 or 1} 22,80,443')],
+    'wait_ipinfo': lambda u, n: [callback_update(u, 'cmd_ipinfo'), text_update(u, _ip(n + 1000000))],
+    'wait_wol': lambda u, n: [callback_update(u, 'cmd_wol'), text_update(u, WOL_MAC)],
+    'wait_weather': lambda u, n: [callback_update(u, 'cmd_weather'), text_update(u, f'Town {n}')],
+    'wait_reminder': lambda u, n: [callback_update(u, 'cmd_reminder'), text_update(u, f'in 2 hours Benchmark {n}')],
+    'message_unknown': lambda u, n: [text_update(u, 'hello there')],
+    'message_ai': lambda u, n: [text_update(u, f'@rbot benchmark question {n}?')],
+}
+
+
+def build_sessions(count, offset, names):
+    """Return count sessions cycling through the scenarios, each for its own user"""
+    sessions = []
+    for n in range(count):
+        name = names[n % len(names)]
+        user_id = BENCH_USER_BASE + offset + n
+        sessions.append((name, SCENARIOS[name](user_id, offset + n)))
+    return sessions
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+async def run_level(application, sessions, concurrency, measure_memory):
+    """Replay sessions with the given number of concurrent workers"""
+    from telegram import Update
+
+    bot = application.bot
+    pending = iter(sessions)
+    latencies = []
+    by_scenario = {}
+
+    async def worker():
+        for name, updates in pending:
+            for data in updates:
+                update = Update.de_json(data, bot)
+                start = time.perf_counter()
+                await application.process_update(update)
+                elapsed = time.perf_counter() - start
+                latencies.append(elapsed)
+                by_scenario.setdefault(name, []).append(elapsed)
+
+    calls_before = type(bot).calls
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        'concurrency': concurrency,
+        'sessions': len(sessions),
+        'updates': len(latencies),
+        'seconds': round(seconds, 3),
+        'updates_per_sec': round(len(latencies) / seconds, 1) if seconds else 0.0,
+        **summarize(latencies),
+        'peak_memory_bytes': peak,
+        'telegram_calls': type(bot).calls - calls_before,
+        'by_scenario': {name: summarize(values) for name, values in sorted(by_scenario.items())},
+    }
+    del result['count']
+    return result
+
+
+async def run(args):
+    import logging
+    import bot as bot_module
+    import ai_handler
+    import dns_resolver
+    import http_client
+    import network_tools
+    import storage
+    from telegram.ext import Application
+    from quote_service import quote_service
+    from reminders import reminder_scheduler
+    from speedtest_service import speedtest_service
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    stub = UpstreamStub(args.upstream_latency, dict(args.latency))
+    port = await stub.start()
+    http_client.TRANSPORT = make_transport(port)
+    nameserver = NameserverStub(args.upstream_latency)
+    dns_resolver.DNS_PORT = await nameserver.start()
+    await http_client.close()
+    speedtest_service.commands = [[
+        sys.executable, '-c',
+        f"import time; time.sleep({args.speedtest_latency}); "
+        f"print('Ping: 10.0 ms\\nDownload: 100.00 Mbit/s\\nUpload: 50.00 Mbit/s')"
+    ]]
+    ai_handler._model = StubModel(args.gemini_latency)
+    # Loopback targets are only allowed for the owner; /wol keeps its own check
+    network_tools._is_owner = lambda user: user.id >= BENCH_USER_BASE
+
+    application = (
+        Application.builder()
+        .bot(make_bot(args.telegram_latency))
+        .concurrent_updates(True)
+        .updater(None)
+        .build()
+    )
+    bot_module.register_handlers(application)
+    await application.initialize()
+    await reminder_scheduler.start(application)
+    quote_service.start()
+
+    names = args.scenarios or list(SCENARIOS)
+    results = []
+    try:
+        # Warm-up pass: first-use imports, connections and the quote pool
+        await run_level(application, build_sessions(len(names), 0, names), 1, False)
+        offset = len(names)
+        for concurrency in args.concurrency:
+            sessions = build_sessions(max(args.sessions, concurrency), offset, names)
+            offset += len(sessions)
+            result = await run_level(application, sessions, concurrency, not args.no_memory)
+            results.append(result)
+            peak = result['peak_memory_bytes']
+            print(
+                f"concurrency {concurrency:>4}: {result['updates']:>6} updates in {result['seconds']:>7.2f}s  "
+                f"{result['updates_per_sec']:>8.1f} updates/s  p50 {result['p50_ms']:>8.2f} ms  "
+                f"p99 {result['p99_ms']:>8.2f} ms"
+                + (f"  peak {peak / 1024 / 1024:.1f} MiB" if peak is not None else "")
+            )
+    finally:
+        await quote_service.stop()
+        await reminder_scheduler.stop()
+        await application.shutdown()
+        await http_client.close()
+        await stub.stop()
+        nameserver.stop()
+        storage.close()
+
+    return results, stub.requests + nameserver.queries
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, results):
+    """Print throughput and p99 changes against an earlier results file"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {r['concurrency']: r for r in json.load(f)['results']}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        old = previous.get(result['concurrency'])
+        if old is None:
+            continue
+        throughput = (result['updates_per_sec'] / old['updates_per_sec'] - 1) * 100 if old['updates_per_sec'] else 0
+        p99 = (result['p99_ms'] / old['p99_ms'] - 1) * 100 if old['p99_ms'] else 0
+        print(f"concurrency {result['concurrency']:>4}: updates/s {throughput:+6.1f}%  p99 {p99:+6.1f}%")
+
+
+def parse_latency(value):
+    host, _, seconds = value.partition('=')
+    if not host or not seconds:
+        raise argparse.ArgumentTypeError("expected HOST=SECONDS")
+    return host, float(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot's update dispatch path")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64, 256],
+                        help="Concurrent update streams per level (default: 1 4 16 64 256)")
+    parser.add_argument('--sessions', type=int, default=520,
+                        help="Sessions replayed per level; each is one or more updates from one user")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS),
+                        help="Only replay these scenarios")
+    parser.add_argument('--upstream-latency', type=float, default=0.05,
+                        help="Seconds the HTTP stub waits before answering")
+    parser.add_argument('--latency', type=parse_latency, action='append', default=[],
+                        metavar='HOST=SECONDS', help="Per-host HTTP stub latency, e.g. ipinfo.io=0.2")
+    parser.add_argument('--speedtest-latency', type=float, default=0.5,
+                        help="Seconds the stub speedtest subprocess runs")
+    parser.add_argument('--gemini-latency', type=float, default=0.3,
+                        help="Seconds before the stub Gemini model starts streaming")
+    parser.add_argument('--telegram-latency', type=float, default=0.0,
+                        help="Seconds each stubbed Bot API call takes")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Skip tracemalloc (it slows dispatch down noticeably)")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--verbose', action='store_true', help="Keep the bot's log output")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory(prefix='rgpt-bench-') as tmp:
+        install_config(os.path.join(tmp, 'bench.db'))
+        results, upstream_requests = asyncio.run(run(args))
+
+    commit = git_commit()
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'sessions': args.sessions,
+            'scenarios': args.scenarios or list(SCENARIOS),
+            'upstream_latency': args.upstream_latency,
+            'host_latency': dict(args.latency),
+            'speedtest_latency': args.speedtest_latency,
+            'gemini_latency': args.gemini_latency,
+            'telegram_latency': args.telegram_latency,
+            'tracemalloc': not args.no_memory,
+        },
+        'upstream_requests': upstream_requests,
+        'results': results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'unknown'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,8 +4,14 @@ Telegram Bot - Network Tools & Productivity Tools
 Main bot file with command handlers and inline keyboards
 """
 
+import startup  # First, so startup time is measured from here
+import asyncio
+import functools
+import hmac
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import secrets
+import signal
+from telegram import Bot, Update
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -14,21 +20,25 @@ from telegram.ext import (
     ContextTypes,
     filters
 )
+startup.mark('import telegram')
 
-from network_tools import (
-    handle_ping,
-    handle_traceroute,
-    handle_ipinfo,
-    handle_speedtest,
-    handle_wol
-)
-from productivity_tools import (
-    handle_reminder,
-    handle_todo,
-    handle_weather,
-    handle_quote
-)
-from ai_handler import handle_ai_message
+# Importing the tool modules registers their tools (see registry.py)
+from network_tools import handle_ipinfo_file
+import productivity_tools
+import registry
+from ai_handler import handle_ai_message, answer_cache, get_model
+import http_client
+import storage
+from persistence import SQLitePersistence
+from reminders import reminder_scheduler
+from quote_service import quote_service
+import keep_alive
+import ping
+import workers
+from metrics import instrument
+from tracing import traced
+from ratelimit import limited
+startup.mark('import modules')
 
 # Enable logging
 logging.basicConfig(
@@ -37,39 +47,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Registered tools apply their own rate limits; these handlers are not tools
+handle_ipinfo_file = limited('ipinfo', handle_ipinfo_file)
+handle_ai_message = limited('ai', handle_ai_message)
+
+# Serving mode: 'polling' (default) or 'webhook'
+try:
+    from config import BOT_MODE
+except ImportError:
+    BOT_MODE = 'polling'
 
-def get_main_menu_keyboard():
-    """Create the main menu inline keyboard"""
-    keyboard = [
-        [InlineKeyboardButton("🌐 Network Tools", callback_data="network_tools")],
-        [InlineKeyboardButton("📋 Productivity Tools", callback_data="productivity_tools")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_network_tools_keyboard():
-    """Create the Network Tools submenu keyboard"""
-    keyboard = [
-        [InlineKeyboardButton("📡 Ping", callback_data="cmd_ping")],
-        [InlineKeyboardButton("🛤️ Traceroute", callback_data="cmd_traceroute")],
-        [InlineKeyboardButton("📍 IP Info", callback_data="cmd_ipinfo")],
-        [InlineKeyboardButton("⚡ Speedtest", callback_data="cmd_speedtest")],
-        [InlineKeyboardButton("🔌 Wake-on-LAN", callback_data="cmd_wol")],
-        [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="main_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_productivity_tools_keyboard():
-    """Create the Productivity Tools submenu keyboard"""
-    keyboard = [
-        [InlineKeyboardButton("⏰ Reminder", callback_data="cmd_reminder")],
-        [InlineKeyboardButton("✅ Todo", callback_data="cmd_todo")],
-        [InlineKeyboardButton("🌤️ Weather", callback_data="cmd_weather")],
-        [InlineKeyboardButton("💬 Quote", callback_data="cmd_quote")],
-        [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="main_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+# Webhook settings: Telegram posts updates to WEBHOOK_URL + WEBHOOK_PATH
+try:
+    from config import WEBHOOK_URL
+except ImportError:
+    WEBHOOK_URL = ''
+try:
+    from config import WEBHOOK_SECRET
+except ImportError:
+    WEBHOOK_SECRET = ''
+if not WEBHOOK_SECRET:
+    # Without a secret anyone who finds the URL could post forged updates;
+    # this one is registered with set_webhook when the bot starts
+    WEBHOOK_SECRET = secrets.token_urlsafe(32)
+try:
+    from config import WEBHOOK_PATH
+except ImportError:
+    WEBHOOK_PATH = '/telegram'
+
+# Port of the keep-alive/webhook HTTP server
+try:
+    from config import PORT
+except ImportError:
+    PORT = 8080
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -77,129 +87,57 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     welcome_message = (
         "🤖 Welcome to the Network & Productivity Bot!\n\n"
         "Choose a category to get started:\n\n"
-        "🌐 **Network Tools**: Ping, Traceroute, IP Info, Speedtest\n"
+        "🌐 **Network Tools**: Ping, Port Check, Traceroute, IP Info, Speedtest\n"
         "📋 **Productivity Tools**: Reminders, Todo, Weather, Quotes, Translation\n"
         "🤖 **AI Assistant**: Ask anything by starting your message with `@rbot`\n\n"
         "Use the buttons below or type /help for more information."
     )
     await update.message.reply_text(
         welcome_message,
-        reply_markup=get_main_menu_keyboard(),
+        reply_markup=registry.keyboard(),
         parse_mode='Markdown'
     )
 
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send a message when the command /help is issued"""
-    help_text = (
+@functools.lru_cache(maxsize=None)
+def help_text():
+    """Build the /help text from the registered tools (once)"""
+    return (
         "📚 **Available Commands:**\n\n"
         "**Network Tools:**\n"
-        "• `/ping <host>` - Ping an IP address or hostname\n"
-        "• `/traceroute <host>` - Perform traceroute to a host\n"
-        "• `/ipinfo <ip>` - Get IP geolocation and ASN info\n"
-        "• `/speedtest` - Run internet speed test\n\n"
+        + "".join(f"{line}\n" for line in registry.help_lines('network_tools')) + "\n"
         "**Productivity Tools:**\n"
-        "• `/reminder <time> <message>` - Set a reminder\n"
-        "• `/todo <add|remove|list> [task]` - Manage todo list\n"
-        "• `/weather` - Get weather for Addis Ababa, Ethiopia\n"
-        "• `/quote` - Get a motivational quote\n\n"
+        + "".join(f"{line}\n" for line in registry.help_lines('productivity_tools')) + "\n"
         "**AI Assistant:**\n"
         "• `@rbot <your question>` - Ask anything to the AI assistant\n"
         "  Example: `@rbot What is Python?`\n"
         "  Example: `@rbot Explain quantum computing`\n\n"
         "You can also use the inline buttons for easier navigation!"
     )
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send a message when the command /help is issued"""
     await update.message.reply_text(
-        help_text,
-        reply_markup=get_main_menu_keyboard(),
+        help_text(),
+        reply_markup=registry.keyboard(),
         parse_mode='Markdown'
     )
 
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle button callbacks"""
+    """Handle button callbacks: menus, then tool buttons"""
     query = update.callback_query
     await query.answer()
 
-    if query.data == "main_menu":
-        await query.edit_message_text(
-            "🤖 Choose a category:",
-            reply_markup=get_main_menu_keyboard()
-        )
-    elif query.data == "network_tools":
-        await query.edit_message_text(
-            "🌐 **Network Tools**\n\nSelect a tool:",
-            reply_markup=get_network_tools_keyboard(),
-            parse_mode='Markdown'
-        )
-    elif query.data == "productivity_tools":
-        await query.edit_message_text(
-            "📋 **Productivity Tools**\n\nSelect a tool:",
-            reply_markup=get_productivity_tools_keyboard(),
-            parse_mode='Markdown'
-        )
-    elif query.data == "cmd_ping":
-        await query.edit_message_text(
-            "📡 **Ping Tool**\n\nSend me an IP address or hostname to ping.\n\n"
-            "Example: `8.8.8.8` or `google.com`",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'ping'
-    elif query.data == "cmd_traceroute":
-        await query.edit_message_text(
-            "🛤️ **Traceroute Tool**\n\nSend me an IP address or hostname for traceroute.\n\n"
-            "Example: `8.8.8.8` or `google.com`",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'traceroute'
-    elif query.data == "cmd_ipinfo":
-        await query.edit_message_text(
-            "📍 **IP Info Tool**\n\nSend me an IP address to get information.\n\n"
-            "Example: `8.8.8.8`",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'ipinfo'
-    elif query.data == "cmd_speedtest":
-        await query.edit_message_text("⚡ Starting speedtest... This may take a moment.")
-        await handle_speedtest(update, context)
-    elif query.data == "cmd_wol":
-        await query.edit_message_text(
-            "🔌 **Wake-on-LAN Tool**\n\n"
-            "Send me a MAC address to wake up a PC.\n\n"
-            "**Format:** `00:11:22:33:44:55`\n"
-            "**Example:** `00:1B:44:11:3A:B7`\n\n"
-            "**Note:** Only authorized users can use this command.",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'wol'
-    elif query.data == "cmd_reminder":
-        await query.edit_message_text(
-            "⏰ **Reminder Tool**\n\n"
-            "Format: `<date/time> <message>`\n\n"
-            "Example: `2024-12-25 10:00 Buy gifts`\n"
-            "Or: `in 30 minutes Call mom`",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'reminder'
-    elif query.data == "cmd_todo":
-        await query.edit_message_text(
-            "✅ **Todo Tool**\n\n"
-            "Commands:\n"
-            "• `/todo add <task>` - Add a task\n"
-            "• `/todo remove <number>` - Remove a task\n"
-            "• `/todo list` - List all tasks",
-            parse_mode='Markdown'
-        )
-    elif query.data == "cmd_weather":
-        await query.edit_message_text(
-            "🌤️ **Weather Tool**\n\nSend me a city name to get weather information.\n\n"
-            "Example: `London` or `New York`",
-            parse_mode='Markdown'
-        )
-        context.user_data['waiting_for'] = 'weather'
-    elif query.data == "cmd_quote":
-        await query.edit_message_text("💬 Fetching a motivational quote...")
-        await handle_quote(update, context)
+    title = registry.menu_title(query.data)
+    if title is not None:
+        await query.edit_message_text(title, reply_markup=registry.keyboard(query.data), parse_mode='Markdown')
+        return
+    tool = registry.for_button(query.data)
+    if tool is not None:
+        await tool.on_button(update, context)
+
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages based on what the user is waiting for"""
@@ -210,81 +148,283 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await handle_ai_message(update, context)
             return
     
-    waiting_for = context.user_data.get('waiting_for')
-    text = update.message.text.strip()
-
-    if waiting_for == 'ping':
-        await handle_ping(update, context)
-        context.user_data.pop('waiting_for', None)
-    elif waiting_for == 'traceroute':
-        await handle_traceroute(update, context)
-        context.user_data.pop('waiting_for', None)
-    elif waiting_for == 'ipinfo':
-        await handle_ipinfo(update, context)
-        context.user_data.pop('waiting_for', None)
-    elif waiting_for == 'wol':
-        await handle_wol(update, context)
-        context.user_data.pop('waiting_for', None)
-    elif waiting_for == 'weather':
-        await handle_weather(update, context)
-        context.user_data.pop('waiting_for', None)
-    elif waiting_for == 'reminder':
-        await handle_reminder(update, context)
+    tool = registry.for_reply(context.user_data.get('waiting_for'))
+    if tool is not None:
+        await tool.callback(update, context)
         context.user_data.pop('waiting_for', None)
     else:
         await update.message.reply_text(
             "I'm not sure what you want to do. Use /start or /help to see available commands.",
-            reply_markup=get_main_menu_keyboard()
+            reply_markup=registry.keyboard()
         )
 
 
-def main():
-    """Start the bot"""
-    # Optional: Start keep-alive server for Replit (if keep_alive.py exists)
+# Background startup tasks, cancelled at shutdown
+_background_tasks = set()
+
+
+async def post_init(application: Application):
+    """Start background services once the bot is initialized"""
     try:
-        from keep_alive import keep_alive
-        keep_alive()
-        logger.info("Keep-alive server started")
-    except ImportError:
-        pass  # keep_alive.py not found, continue normally
+        await keep_alive.start_server(port=PORT)
+    except OSError as e:
+        if BOT_MODE == 'webhook':
+            raise
+        logger.error(f"Keep-alive server not started: {e}")
+    startup.mark('keep_alive')
+    await start_services(application)
+
+
+async def start_services(application: Application, owns_chat=None):
+    """Start the reminder scheduler and quote pool, then warm up in the background"""
+    await reminder_scheduler.start(application, owns_chat=owns_chat)
+    quote_service.start()
+    startup.mark('services')
+    startup.ready()
+    # Lazy tool modules and the Gemini SDK load in the background, not on the first request
+    _background_tasks.add(asyncio.create_task(
+        startup.warm_up(blocking=[('gemini', get_model)])
+    ))
+
+
+async def post_shutdown(application: Application):
+    """Release shared resources once the bot has stopped"""
+    for task in _background_tasks:
+        task.cancel()
+    await keep_alive.stop_server()
+    await reminder_scheduler.stop()
+    await quote_service.stop()
+    await http_client.close()
+    ping.close()
+    answer_cache.save()
+    storage.close()
+    logger.info(f"AI answer cache: {answer_cache.stats()}")
+
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle uploaded files (text files of IPs for bulk IP info)"""
+    caption = (update.message.caption or '').strip().lower()
+    if caption.startswith('/ipinfo') or context.user_data.get('waiting_for') == 'ipinfo':
+        context.user_data.pop('waiting_for', None)
+        await handle_ipinfo_file(update, context)
+
+
+def make_webhook_handler(deliver):
+    """Create the keep-alive server route that passes Telegram updates (raw dicts) to deliver"""
+    async def webhook(request):
+        token = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            return keep_alive.text_response("Forbidden", 403)
+        try:
+            data = request.json()
+        except ValueError:
+            return keep_alive.text_response("Bad Request", 400)
+        await deliver(data)
+        return keep_alive.text_response("OK")
+    return webhook
+
+
+def stop_on_signals(stop):
+    """Set the stop event on SIGINT/SIGTERM"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: rely on KeyboardInterrupt
+
+
+async def run_webhook(application: Application):
+    """Receive updates through a webhook served by the keep-alive server"""
+    stop = asyncio.Event()
+    stop_on_signals(stop)
+
+    async def deliver(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    keep_alive.add_route('POST', WEBHOOK_PATH, make_webhook_handler(deliver))
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    try:
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)
+
+
+async def run_worker(index, count, updates):
+    """Worker process in multi-process mode: handle the updates routed to this worker"""
+    from config import BOT_TOKEN
+    # Each worker saves its AI answers to its own file; speedtest results are shared
+    if answer_cache.path:
+        answer_cache.path = f"{answer_cache.path}.worker{index}"
+        answer_cache.load()
+    import speedtest_service
+    speedtest_service.speedtest_service.shared = True
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .updater(None)
+        .concurrent_updates(workers.ChatOrderedProcessor())
+        .persistence(SQLitePersistence(shared=True))
+        .build()
+    )
+    register_handlers(application)
+    await application.initialize()
+    await start_services(application, owns_chat=lambda chat_id: workers.worker_for(chat_id, count) == index)
+    await application.start()
+    logger.info(f"Worker {index} of {count} started")
+    try:
+        async for data in updates:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)
+
+
+async def run_workers(token):
+    """
+    Multi-process mode: receive updates here (polling or webhook) and hand
+    them to WORKERS worker processes, each chat always to the same worker.
+    """
+    stop = asyncio.Event()
+    stop_on_signals(stop)
+    # Create the schema and run migrations once, before the workers share the database
+    await asyncio.to_thread(storage.get_connection)
+
+    front = workers.Front(workers.WORKERS, run_worker)
+    await front.start()
+    tasks = [asyncio.create_task(stop.wait()), asyncio.create_task(front.wait_exited())]
+    try:
+        async with Bot(token) as bot:
+            try:
+                await keep_alive.start_server(port=PORT)
+            except OSError as e:
+                if BOT_MODE == 'webhook':
+                    raise
+                logger.error(f"Keep-alive server not started: {e}")
+            if BOT_MODE == 'webhook':
+                keep_alive.add_route('POST', WEBHOOK_PATH, make_webhook_handler(front.dispatch))
+                await bot.set_webhook(
+                    url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                    secret_token=WEBHOOK_SECRET,
+                    allowed_updates=Update.ALL_TYPES
+                )
+                logger.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+            else:
+                await bot.delete_webhook()
+                tasks.append(asyncio.create_task(
+                    workers.poll(token, front.dispatch, allowed_updates=Update.ALL_TYPES)
+                ))
+            startup.ready()
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is tasks[1]:
+                    logger.error(f"Worker {task.result().index} exited, stopping")
+                elif task is not tasks[0]:
+                    task.result()  # Raises why the receiver stopped
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await keep_alive.stop_server()
+        await front.stop()
+        await http_client.close()
+        storage.close()
+
+
+def wrap(name, callback):
+    """Record metrics and a trace for every update a handler processes"""
+    callback = instrument(name, traced(name, callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        try:
+            return await callback(update, context)
+        finally:
+            startup.first_update()
+    return wrapper
+
+
+def register_handlers(application: Application):
+    """Register all command, button and message handlers"""
+    # Register command handlers (each wrapped for /metrics and tracing)
+    application.add_handler(CommandHandler("start", wrap("start", start)))
+    application.add_handler(CommandHandler("help", wrap("help", help_command)))
+    
+    # Tool commands, from the registry
+    for tool in registry.tools.values():
+        for command in tool.commands:
+            application.add_handler(CommandHandler(command, wrap(command, tool.callback)))
+    
+    # Button callback handler
+    application.add_handler(CallbackQueryHandler(wrap("button", button_callback)))
     
+    # Message handler (for interactive commands)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, wrap("message", handle_message)))
+
+    # Document handler (for bulk IP info files)
+    application.add_handler(MessageHandler(filters.Document.ALL, wrap("document", handle_document)))
+
+
+def main():
+    """Start the bot"""
     # Load configuration
     try:
         from config import BOT_TOKEN
     except ImportError:
         logger.error("config.py not found! Please create it with BOT_TOKEN.")
         return
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        logger.error("BOT_MODE is 'webhook' but WEBHOOK_URL is not set in config.py.")
+        return
+
+    if workers.WORKERS > 1:
+        logger.info(f"Bot is starting with {workers.WORKERS} worker processes ({BOT_MODE})...")
+        try:
+            asyncio.run(run_workers(BOT_TOKEN))
+        except KeyboardInterrupt:
+            pass
+        return
 
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Updates are processed concurrently so one slow lookup doesn't block other users
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .persistence(SQLitePersistence())
+    )
+    if BOT_MODE == 'webhook':
+        # Updates arrive through the keep-alive server instead of long polling
+        builder = builder.updater(None)
+    application = builder.build()
 
-    # Register command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    
-    # Network Tools commands
-    application.add_handler(CommandHandler("ping", handle_ping))
-    application.add_handler(CommandHandler("traceroute", handle_traceroute))
-    application.add_handler(CommandHandler("ipinfo", handle_ipinfo))
-    application.add_handler(CommandHandler("speedtest", handle_speedtest))
-    application.add_handler(CommandHandler("wol", handle_wol))
-    application.add_handler(CommandHandler("wake_pc", handle_wol))
-    
-    # Productivity Tools commands
-    application.add_handler(CommandHandler("reminder", handle_reminder))
-    application.add_handler(CommandHandler("todo", handle_todo))
-    application.add_handler(CommandHandler("weather", handle_weather))
-    application.add_handler(CommandHandler("quote", handle_quote))
-    
-    # Button callback handler
-    application.add_handler(CallbackQueryHandler(button_callback))
-    
-    # Message handler (for interactive commands)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    register_handlers(application)
+    startup.mark('build application')
 
     # Start the bot
-    logger.info("Bot is starting...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        logger.info("Bot is starting in webhook mode...")
+        try:
+            asyncio.run(run_webhook(application))
+        except KeyboardInterrupt:
+            pass
+    else:
+        logger.info("Bot is starting...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,165 @@
+"""
+Cache Module
+Bounded LRU cache with per-entry TTL, a memory cap and optional on-disk persistence
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after a TTL.
+
+    The cache holds at most maxsize entries and, if max_bytes is set, at most
+    roughly that many bytes of keys and values. The least recently used entries
+    are evicted first. When a path is given, entries are loaded from it on
+    creation and written back by save(); keys and values must then be JSON
+    serializable.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, max_bytes=None, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        # key -> (expires_at, value, size)
+        self._entries = OrderedDict()
+        # key -> future of a fetch in progress
+        self._inflight = {}
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def get(self, key, default=None):
+        """Return a live entry (marking it recently used) or default"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting old entries as needed"""
+        if key in self._entries:
+            self._remove(key)
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value, size)
+        self.bytes += size
+        while len(self._entries) > self.maxsize or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    async def get_or_fetch(self, key, fetch, ttl=None):
+        """
+        Return the cached value for key, or await fetch() and cache its result.
+
+        Concurrent misses for the same key share a single fetch. ttl may be a
+        number or a function that computes the TTL from the fetched value.
+        Errors are raised to every waiter and are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(key, fetch, ttl))
+            self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    async def _fetch(self, key, fetch, ttl):
+        try:
+            value = await fetch()
+            if callable(ttl):
+                ttl = ttl(value)
+            self.set(key, value, ttl=ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._remove(key)
+        return entry[1]
+
+    def clear(self):
+        """Remove all entries"""
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+        }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def load(self):
+        """Load unexpired entries from the backing file"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load cache file {self.path}: {e}")
+            return
+        now = time.time()
+        for key, expires_at, value in entries:
+            if expires_at > now:
+                self.set(key, value, ttl=expires_at - now)
+
+    def save(self):
+        """Write unexpired entries to the backing file atomically"""
+        if not self.path:
+            return
+        now = time.time()
+        entries = [
+            [key, expires_at, value]
+            for key, (expires_at, value, _) in self._entries.items()
+            if expires_at > now
+        ]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save cache file {self.path}: {e}")
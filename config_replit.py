@@ -17,3 +17,9 @@ WEATHERAPI_KEY = os.getenv("WEATHERAPI_KEY", "")
 # Google Gemini AI API Key (for AI Assistant)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
+# Serving mode: "polling" or "webhook" (see config.py.example)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+PORT = int(os.getenv("PORT", "8080"))
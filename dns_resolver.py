@@ -0,0 +1,318 @@
+"""
+DNS Resolver Module
+Async stub resolver (UDP, retried over TCP when truncated) with a
+TTL-respecting positive and negative cache, shared by the network tools
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import socket
+import struct
+import time
+import metrics
+import tracing
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import DNS_SERVERS
+except ImportError:
+    DNS_SERVERS = None  # Nameserver IPs to query; None reads /etc/resolv.conf
+
+try:
+    from config import DNS_TIMEOUT
+except ImportError:
+    DNS_TIMEOUT = 2.0  # Seconds to wait for each nameserver
+
+DNS_PORT = 53
+FALLBACK_SERVERS = ['1.1.1.1', '8.8.8.8']
+RESOLV_CONF = '/etc/resolv.conf'
+HOSTS_FILE = 'C:\\Windows\\System32\\drivers\\etc\\hosts' if os.name == 'nt' else '/etc/hosts'
+
+# Cached answers live for their record TTLs, clamped to this range; negative
+# answers use the zone's SOA minimum, or NEGATIVE_TTL when there is no SOA
+MIN_TTL = 5
+MAX_TTL = 24 * 3600
+NEGATIVE_TTL = 60
+
+TYPES = {'A': 1, 'NS': 2, 'CNAME': 5, 'SOA': 6, 'PTR': 12, 'MX': 15, 'TXT': 16, 'AAAA': 28}
+TYPE_NAMES = {number: name for name, number in TYPES.items()}
+RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+NXDOMAIN = 3
+
+HEADER = struct.Struct('!HHHHHH')
+QUESTION = struct.Struct('!HH')
+RECORD = struct.Struct('!HHIH')
+FLAG_TRUNCATED = 0x0200
+FLAG_RECURSION_DESIRED = 0x0100
+
+# (name, type) -> Answer
+dns_cache = TTLCache(maxsize=10000, ttl=NEGATIVE_TTL)
+metrics.register_cache('dns', dns_cache)
+
+
+class DNSError(Exception):
+    """Raised when no nameserver returns a usable answer"""
+
+
+class Answer:
+    """A DNS response: rcode plus (type, ttl, value) records"""
+
+    def __init__(self, name, qtype, rcode, records, ttl, server, elapsed):
+        self.name = name
+        self.qtype = qtype
+        self.rcode = rcode
+        self.records = records
+        self.ttl = ttl          # Seconds the answer may be cached
+        self.server = server
+        self.elapsed = elapsed  # Seconds the query took on the wire
+
+    @property
+    def status(self):
+        return RCODES.get(self.rcode, str(self.rcode))
+
+    def values(self, qtype=None):
+        """Values of the records of a type (the queried type by default)"""
+        qtype = qtype or self.qtype
+        return [value for rtype, _, value in self.records if rtype == qtype]
+
+
+def encode_name(name):
+    """Encode a domain name as DNS labels; raises ValueError if it is not valid"""
+    name = name.strip().rstrip('.')
+    if not name:
+        return b'\x00'
+    try:
+        labels = name.encode('idna').split(b'.')
+    except UnicodeError as e:
+        raise ValueError(f"invalid name: {name}") from e
+    if any(not 0 < len(label) < 64 for label in labels) or len(name) > 253:
+        raise ValueError(f"invalid name: {name}")
+    return b''.join(bytes([len(label)]) + label for label in labels) + b'\x00'
+
+
+def build_query(name, qtype):
+    """Return (query id, packet) for a recursive query"""
+    query_id = random.getrandbits(16)
+    header = HEADER.pack(query_id, FLAG_RECURSION_DESIRED, 1, 0, 0, 0)
+    return query_id, header + encode_name(name) + QUESTION.pack(TYPES[qtype], 1)
+
+
+def _read_name(data, offset):
+    """Read a possibly compressed name; return (name, offset after it)"""
+    labels = []
+    end = None
+    for _ in range(128):  # Bounds pointer loops in malformed packets
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+        elif length == 0:
+            return '.'.join(labels) or '.', end if end is not None else offset + 1
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+            offset += 1 + length
+    raise ValueError("name compression loop")
+
+
+def _read_rdata(data, rtype, offset, length):
+    rdata = data[offset:offset + length]
+    if rtype == TYPES['A'] and length == 4:
+        return socket.inet_ntop(socket.AF_INET, rdata)
+    if rtype == TYPES['AAAA'] and length == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rtype in (TYPES['CNAME'], TYPES['NS'], TYPES['PTR']):
+        return _read_name(data, offset)[0]
+    if rtype == TYPES['MX']:
+        return f"{struct.unpack_from('!H', data, offset)[0]} {_read_name(data, offset + 2)[0]}"
+    if rtype == TYPES['TXT']:
+        strings = []
+        position = 0
+        while position < length:
+            size = rdata[position]
+            strings.append(rdata[position + 1:position + 1 + size].decode('utf-8', 'replace'))
+            position += 1 + size
+        return ''.join(strings)
+    if rtype == TYPES['SOA']:
+        mname, position = _read_name(data, offset)
+        rname, position = _read_name(data, position)
+        return (mname, rname, *struct.unpack_from('!IIIII', data, position))
+    return rdata.hex()
+
+
+def parse_response(data, query_id):
+    """Parse a response; return (rcode, truncated, answer records, negative TTL or None)"""
+    response_id, flags, questions, answers, authorities, _ = HEADER.unpack_from(data)
+    if response_id != query_id:
+        raise ValueError("response id does not match the query")
+    offset = HEADER.size
+    for _ in range(questions):
+        offset = _read_name(data, offset)[1] + QUESTION.size
+    records = []
+    negative_ttl = None
+    for index in range(answers + authorities):
+        offset = _read_name(data, offset)[1]
+        rtype, _, ttl, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        value = _read_rdata(data, rtype, offset, length)
+        offset += length
+        if index < answers:
+            records.append((TYPE_NAMES.get(rtype, str(rtype)), ttl, value))
+        elif rtype == TYPES['SOA']:
+            # RFC 2308: negative answers live for min(SOA TTL, SOA minimum)
+            negative_ttl = min(ttl, value[-1])
+    return flags & 0x000F, bool(flags & FLAG_TRUNCATED), records, negative_ttl
+
+
+_nameservers = []
+
+
+def nameservers():
+    """Configured nameservers, else those in resolv.conf (read once), else public resolvers"""
+    if DNS_SERVERS:
+        return list(DNS_SERVERS)
+    if _nameservers:
+        return _nameservers
+    servers = []
+    try:
+        with open(RESOLV_CONF) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    servers.append(fields[1].split('%')[0])
+    except OSError:
+        pass
+    _nameservers[:] = servers or FALLBACK_SERVERS
+    return _nameservers
+
+
+async def _udp_exchange(server, packet):
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ':' in server else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        sock.connect((server, DNS_PORT))
+        await loop.sock_sendall(sock, packet)
+        while True:
+            data = await loop.sock_recv(sock, 65535)
+            # Ignore stray datagrams for other queries
+            if data[:2] == packet[:2] and len(data) >= HEADER.size:
+                return data
+
+
+async def _tcp_exchange(server, packet):
+    reader, writer = await asyncio.open_connection(server, DNS_PORT)
+    try:
+        writer.write(struct.pack('!H', len(packet)) + packet)
+        await writer.drain()
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        return await reader.readexactly(length)
+    finally:
+        writer.close()
+
+
+async def query(name, qtype):
+    """Send a query to each nameserver in turn until one answers; not cached"""
+    last_error = None
+    with tracing.span(f"DNS {qtype}", host=name) as span:
+        for server in nameservers():
+            query_id, packet = build_query(name, qtype)
+            start = time.perf_counter()
+            try:
+                data = await asyncio.wait_for(_udp_exchange(server, packet), DNS_TIMEOUT)
+                rcode, truncated, records, negative_ttl = parse_response(data, query_id)
+                if truncated:
+                    data = await asyncio.wait_for(_tcp_exchange(server, packet), DNS_TIMEOUT)
+                    rcode, _, records, negative_ttl = parse_response(data, query_id)
+            except (asyncio.TimeoutError, OSError, ValueError, IndexError, struct.error) as e:
+                metrics.observe_upstream(f"dns {server}", time.perf_counter() - start, failed=True)
+                last_error = f"{server}: {e or 'timed out'}"
+                continue
+            elapsed = time.perf_counter() - start
+            if rcode not in (0, NXDOMAIN):
+                # SERVFAIL, REFUSED, ...: another server may do better
+                metrics.observe_upstream(f"dns {server}", elapsed, failed=True)
+                last_error = f"{server}: {RCODES.get(rcode, rcode)}"
+                continue
+            metrics.observe_upstream(f"dns {server}", elapsed)
+            if records and any(rtype == qtype for rtype, _, _ in records):
+                ttl = min(ttl for _, ttl, _ in records)
+            else:
+                ttl = NEGATIVE_TTL if negative_ttl is None else negative_ttl
+            if span is not None:
+                span.attributes.update(server=server, rcode=RCODES.get(rcode, rcode))
+            return Answer(name, qtype, rcode, records, max(MIN_TTL, min(ttl, MAX_TTL)), server, elapsed)
+    raise DNSError(f"no answer for {name} {qtype} ({last_error})")
+
+
+async def lookup(name, qtype='A'):
+    """Cached query; concurrent lookups of the same name and type share one query"""
+    name = name.strip().rstrip('.').lower()
+    return await dns_cache.get_or_fetch((name, qtype), lambda: query(name, qtype),
+                                        ttl=lambda answer: answer.ttl)
+
+
+def is_cached(name, qtype='A'):
+    return (name.strip().rstrip('.').lower(), qtype) in dns_cache
+
+
+_hosts = {'mtime': None, 'names': {}}
+
+
+def hosts_lookup(name):
+    """Addresses for a name in the hosts file (re-read when it changes)"""
+    try:
+        mtime = os.stat(HOSTS_FILE).st_mtime
+    except OSError:
+        return []
+    if mtime != _hosts['mtime']:
+        names = {}
+        try:
+            with open(HOSTS_FILE, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    fields = line.split('#', 1)[0].split()
+                    for host in fields[1:]:
+                        names.setdefault(host.lower(), []).append(fields[0])
+        except OSError:
+            return []
+        _hosts.update(mtime=mtime, names=names)
+    return _hosts['names'].get(name.strip().rstrip('.').lower(), [])
+
+
+async def resolve(host):
+    """
+    Resolve a hostname to an IP address string (IPv4 preferred).
+
+    Checks the hosts file, then queries A and AAAA at once through the cache.
+    Names without a dot (search domains) or that no nameserver answers for
+    fall back to getaddrinfo, which runs in a worker thread. Raises
+    socket.gaierror if the name does not exist.
+    """
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        pass
+    addresses = hosts_lookup(host)
+    if addresses:
+        return min(addresses, key=lambda address: ':' in address)
+
+    if '.' in host.strip('.'):
+        answers = await asyncio.gather(lookup(host, 'A'), lookup(host, 'AAAA'), return_exceptions=True)
+        for answer in answers:
+            if isinstance(answer, Answer) and answer.values():
+                return answer.values()[0]
+        for answer in answers:
+            if isinstance(answer, Exception) and not isinstance(answer, DNSError):
+                raise answer
+        if all(isinstance(answer, Answer) for answer in answers):
+            raise socket.gaierror(socket.EAI_NONAME, f"Unknown host: {host}")
+        logger.warning(f"DNS lookup of {host} failed ({answers[0]}), using getaddrinfo")
+
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    infos.sort(key=lambda info: info[0] != socket.AF_INET)
+    return infos[0][4][0]
@@ -0,0 +1,81 @@
+"""
+HTTP Client Module
+Shared async HTTP client with keep-alive connection pooling for outbound API calls
+"""
+
+import asyncio
+import logging
+import time
+import httpx
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Default per-call timeout (seconds) and retry policy
+DEFAULT_TIMEOUT = 10
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# Connection pool limits (httpx keeps a separate keep-alive pool per host)
+POOL_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30
+)
+
+# Optional httpx transport for the client (benchmarks route requests to local stubs)
+TRANSPORT = None
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide async HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=POOL_LIMITS,
+            transport=TRANSPORT,
+            timeout=DEFAULT_TIMEOUT,
+            follow_redirects=True,
+            headers={'User-Agent': 'rgpt-telegram-bot'}
+        )
+    return _client
+
+
+async def get(url, params=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """
+    Send a GET request through the shared client.
+
+    Connection errors, timeouts and 5xx responses are retried with exponential
+    backoff. The last response is returned (or the last error raised) once the
+    retries are used up.
+    """
+    client = get_client()
+    host = httpx.URL(url).host
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"GET {host}", attempt=attempt) as span:
+                response = await client.get(url, params=params, timeout=timeout, **kwargs)
+                if span is not None:
+                    span.attributes['status'] = response.status_code
+            metrics.observe_upstream(host, time.perf_counter() - start, response.status_code >= 500)
+            if response.status_code < 500 or attempt == retries:
+                return response
+            logger.warning(f"GET {url} returned {response.status_code}, retrying")
+        except httpx.TransportError as e:
+            metrics.observe_upstream(host, time.perf_counter() - start, failed=True)
+            if attempt == retries:
+                raise
+            logger.warning(f"GET {url} failed ({e!r}), retrying")
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+
+async def close():
+    """Close the shared client and its connection pools"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,302 @@
+"""
+IP Database Module
+Offline IP geolocation/ASN lookups from a memory-mapped, sorted range table
+
+Build a database from CSV dumps (DB-IP, IP2Location LITE, ipinfo, MaxMind
+GeoLite2 CSV and similar) with:
+
+    python ipdb.py build ipdb.bin country_asn.csv [more.csv ...]
+
+Overlapping ranges, e.g. from a country CSV and an ASN CSV, are split and
+their records combined, so every address maps to one record.
+
+File layout (all integers little-endian):
+    header    magic, IPv4 range count, IPv6 range count, section offsets
+    ranges    per family: start IP, end IP (big-endian bytes), record index
+    records   record count, offset table, JSON-encoded records
+"""
+
+import argparse
+import csv
+import heapq
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import IPDB_FILE
+except ImportError:
+    IPDB_FILE = "ipdb.bin"  # Set to None to disable the offline database
+
+MAGIC = b'RGEOIP01'
+HEADER = struct.Struct('<8sIIQQQ')
+INDEX = struct.Struct('<I')
+
+# Record field -> accepted CSV column names
+FIELD_COLUMNS = {
+    'country': ['country', 'country_code', 'country_iso_code'],
+    'country_name': ['country_name'],
+    'region': ['region', 'region_name', 'state', 'stateprov', 'subdivision_1_name'],
+    'city': ['city', 'city_name'],
+    'postal': ['postal', 'postal_code', 'zip', 'zip_code'],
+    'latitude': ['latitude', 'lat'],
+    'longitude': ['longitude', 'lon', 'lng'],
+    'timezone': ['timezone', 'time_zone'],
+    'asn': ['asn', 'as_number', 'autonomous_system_number'],
+    'org': ['org', 'as_name', 'as_organization', 'autonomous_system_organization', 'organization', 'isp'],
+}
+START_COLUMNS = ['start_ip', 'ip_from', 'range_start', 'first_ip']
+END_COLUMNS = ['end_ip', 'ip_to', 'range_end', 'last_ip']
+NETWORK_COLUMNS = ['network', 'cidr', 'prefix']
+
+
+class IPDatabase:
+    """Read-only, memory-mapped range table searched with binary search"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.v4_count, self.v6_count, self._v4_offset, self._v6_offset, records_offset = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an IP database file")
+        self.record_count = INDEX.unpack_from(self._mm, records_offset)[0]
+        self._offsets_offset = records_offset + INDEX.size
+        self._data_offset = self._offsets_offset + INDEX.size * (self.record_count + 1)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def lookup(self, ip):
+        """Return the record for an IP address, or None if it is not covered"""
+        address = ipaddress.ip_address(ip)
+        if address.version == 4:
+            offset, count, width = self._v4_offset, self.v4_count, 4
+        else:
+            offset, count, width = self._v6_offset, self.v6_count, 16
+        key = address.packed
+        entry_size = 2 * width + INDEX.size
+        mm = self._mm
+
+        # Find the last range whose start is <= key
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * entry_size
+            if mm[start:start + width] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        entry = offset + (lo - 1) * entry_size
+        if mm[entry + width:entry + 2 * width] < key:
+            return None
+        return self._record(INDEX.unpack_from(mm, entry + 2 * width)[0])
+
+    def _record(self, index):
+        start, end = struct.unpack_from('<II', self._mm, self._offsets_offset + index * INDEX.size)
+        return json.loads(self._mm[self._data_offset + start:self._data_offset + end])
+
+
+_database = None
+_database_checked = False
+
+
+def get_database():
+    """Open the configured database on first use; None if it is not available"""
+    global _database, _database_checked
+    if not _database_checked:
+        _database_checked = True
+        if IPDB_FILE and os.path.exists(IPDB_FILE):
+            try:
+                _database = IPDatabase(IPDB_FILE)
+                logger.info(
+                    f"Loaded IP database {IPDB_FILE}: "
+                    f"{_database.v4_count} IPv4 and {_database.v6_count} IPv6 ranges"
+                )
+            except (OSError, ValueError, struct.error) as e:
+                logger.error(f"Could not open IP database {IPDB_FILE}: {e}")
+    return _database
+
+
+def lookup(ip):
+    """Look up an IP in the offline database; None if unavailable or not found"""
+    database = get_database()
+    if database is None:
+        return None
+    try:
+        return database.lookup(ip)
+    except ValueError:
+        return None
+
+
+def _parse_address(value):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.ip_address(number) if number < 2 ** 32 else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def read_csv(path, columns=None):
+    """Yield (start, end, record) tuples from a CSV dump"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        if columns:
+            header = columns
+        else:
+            header = [name.strip().lower() for name in next(reader)]
+        start_col = _find_column(header, START_COLUMNS)
+        end_col = _find_column(header, END_COLUMNS)
+        network_col = _find_column(header, NETWORK_COLUMNS)
+        if network_col is None and (start_col is None or end_col is None):
+            raise ValueError(f"{path}: no start/end or network column in {header}")
+        fields = {
+            field: index
+            for field, names in FIELD_COLUMNS.items()
+            if (index := _find_column(header, names)) is not None
+        }
+
+        for row in reader:
+            if not row or row[0].startswith('#'):
+                continue
+            try:
+                if network_col is not None:
+                    network = ipaddress.ip_network(row[network_col].strip(), strict=False)
+                    start, end = network[0], network[-1]
+                else:
+                    start, end = _parse_address(row[start_col]), _parse_address(row[end_col])
+            except ValueError:
+                continue
+            record = {
+                field: row[index].strip()
+                for field, index in fields.items()
+                if index < len(row) and row[index].strip() not in ('', '-')
+            }
+            yield start, end, record
+
+
+def merge_ranges(ranges):
+    """
+    Split overlapping (start, end, record) ranges of integer addresses into
+    disjoint ones, each with the combined record of every range covering it;
+    conflicting fields come from the narrower range, then the later one.
+    Yields sorted ranges, joining neighbours with the same record.
+    """
+    ranges = sorted((start, end, order, record) for order, (start, end, record) in enumerate(ranges) if start <= end)
+    boundaries = sorted({start for start, _, _, _ in ranges} | {end + 1 for _, end, _, _ in ranges})
+    active = []  # Heap of (end, order, start, record) covering the current point
+    position = 0
+    current = None
+    for point, next_point in zip(boundaries, boundaries[1:]):
+        while position < len(ranges) and ranges[position][0] == point:
+            start, end, order, record = ranges[position]
+            heapq.heappush(active, (end, order, start, record))
+            position += 1
+        while active and active[0][0] < point:
+            heapq.heappop(active)
+        if not active:
+            continue
+        combined = {}
+        for _, _, _, record in sorted(active, key=lambda entry: (entry[2] - entry[0], entry[1])):
+            combined.update(record)
+        if current is not None and current[1] == point - 1 and current[2] == combined:
+            current[1] = next_point - 1
+        else:
+            if current is not None:
+                yield tuple(current)
+            current = [point, next_point - 1, combined]
+    if current is not None:
+        yield tuple(current)
+
+
+def build(output, inputs, columns=None):
+    """Build a database file from one or more CSV dumps"""
+    parsed = {4: [], 6: []}
+    for path in inputs:
+        for start, end, record in read_csv(path, columns):
+            if start.version != end.version:
+                continue
+            parsed[start.version].append((int(start), int(end), record))
+
+    ranges = {4: [], 6: []}
+    records = []
+    record_index = {}
+    for version, width in ((4, 4), (6, 16)):
+        for start, end, record in merge_ranges(parsed[version]):
+            key = json.dumps(record, sort_keys=True, separators=(',', ':'))
+            if key not in record_index:
+                record_index[key] = len(records)
+                records.append(key.encode('utf-8'))
+            ranges[version].append((start.to_bytes(width, 'big'), end.to_bytes(width, 'big'), record_index[key]))
+
+    v4_offset = HEADER.size
+    v6_offset = v4_offset + len(ranges[4]) * (8 + INDEX.size)
+    records_offset = v6_offset + len(ranges[6]) * (32 + INDEX.size)
+
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ranges[4]), len(ranges[6]), v4_offset, v6_offset, records_offset))
+        for version in (4, 6):
+            for start, end, index in ranges[version]:
+                f.write(start + end + INDEX.pack(index))
+        f.write(INDEX.pack(len(records)))
+        position = 0
+        for record in records:
+            f.write(INDEX.pack(position))
+            position += len(record)
+        f.write(INDEX.pack(position))
+        for record in records:
+            f.write(record)
+    os.replace(tmp_path, output)
+    return len(ranges[4]), len(ranges[6]), len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline IP geolocation/ASN database tool")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build a database from CSV dumps")
+    build_parser.add_argument('output', help="Database file to write (e.g. ipdb.bin)")
+    build_parser.add_argument('inputs', nargs='+', help="CSV files to import")
+    build_parser.add_argument(
+        '--columns',
+        help="Comma-separated column names for CSV files without a header row "
+             "(e.g. start_ip,end_ip,country)"
+    )
+
+    lookup_parser = subparsers.add_parser('lookup', help="Look up addresses in a database")
+    lookup_parser.add_argument('database', help="Database file")
+    lookup_parser.add_argument('ips', nargs='+', help="IP addresses")
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        columns = [name.strip().lower() for name in args.columns.split(',')] if args.columns else None
+        v4, v6, records = build(args.output, args.inputs, columns)
+        print(f"Wrote {args.output}: {v4} IPv4 ranges, {v6} IPv6 ranges, {records} unique records")
+    else:
+        database = IPDatabase(args.database)
+        for ip in args.ips:
+            print(ip, json.dumps(database.lookup(ip)))
+        database.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
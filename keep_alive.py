@@ -1,27 +1,168 @@
 """
-Keep Alive Server for Replit
-Simple Flask server to keep the bot running (for Uptime Robot)
+Keep Alive Server
+Minimal asyncio HTTP server on the bot's event loop for health checks
+(Uptime Robot, load balancers), Prometheus metrics and Telegram webhook updates
 """
 
-from flask import Flask
-from threading import Thread
+import asyncio
+import json
+import logging
+import metrics
 
-app = Flask('')
+logger = logging.getLogger(__name__)
 
-@app.route('/')
-def home():
-    return "🤖 Telegram Bot is running!"
+MAX_BODY_SIZE = 1024 * 1024
+READ_TIMEOUT = 30
 
-@app.route('/health')
-def health():
-    return {"status": "ok", "service": "telegram-bot"}
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+# (method, path) -> async handler(request) returning (status, content_type, body)
+_routes = {}
+_server = None
 
-def keep_alive():
-    """Start the keep-alive server in a separate thread"""
-    t = Thread(target=run)
-    t.daemon = True
-    t.start()
 
+class Request:
+    """A parsed HTTP request"""
+
+    def __init__(self, method, path, query, headers, body, keep_alive=False):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def add_route(method, path, handler):
+    """Register an async handler for a method and path"""
+    _routes[(method.upper(), path)] = handler
+
+
+def text_response(text, status=200):
+    return status, 'text/plain; charset=utf-8', text.encode('utf-8')
+
+
+def json_response(data, status=200):
+    return status, 'application/json', json.dumps(data).encode('utf-8')
+
+
+async def home(request):
+    return text_response("🤖 Telegram Bot is running!")
+
+
+async def health(request):
+    return json_response({"status": "ok", "service": "telegram-bot"})
+
+
+async def metrics_endpoint(request):
+    return 200, metrics.CONTENT_TYPE, metrics.render().encode('utf-8')
+
+
+add_route('GET', '/', home)
+add_route('GET', '/health', health)
+add_route('GET', '/metrics', metrics_endpoint)
+
+
+async def _read_request(reader):
+    """Read one request from the connection; None when the client closed it"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, version = request_line.decode('latin-1').strip().split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0) or 0)
+    if length > MAX_BODY_SIZE:
+        raise ValueError('body too large')
+    body = await reader.readexactly(length) if length else b''
+
+    path, _, query = target.partition('?')
+    keep_alive = version.upper() == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return Request(method.upper(), path, query, headers, body, keep_alive)
+
+
+async def _dispatch(request):
+    method = 'GET' if request.method == 'HEAD' else request.method
+    handler = _routes.get((method, request.path))
+    if handler is None:
+        if any(path == request.path for _, path in _routes):
+            return text_response("Method Not Allowed", 405)
+        return text_response("Not Found", 404)
+    try:
+        return await handler(request)
+    except Exception as e:
+        logger.error(f"Error handling {request.method} {request.path}: {e}")
+        return text_response("Internal Server Error", 500)
+
+
+async def _write_response(writer, status, content_type, body, keep_alive):
+    writer.write(
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+
+
+async def _handle_connection(reader, writer):
+    """Serve requests on one connection, keeping it open for HTTP/1.1 clients"""
+    try:
+        while True:
+            try:
+                request = await asyncio.wait_for(_read_request(reader), READ_TIMEOUT)
+            except ValueError:
+                # Malformed request line or oversized body
+                await _write_response(writer, *text_response("Bad Request", 400), keep_alive=False)
+                break
+            if request is None:
+                break
+            status, content_type, body = await _dispatch(request)
+            if request.method == 'HEAD':
+                body = b''
+            await _write_response(writer, status, content_type, body, request.keep_alive)
+            if not request.keep_alive:
+                break
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(host='0.0.0.0', port=8080):
+    """Start serving on the running event loop"""
+    global _server
+    _server = await asyncio.start_server(_handle_connection, host, port)
+    logger.info(f"Keep-alive server listening on {host}:{port}")
+    return _server
+
+
+async def stop_server():
+    """Stop accepting connections"""
+    global _server
+    if _server is not None:
+        _server.close()
+        try:
+            # Idle keep-alive connections may hold wait_closed() open
+            await asyncio.wait_for(_server.wait_closed(), 5)
+        except asyncio.TimeoutError:
+            pass
+        _server = None
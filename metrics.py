@@ -0,0 +1,209 @@
+"""
+Metrics Module
+Prometheus-style counters, gauges and fixed-bucket histograms for handlers,
+upstream APIs and caches, rendered in the text exposition format
+"""
+
+import functools
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, shared by handler and upstream histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metrics are only updated from the event loop thread, so plain dict and
+# integer updates are safe without locks.
+_metrics = []
+_caches = {}
+# Functions returning more families to export, e.g. those of worker processes
+_sources = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _add_labels(labels, extra):
+    """Prepend extra (name, value) pairs to formatted labels"""
+    if not extra:
+        return labels
+    added = _format_labels((), (), extra)
+    return added if not labels else added[:-1] + ',' + labels[1:]
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Histogram:
+    """Distribution of observations over fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values = {}
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, labels, [('le', _format_value(bound))]),
+                    cumulative
+                )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+HANDLER_REQUESTS = Counter('bot_handler_requests_total', 'Updates processed per handler', ('handler',))
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Handler calls that raised', ('handler',))
+HANDLER_LATENCY = Histogram('bot_handler_latency_seconds', 'Handler latency', ('handler',))
+HANDLER_IN_FLIGHT = Gauge('bot_handler_in_flight', 'Handler calls in progress', ('handler',))
+
+UPSTREAM_REQUESTS = Counter('bot_upstream_requests_total', 'Outbound requests per host', ('host',))
+UPSTREAM_ERRORS = Counter(
+    'bot_upstream_errors_total', 'Outbound requests that failed or returned 5xx', ('host',)
+)
+UPSTREAM_LATENCY = Histogram('bot_upstream_latency_seconds', 'Outbound request latency', ('host',))
+
+
+def instrument(name, callback):
+    """Wrap a handler callback to record its count, errors, latency and concurrency"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        HANDLER_IN_FLIGHT.inc(name)
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_IN_FLIGHT.dec(name)
+            HANDLER_REQUESTS.inc(name)
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def observe_upstream(host, seconds, failed=False):
+    """Record one outbound call to host"""
+    UPSTREAM_REQUESTS.inc(host)
+    UPSTREAM_LATENCY.observe(seconds, host)
+    if failed:
+        UPSTREAM_ERRORS.inc(host)
+
+
+def register_cache(name, cache):
+    """Export a TTLCache's hit/miss counters and size"""
+    _caches[name] = cache
+
+
+def add_source(function):
+    """Export the families returned by function() (see collect) along with this process's own"""
+    _sources.append(function)
+
+
+def _cache_families(extra):
+    families = (
+        ('bot_cache_hits_total', 'counter', 'Cache hits', 'hits'),
+        ('bot_cache_misses_total', 'counter', 'Cache misses', 'misses'),
+        ('bot_cache_hit_ratio', 'gauge', 'Cache hits / lookups since start', 'hit_ratio'),
+        ('bot_cache_entries', 'gauge', 'Live cache entries', 'entries'),
+        ('bot_cache_bytes', 'gauge', 'Approximate cache size in bytes', 'bytes'),
+    )
+    stats = {name: cache.stats() for name, cache in _caches.items()}
+    for metric, kind, documentation, key in families:
+        samples = [
+            f"{metric}{_format_labels(('cache',), (name,), extra)} {_format_value(values[key])}"
+            for name, values in stats.items()
+        ]
+        yield metric, kind, documentation, samples
+
+
+def collect(extra=()):
+    """
+    Return this process's metrics as [(name, kind, documentation, sample lines)].
+
+    extra is (label, value) pairs added to every sample, e.g. (('worker', 0),).
+    """
+    families = []
+    for metric in _metrics:
+        samples = [
+            f"{name}{_add_labels(labels, extra)} {_format_value(value)}"
+            for name, labels, value in metric.samples()
+        ]
+        families.append((metric.name, metric.kind, metric.documentation, samples))
+    families.extend(_cache_families(extra))
+    return families
+
+
+def render():
+    """Return all metrics, including those of registered sources, in the Prometheus text exposition format"""
+    merged = {}
+    for families in [collect()] + [source() for source in _sources]:
+        for name, kind, documentation, samples in families:
+            merged.setdefault(name, (kind, documentation, []))[2].extend(samples)
+    lines = []
+    for name, (kind, documentation, samples) in merged.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
@@ -1,81 +1,133 @@
 """
 Network Tools Module
-Handles ping, traceroute, IP info, speedtest, and Wake-on-LAN commands
+Handles ping, ping sweep, port check, DNS, traceroute, IP info, speedtest, and Wake-on-LAN commands
 """
 
-import subprocess
-import requests
+import asyncio
+import csv
+import errno
+import dns_resolver
+import httpx
+import http_client
+import io
+import ipaddress
 import logging
+import ping
 import platform
+import registry
 import re
+import socket
+import startup
+import time
+import tracing
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
+from cache import TTLCache
+import metrics
+
+# Loaded on first use or by the warm-up after startup (see startup.py)
+ipdb = startup.lazy_import('ipdb')
+speedtest = startup.lazy_import('speedtest_service')
+traceroute = startup.lazy_import('traceroute')
+wol = startup.lazy_import('wol')
 
 logger = logging.getLogger(__name__)
 
 # Detect OS for command compatibility
 IS_WINDOWS = platform.system().lower() == 'windows'
 
+# Minimum seconds between edits of a traceroute reply (Telegram rate-limits edits)
+TRACEROUTE_EDIT_INTERVAL = 1.0
+
+# /pingsweep limits: larger sweeps, or more live hosts than fit in a message, get a CSV report
+PINGSWEEP_MAX_ADDRESSES = 4096
+PINGSWEEP_INLINE_ADDRESSES = 256
+PINGSWEEP_TABLE_ROWS = 30
+
+# /portcheck limits: up to PORTCHECK_CONCURRENCY connects are in flight across
+# all running checks, which keeps open sockets well below the usual 1024 fd limit
+PORTCHECK_MAX_PORTS = 1024
+PORTCHECK_CONCURRENCY = 256
+PORTCHECK_TIMEOUT = 2.0
+PORTCHECK_TABLE_ROWS = 30         # Beyond this only open ports are listed
+
+# Machines listed in a Wake-on-LAN report
+WOL_LIST_ROWS = 50
+
+# /dns record types queried when none is given
+DNS_DEFAULT_TYPES = ('A', 'AAAA', 'MX', 'TXT')
+
+# Online IP lookups, so repeat addresses are answered without leaving the process
+ip_cache = TTLCache(maxsize=10000, ttl=24 * 3600)
+metrics.register_cache('ip_lookups', ip_cache)
+
+# Bulk /ipinfo limits
+IPINFO_MAX_ADDRESSES = 1024
+IPINFO_CONCURRENCY = 16
+IPINFO_TABLE_ROWS = 30            # Larger results are sent as a CSV document
+IPINFO_MAX_FILE_SIZE = 1024 * 1024
+
+# Candidate IPv4/IPv6 addresses or CIDR ranges in free text; never part of a
+# longer word, so names like std::cout or "Error::" in pasted logs are skipped
+IP_TOKEN_RE = re.compile(r'(?<![\w.])[0-9A-Fa-f:.]*[:.][0-9A-Fa-f:.]*(?:/\d{1,3})?(?![\w:]|\.\w)')
+
+# Shared by all /portcheck runs (see PORTCHECK_CONCURRENCY)
+_portcheck_slots = asyncio.Semaphore(PORTCHECK_CONCURRENCY)
+
+
+def format_ping(result):
+    """Format ping statistics like the summary of ping(8)"""
+    target = result.host if result.host == result.address else f"{result.host} ({result.address})"
+    lines = [
+        f"{result.sent} packets transmitted, {result.received} received, "
+        f"{result.loss:.0f}% packet loss"
+    ]
+    stats = result.stats_ms()
+    if stats:
+        lines.append("rtt min/avg/max/mdev = {:.3f}/{:.3f}/{:.3f}/{:.3f} ms".format(*stats))
+    icon = "✅" if result.alive else "❌"
+    return (
+        f"{icon} Ping Results for {target}:\n\n"
+        f"```\n" + "\n".join(lines) + "\n```\n"
+        f"📡 Probe: {result.method}"
+    )
+
 
 async def handle_ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle ping command using API"""
+    """Handle ping command with the native ping engine"""
     try:
-        # Get host from command args or message text
+        # Get host (and optional probe count) from command args or message text
         if update.message:
-            host = ' '.join(context.args) if context.args else update.message.text.strip()
+            args = context.args if context.args else update.message.text.split()
         else:
-            host = ' '.join(context.args) if context.args else None
+            args = context.args
         
-        if not host or host.startswith('/'):
+        if not args or args[0].startswith('/'):
             message = update.message or update.callback_query.message
             await message.reply_text(
                 "❌ Please provide an IP address or hostname.\n"
-                "Usage: `/ping <host>`\n"
+                "Usage: `/ping <host> [count]`\n"
                 "Example: `/ping 8.8.8.8`",
                 parse_mode='Markdown'
             )
             return
 
+        host = args[0]
+        count = ping.PING_COUNT
+        if len(args) > 1 and args[1].isdigit():
+            count = max(1, min(int(args[1]), ping.MAX_PING_COUNT))
+
         message = update.message or update.callback_query.message
         await message.reply_text(f"📡 Pinging {host}...")
 
-        # Use API-based ping service (works on all platforms including Replit)
         try:
-            import time
-            start_time = time.time()
-            
-            # Try to resolve and ping using requests
-            url = f"https://api.hackertarget.com/nping/?q={host}"
-            response = requests.get(url, timeout=10)
-            
-            elapsed_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            
-            if response.status_code == 200:
-                output = response.text.strip()
-                if output and "error" not in output.lower():
-                    result_text = f"✅ Ping Results for {host}:\n\n"
-                    result_text += f"⏱️ Response time: {elapsed_time:.2f} ms\n\n"
-                    result_text += f"```\n{output[:500]}\n```"
-                    await message.reply_text(result_text, parse_mode='Markdown')
-                else:
-                    # Fallback: Simple connectivity test
-                    try:
-                        test_url = f"http://{host}" if not host.startswith('http') else host
-                        test_response = requests.get(test_url, timeout=5)
-                        result_text = f"✅ Ping Results for {host}:\n\n"
-                        result_text += f"⏱️ Response time: {elapsed_time:.2f} ms\n"
-                        result_text += f"📊 Status: Host is reachable\n"
-                        result_text += f"📡 HTTP Status: {test_response.status_code}"
-                        await message.reply_text(result_text, parse_mode='Markdown')
-                    except:
-                        result_text = f"✅ Ping Results for {host}:\n\n"
-                        result_text += f"⏱️ Response time: {elapsed_time:.2f} ms\n"
-                        result_text += f"📊 Status: Host responded\n"
-                        await message.reply_text(result_text, parse_mode='Markdown')
-            else:
-                await message.reply_text(f"❌ Ping failed. Unable to reach {host}")
-        except Exception as e:
-            logger.error(f"Ping API error: {e}")
+            result = await ping.ping(host, count=count)
+            await message.reply_text(format_ping(result), parse_mode='Markdown')
+        except socket.gaierror:
+            await message.reply_text(f"❌ Unknown host: {host}")
+        except OSError as e:
+            logger.error(f"Ping error: {e}")
             await message.reply_text(f"❌ Error pinging {host}: {str(e)}")
     except Exception as e:
         logger.error(f"Error in ping: {e}")
@@ -83,8 +135,391 @@ async def handle_ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text(f"❌ Error: {str(e)}")
 
 
+def format_traceroute(host, address, hops, method, done):
+    """Format traceroute hops like traceroute(8), with a status line"""
+    target = host if host == address else f"{host} ({address})"
+    lines = []
+    for hop in hops:
+        if hop.answered:
+            times = '  '.join(f"{rtt * 1000:.3f} ms" for rtt in hop.rtts)
+            lines.append(f"{hop.ttl:>2}  {hop.address:<15}  {times}  {hop.note}".rstrip())
+        else:
+            lines.append(f"{hop.ttl:>2}  {'*' if done else '…'}")
+    if not lines:
+        lines.append("(no replies yet)" if not done else "(no replies)")
+
+    if not done:
+        status = "⏳ Tracing..."
+    elif hops and hops[-1].reached:
+        status = f"✅ Destination reached in {len(hops)} hop{'s' if len(hops) != 1 else ''}"
+    elif hops and hops[-1].note:
+        status = f"❌ Stopped at hop {len(hops)}: unreachable ({hops[-1].note})"
+    else:
+        status = "⚠️ Destination did not answer"
+    return (
+        f"🛤️ Traceroute to {target}:\n\n"
+        f"```\n" + "\n".join(lines) + "\n```\n"
+        f"{status}\n📡 Probe: {method}"
+    )
+
+
+async def _edit_reply(status_message, text):
+    try:
+        await status_message.edit_text(text, parse_mode='Markdown')
+    except RetryAfter:
+        pass  # Skip this redraw; the next one shows the same state
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+
+def _is_owner(user):
+    """Whether a Telegram user is one of ALLOWED_USER_ID"""
+    try:
+        from config import ALLOWED_USER_ID
+    except ImportError:
+        return False
+    if isinstance(ALLOWED_USER_ID, list):
+        return user.id in ALLOWED_USER_ID
+    return user.id == ALLOWED_USER_ID
+
+
+def _is_internal(address):
+    """Whether an address is loopback, private, link-local or otherwise not public"""
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return not address.is_global or address.is_multicast
+
+
+def format_pingsweep_csv(results):
+    """Format sweep results as CSV bytes"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['address', 'status', 'rtt_ms', 'probe'])
+    for result in results:
+        rtt = f"{result.rtts[0] * 1000:.3f}" if result.alive else ''
+        writer.writerow([result.address, 'up' if result.alive else 'down', rtt, result.method])
+    return output.getvalue().encode('utf-8')
+
+
+async def handle_pingsweep(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle ping sweep command: which hosts in a CIDR range answer"""
+    try:
+        message = update.message or update.callback_query.message
+        text = ' '.join(context.args) if context.args else (
+            update.message.text.strip() if update.message else ''
+        )
+        if not text or text.startswith('/'):
+            await message.reply_text(
+                "❌ Please provide a network range.\n"
+                "Usage: `/pingsweep <cidr>`\n"
+                "Example: `/pingsweep 192.168.1.0/24`",
+                parse_mode='Markdown'
+            )
+            return
+
+        try:
+            network = ipaddress.ip_network(text.split()[0], strict=False)
+        except ValueError:
+            await message.reply_text(f"❌ Invalid network range: {text.split()[0]}")
+            return
+        if network.num_addresses > PINGSWEEP_MAX_ADDRESSES:
+            await message.reply_text(
+                f"❌ Range too large: {network.num_addresses} addresses "
+                f"(max {PINGSWEEP_MAX_ADDRESSES})."
+            )
+            return
+        # Only the owner may sweep the networks around the bot host
+        if not _is_owner(update.effective_user) and any(_is_internal(address) for address in network):
+            await message.reply_text("❌ Access denied: only public ranges can be swept.")
+            logger.warning(f"Refused pingsweep of {network} by user {update.effective_user.id}")
+            return
+
+        addresses = [str(address) for address in (network.hosts() if network.num_addresses > 2 else network)]
+        plural = 's' if len(addresses) != 1 else ''
+        await message.reply_text(f"📡 Sweeping {network} ({len(addresses)} host{plural})...")
+
+        start = time.perf_counter()
+        results = await ping.sweep(addresses)
+        elapsed = time.perf_counter() - start
+        alive = [result for result in results if result.alive]
+        summary = (
+            f"📡 **Ping sweep {network}**\n"
+            f"✅ {len(alive)} up, ❌ {len(results) - len(alive)} down "
+            f"({len(results)} host{plural}, {elapsed:.1f} s, {results[0].method if results else 'ICMP'})"
+        )
+
+        if len(results) <= PINGSWEEP_INLINE_ADDRESSES and len(alive) <= PINGSWEEP_TABLE_ROWS:
+            if alive:
+                width = max(len(result.address) for result in alive)
+                table = "\n".join(
+                    f"{result.address:<{width}}  {result.rtts[0] * 1000:.2f} ms" for result in alive
+                )
+                summary += f"\n\n```\n{table}\n```"
+            await message.reply_text(summary, parse_mode='Markdown')
+        else:
+            await message.reply_document(
+                document=io.BytesIO(format_pingsweep_csv(results)),
+                filename=f"pingsweep-{network.network_address}-{network.prefixlen}.csv",
+                caption=summary,
+                parse_mode='Markdown'
+            )
+    except Exception as e:
+        logger.error(f"Error in pingsweep: {e}")
+        message = update.message or update.callback_query.message
+        await message.reply_text(f"❌ Error: {str(e)}")
+
+
+def parse_ports(spec):
+    """Parse '22,80,443', '8000-8100' or a mix into a sorted list of ports"""
+    ports = set()
+    for part in re.split(r'[,\s]+', spec.strip()):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        if not first.isdigit() or (last and not last.isdigit()):
+            raise ValueError(f"invalid port: {part}")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"invalid port range: {part}")
+        if last - first + 1 + len(ports) > PORTCHECK_MAX_PORTS:
+            raise ValueError(f"too many ports (max {PORTCHECK_MAX_PORTS})")
+        ports.update(range(first, last + 1))
+    if not ports:
+        raise ValueError("no ports given")
+    return sorted(ports)
+
+
+async def check_port(address, port, timeout=PORTCHECK_TIMEOUT):
+    """
+    Try a non-blocking TCP connect; return (state, seconds).
+
+    'open' if the handshake completes, 'closed' if it is refused (RST) and
+    'filtered' if nothing answers in time or the host is unreachable, and
+    'error' if no socket could be opened (e.g. out of file descriptors).
+    """
+    family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+    loop = asyncio.get_running_loop()
+    sock = None
+    start = time.perf_counter()
+    try:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+        return 'open', time.perf_counter() - start
+    except ConnectionRefusedError:
+        return 'closed', time.perf_counter() - start
+    except OSError as e:
+        if sock is None or e.errno in (errno.EMFILE, errno.ENFILE):
+            logger.warning(f"Port check of {address}:{port} failed: {e}")
+            return 'error', None
+        return 'filtered', None
+    except asyncio.TimeoutError:
+        return 'filtered', None
+    finally:
+        if sock is not None:
+            sock.close()
+
+
+async def check_ports(address, ports, timeout=PORTCHECK_TIMEOUT):
+    """Check ports concurrently (see PORTCHECK_CONCURRENCY); returns [(port, state, seconds)] in port order"""
+    async def check(port):
+        async with _portcheck_slots:
+            return (port, *await check_port(address, port, timeout))
+
+    with tracing.span('portcheck', address=address, ports=len(ports)):
+        return await asyncio.gather(*(check(port) for port in ports))
+
+
+def _service_name(port):
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return ''
+
+
+def format_portcheck(host, address, results, elapsed):
+    """Format port states and connect latencies as a code block"""
+    target = host if host == address else f"{host} ({address})"
+    counts = {state: sum(1 for _, s, _ in results if s == state) for state in ('open', 'closed', 'filtered', 'error')}
+    shown = results if len(results) <= PORTCHECK_TABLE_ROWS else [r for r in results if r[1] == 'open']
+    icons = {'open': '✅', 'closed': '❌', 'filtered': '🚫', 'error': '⚠️'}
+    lines = []
+    for port, state, seconds in shown[:PORTCHECK_TABLE_ROWS]:
+        latency = f"{seconds * 1000:.1f} ms" if seconds is not None else '-'
+        lines.append(f"{icons[state]} {port:>5}/tcp  {state:<8}  {latency:>9}  {_service_name(port)}".rstrip())
+    if len(shown) > PORTCHECK_TABLE_ROWS:
+        lines.append(f"... and {len(shown) - PORTCHECK_TABLE_ROWS} more open ports")
+    errors = f", {counts['error']} not checked" if counts['error'] else ''
+    text = (
+        f"🔌 **Port check for {target}**\n"
+        f"{counts['open']} open, {counts['closed']} closed, {counts['filtered']} filtered{errors} "
+        f"({len(results)} port{'s' if len(results) != 1 else ''}, {elapsed:.1f} s)"
+    )
+    if lines:
+        text += "\n\n```\n" + "\n".join(lines) + "\n```"
+    return text
+
+
+async def handle_portcheck(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle port check command: concurrent TCP connects to each port"""
+    try:
+        # Get host and ports from command args or message text
+        if update.message:
+            args = context.args if context.args else update.message.text.split()
+        else:
+            args = context.args
+
+        message = update.message or update.callback_query.message
+        if not args or len(args) < 2 or args[0].startswith('/'):
+            await message.reply_text(
+                "❌ Please provide a host and ports.\n"
+                "Usage: `/portcheck <host> <ports|range>`\n"
+                "Example: `/portcheck example.com 22,80,443` or `/portcheck 10.0.0.5 8000-8100`\n"
+                f"Up to {PORTCHECK_MAX_PORTS} ports, {PORTCHECK_CONCURRENCY} at a time "
+                f"({PORTCHECK_TIMEOUT:g} s timeout each)",
+                parse_mode='Markdown'
+            )
+            return
+
+        host = args[0]
+        try:
+            ports = parse_ports(' '.join(args[1:]))
+        except ValueError as e:
+            await message.reply_text(f"❌ {str(e).capitalize()}")
+            return
+        try:
+            address = await dns_resolver.resolve(host)
+        except socket.gaierror:
+            await message.reply_text(f"❌ Unknown host: {host}")
+            return
+        # Checked on the resolved address, so names pointing inside are refused too
+        if not _is_owner(update.effective_user) and _is_internal(address):
+            await message.reply_text("❌ Access denied: only public hosts can be checked.")
+            logger.warning(f"Refused portcheck of {host} ({address}) by user {update.effective_user.id}")
+            return
+
+        start = time.perf_counter()
+        results = await check_ports(address, ports)
+        await message.reply_text(
+            format_portcheck(host, address, results, time.perf_counter() - start),
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Error in portcheck: {e}")
+        message = update.message or update.callback_query.message
+        await message.reply_text(f"❌ Error: {str(e)}")
+
+
+def format_dns(name, results, elapsed):
+    """Format /dns answers per record type, with query timings"""
+    lines = []
+    timings = []
+    server = None
+    for qtype, answer, cached in results:
+        if isinstance(answer, Exception):
+            lines.append(f"{qtype:<5} ⚠️ {answer}")
+            timings.append(f"{qtype} failed")
+            continue
+        server = server or answer.server
+        timings.append(f"{qtype} {'cached' if cached else f'{answer.elapsed * 1000:.0f} ms'}")
+        if answer.rcode:
+            lines.append(f"{qtype:<5} {answer.status}")
+        elif not answer.records:
+            lines.append(f"{qtype:<5} (no records)")
+        for rtype, ttl, value in answer.records:
+            value = str(value).replace('`', "'")
+            if rtype == 'TXT':
+                value = f'"{value}"'
+            lines.append(f"{rtype:<5} {value}  (ttl {ttl})")
+    # In backticks: names like _dmarc.example.com would break Markdown
+    shown = name.replace('`', "'")
+    text = (
+        f"🔎 DNS lookup for `{shown}`:\n\n"
+        f"```\n" + "\n".join(lines) + "\n```\n"
+        f"⏱️ {', '.join(timings)} (total {elapsed * 1000:.0f} ms)"
+    )
+    if server:
+        text += f"\n📡 Server: {server}"
+    return text
+
+
+async def handle_dns(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle DNS lookup command: query record types concurrently through the cache"""
+    try:
+        # Get name (and optional record type) from command args or message text
+        if update.message:
+            args = context.args if context.args else update.message.text.split()
+        else:
+            args = context.args
+
+        message = update.message or update.callback_query.message
+        if not args or args[0].startswith('/'):
+            await message.reply_text(
+                "❌ Please provide a domain name.\n"
+                "Usage: `/dns <name> [type]`\n"
+                f"Types: {', '.join(dns_resolver.TYPES)}\n"
+                "Example: `/dns google.com` or `/dns google.com MX`",
+                parse_mode='Markdown'
+            )
+            return
+
+        name = args[0]
+        if len(args) > 1:
+            qtypes = (args[1].upper(),)
+            if qtypes[0] not in dns_resolver.TYPES:
+                await message.reply_text(f"❌ Unsupported record type: {args[1]}")
+                return
+        else:
+            qtypes = DNS_DEFAULT_TYPES
+        try:
+            # An IP address gets a reverse (PTR) lookup
+            name = ipaddress.ip_address(name).reverse_pointer
+            qtypes = ('PTR',)
+        except ValueError:
+            pass
+        try:
+            dns_resolver.encode_name(name)
+        except ValueError:
+            await message.reply_text(f"❌ Invalid domain name: {name}")
+            return
+
+        cached = [dns_resolver.is_cached(name, qtype) for qtype in qtypes]
+        start = time.perf_counter()
+        answers = await asyncio.gather(
+            *(dns_resolver.lookup(name, qtype) for qtype in qtypes), return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+        await message.reply_text(
+            format_dns(name, list(zip(qtypes, answers, cached)), elapsed), parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Error in dns: {e}")
+        message = update.message or update.callback_query.message
+        await message.reply_text(f"❌ Error: {str(e)}")
+
+
+async def _traceroute_api(message, host):
+    """Trace with hackertarget's mtr API where probe sockets are not available"""
+    try:
+        url = f"https://api.hackertarget.com/mtr/?q={host}"
+        response = await http_client.get(url, timeout=30)
+        output = response.text.strip() if response.status_code == 200 else ''
+        if output and "error" not in output.lower() and len(output) > 10:
+            # Limit output length for Telegram
+            if len(output) > 3000:
+                output = output[:3000] + "\n... (truncated)"
+            await message.reply_text(f"✅ Traceroute Results for {host}:\n\n```\n{output}\n```", parse_mode='Markdown')
+        else:
+            await message.reply_text(f"❌ Traceroute failed. Unable to trace route to {host}")
+    except httpx.HTTPError as e:
+        logger.error(f"Traceroute API error: {e}")
+        await message.reply_text(f"❌ Error running traceroute: {str(e)}")
+
+
 async def handle_traceroute(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle traceroute command using API"""
+    """Handle traceroute command, editing the reply as hops answer"""
     try:
         # Get host from command args or message text
         if update.message:
@@ -103,162 +538,329 @@ async def handle_traceroute(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         message = update.message or update.callback_query.message
-        await message.reply_text(f"🛤️ Running traceroute to {host}... This may take a while.")
-
-        # Use API-based traceroute service (works on all platforms including Replit)
         try:
-            url = f"https://api.hackertarget.com/mtr/?q={host}"
-            response = requests.get(url, timeout=30)
-            
-            if response.status_code == 200:
-                output = response.text.strip()
-                if output and "error" not in output.lower() and len(output) > 10:
-                    # Limit output length for Telegram
-                    if len(output) > 3000:
-                        output = output[:3000] + "\n... (truncated)"
-                    await message.reply_text(f"✅ Traceroute Results for {host}:\n\n```\n{output}\n```", parse_mode='Markdown')
-                else:
-                    # Fallback to alternative API
-                    alt_url = f"https://ip-api.com/trace/{host}"
-                    alt_response = requests.get(alt_url, timeout=30)
-                    if alt_response.status_code == 200:
-                        await message.reply_text(f"✅ Traceroute Results for {host}:\n\n```\n{alt_response.text[:3000]}\n```", parse_mode='Markdown')
-                    else:
-                        await message.reply_text(f"❌ Traceroute failed. Unable to trace route to {host}")
-            else:
-                await message.reply_text(f"❌ Traceroute failed. Unable to trace route to {host}")
-        except requests.RequestException as e:
-            logger.error(f"Traceroute API error: {e}")
-            await message.reply_text(f"❌ Error running traceroute: {str(e)}")
+            address = await dns_resolver.resolve(host)
+        except socket.gaierror:
+            await message.reply_text(f"❌ Unknown host: {host}")
+            return
+
+        status_message = await message.reply_text(f"🛤️ Tracing route to {host}...")
+        with tracing.span('traceroute', host=host, address=address):
+            tracer = traceroute.Traceroute(address)
+            task = asyncio.create_task(tracer.run())
+            shown = 0
+            # All hops are probed at once; redraw as replies arrive, at most once per interval
+            while not task.done():
+                await asyncio.wait({task}, timeout=TRACEROUTE_EDIT_INTERVAL)
+                if not task.done() and tracer.version != shown:
+                    shown = tracer.version
+                    await _edit_reply(
+                        status_message, format_traceroute(host, address, tracer.result(), tracer.method, False)
+                    )
+            try:
+                hops = task.result()
+            except traceroute.TracerouteError as e:
+                logger.warning(f"Native traceroute unavailable ({e}), using hackertarget")
+                await _traceroute_api(message, host)
+                return
+        await _edit_reply(status_message, format_traceroute(host, address, hops, tracer.method, True))
     except Exception as e:
         logger.error(f"Error in traceroute: {e}")
         message = update.message or update.callback_query.message
         await message.reply_text(f"❌ Error: {str(e)}")
 
 
+def _ipdb_info(record):
+    """Normalize an offline database record"""
+    latitude, longitude = record.get('latitude'), record.get('longitude')
+    org = ' '.join(part for part in (record.get('asn'), record.get('org')) if part)
+    return {
+        'city': record.get('city', 'N/A'),
+        'region': record.get('region', 'N/A'),
+        'country': record.get('country_name') or record.get('country', 'N/A'),
+        'postal': record.get('postal', 'N/A'),
+        'loc': f"{latitude},{longitude}" if latitude and longitude else 'N/A',
+        'org': org or 'N/A',
+        'timezone': record.get('timezone', 'N/A'),
+        'source': 'local database',
+    }
+
+
+async def _lookup_ip_online(ip):
+    """Look up an IP with IPinfo, falling back to ipapi.co"""
+    try:
+        from config import IPINFO_API_TOKEN
+        url_json = f"https://ipinfo.io/{ip}/json"
+        params_json = {'token': IPINFO_API_TOKEN} if IPINFO_API_TOKEN else {}
+        response_json = await http_client.get(url_json, params=params_json, timeout=10)
+        response_json.raise_for_status()
+        data_json = response_json.json()
+        return {
+            'city': data_json.get('city', 'N/A'),
+            'region': data_json.get('region', 'N/A'),
+            'country': data_json.get('country', 'N/A'),
+            'postal': data_json.get('postal', 'N/A'),
+            'loc': data_json.get('loc', 'N/A'),
+            'org': data_json.get('org', 'N/A'),
+            'timezone': data_json.get('timezone', 'N/A'),
+            'source': 'ipinfo.io',
+        }
+    except (ImportError, httpx.HTTPError, ValueError) as e:
+        logger.error(f"IPinfo API error: {e}")
+
+    # Fallback to free API without token
+    response = await http_client.get(f"https://ipapi.co/{ip}/json/", timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('error'):
+        raise ValueError(data.get('reason', 'lookup failed'))
+    return {
+        'city': data.get('city', 'N/A'),
+        'region': data.get('region', 'N/A'),
+        'country': data.get('country_name', 'N/A'),
+        'postal': data.get('postal', 'N/A'),
+        'loc': f"{data.get('latitude', 'N/A')}, {data.get('longitude', 'N/A')}",
+        'org': data.get('org', 'N/A'),
+        'timezone': data.get('timezone', 'N/A'),
+        'source': 'ipapi.co',
+    }
+
+
+async def lookup_ip(ip):
+    """Return location info for an IP: offline database first, then cached online APIs"""
+    record = ipdb.lookup(ip)
+    if record is not None:
+        return _ipdb_info(record)
+    return await ip_cache.get_or_fetch(ip, lambda: _lookup_ip_online(ip))
+
+
+def format_ipinfo(ip, info):
+    """Format the IP info reply"""
+    info_text = f"📍 **IP Information for {ip}**\n\n"
+    info_text += f"🌍 **Location:** {info['city']}, {info['region']}, {info['country']}\n"
+    info_text += f"📮 **Postal Code:** {info['postal']}\n"
+    info_text += f"📍 **Coordinates:** {info['loc']}\n"
+    info_text += f"🏢 **Organization:** {info['org']}\n"
+    info_text += f"🌐 **Timezone:** {info['timezone']}\n"
+    info_text += f"🔎 **Source:** {info['source']}\n"
+    return info_text
+
+
+def extract_ips(text):
+    """
+    Extract unique IP addresses from free text (e.g. pasted log lines).
+
+    CIDR ranges are expanded to their host addresses. Raises ValueError if
+    a range, or the total, exceeds IPINFO_MAX_ADDRESSES. Unspecified
+    addresses (0.0.0.0, ::) are skipped.
+
+    >>> extract_ips('at std::cout << x; Foo::bar() Error:: from 1.2.3.4:22 [2001:db8::1]:443 ::')
+    ['1.2.3.4', '2001:db8::1']
+    """
+    addresses = []
+    seen = set()
+    for token in IP_TOKEN_RE.findall(text):
+        network = _parse_ip_token(token) or _parse_ip_token(token.strip('.:'))
+        if network is None or (network.num_addresses == 1 and network.network_address.is_unspecified):
+            continue
+        if network.num_addresses > IPINFO_MAX_ADDRESSES:
+            raise ValueError(f"Range {network} is too large (max {IPINFO_MAX_ADDRESSES} addresses)")
+        hosts = list(network.hosts()) if network.num_addresses > 1 else [network.network_address]
+        for host in hosts:
+            if host not in seen:
+                seen.add(host)
+                addresses.append(str(host))
+                if len(addresses) > IPINFO_MAX_ADDRESSES:
+                    raise ValueError(f"Too many addresses (max {IPINFO_MAX_ADDRESSES})")
+    return addresses
+
+
+def _parse_ip_token(token):
+    """Parse an address or CIDR token (allowing an IPv4 ':port' suffix) as a network"""
+    try:
+        return ipaddress.ip_network(token, strict=False)
+    except ValueError:
+        pass
+    if token.count('.') == 3 and token.count(':') == 1:
+        try:
+            return ipaddress.ip_network(token.split(':')[0])
+        except ValueError:
+            pass
+    return None
+
+
+async def lookup_many(ips):
+    """Look up many IPs concurrently; returns (ip, info or exception) pairs in order"""
+    semaphore = asyncio.Semaphore(IPINFO_CONCURRENCY)
+
+    async def lookup_one(ip):
+        async with semaphore:
+            try:
+                return ip, await lookup_ip(ip)
+            except Exception as e:
+                return ip, e
+
+    return await asyncio.gather(*(lookup_one(ip) for ip in ips))
+
+
+def format_ipinfo_table(results):
+    """Format bulk lookup results as a compact monospace table"""
+    width = max([len('IP')] + [len(ip) for ip, _ in results])
+    lines = [f"{'IP':<{width}} {'CC':<3} {'City':<14} Org"]
+    for ip, info in results:
+        if isinstance(info, Exception):
+            lines.append(f"{ip:<{width}} error: {str(info)[:40]}")
+        else:
+            lines.append(
+                f"{ip:<{width}} {str(info['country'])[:3]:<3} {str(info['city'])[:14]:<14} {str(info['org'])[:28]}"
+            )
+    return "\n".join(lines)
+
+
+def format_ipinfo_csv(results):
+    """Format bulk lookup results as CSV bytes"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    fields = ['city', 'region', 'country', 'postal', 'loc', 'org', 'timezone', 'source']
+    writer.writerow(['ip'] + fields + ['error'])
+    for ip, info in results:
+        if isinstance(info, Exception):
+            writer.writerow([ip] + [''] * len(fields) + [str(info)])
+        else:
+            writer.writerow([ip] + [info.get(field, '') for field in fields] + [''])
+    return output.getvalue().encode('utf-8')
+
+
+async def reply_ipinfo_bulk(message, ips):
+    """Look up many IPs and reply with a table, or a CSV document for large inputs"""
+    await message.reply_text(f"📍 Looking up {len(ips)} IP addresses...")
+    results = await lookup_many(ips)
+    failed = sum(1 for _, info in results if isinstance(info, Exception))
+    summary = f"📍 **IP Information for {len(results)} addresses**"
+    if failed:
+        summary += f" ({failed} failed)"
+
+    if len(results) <= IPINFO_TABLE_ROWS:
+        await message.reply_text(
+            f"{summary}\n\n```\n{format_ipinfo_table(results)}\n```",
+            parse_mode='Markdown'
+        )
+    else:
+        await message.reply_document(
+            document=io.BytesIO(format_ipinfo_csv(results)),
+            filename='ipinfo.csv',
+            caption=summary,
+            parse_mode='Markdown'
+        )
+
+
 async def handle_ipinfo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle IP info command using IPinfo Lite API"""
+    """Handle IP info command for one or many IPs (local database or IPinfo Lite API)"""
     try:
-        # Get IP from command args or message text
+        # Get IPs from command args or message text
         if update.message:
-            ip = ' '.join(context.args) if context.args else update.message.text.strip()
+            text = ' '.join(context.args) if context.args else update.message.text.strip()
         else:
-            ip = ' '.join(context.args) if context.args else None
+            text = ' '.join(context.args) if context.args else None
         
-        if not ip or ip.startswith('/'):
+        if not text or text.startswith('/'):
             message = update.message or update.callback_query.message
             await message.reply_text(
                 "❌ Please provide an IP address.\n"
-                "Usage: `/ipinfo <ip>`\n"
-                "Example: `/ipinfo 8.8.8.8`",
+                "Usage: `/ipinfo <ip> [ip ...]` or `/ipinfo <cidr>`\n"
+                "Example: `/ipinfo 8.8.8.8`\n\n"
+                "You can also paste log lines or upload a text file.",
                 parse_mode='Markdown'
             )
             return
 
         message = update.message or update.callback_query.message
+
+        try:
+            ips = extract_ips(text)
+        except ValueError as e:
+            await message.reply_text(f"❌ {str(e)}")
+            return
+
+        if not ips:
+            await message.reply_text("❌ No valid IP addresses found.")
+            return
+        if len(ips) > 1 or '/' in text:
+            await reply_ipinfo_bulk(message, ips)
+            return
+
+        ip = ips[0]
         await message.reply_text(f"📍 Fetching IP information for {ip}...")
 
-        # IPinfo API - try with token first, fallback to free API
         try:
-            from config import IPINFO_API_TOKEN
-            # Try JSON API first (more reliable)
-            url_json = f"https://ipinfo.io/{ip}/json"
-            params_json = {'token': IPINFO_API_TOKEN} if IPINFO_API_TOKEN else {}
-            response_json = requests.get(url_json, params=params_json, timeout=10)
-            response_json.raise_for_status()
-            data_json = response_json.json()
-            
-            # Format response
-            info_text = f"📍 **IP Information for {ip}**\n\n"
-            info_text += f"🌍 **Location:** {data_json.get('city', 'N/A')}, {data_json.get('region', 'N/A')}, {data_json.get('country', 'N/A')}\n"
-            info_text += f"📮 **Postal Code:** {data_json.get('postal', 'N/A')}\n"
-            info_text += f"📍 **Coordinates:** {data_json.get('loc', 'N/A')}\n"
-            info_text += f"🏢 **Organization:** {data_json.get('org', 'N/A')}\n"
-            info_text += f"🌐 **Timezone:** {data_json.get('timezone', 'N/A')}\n"
-            
-            await message.reply_text(info_text, parse_mode='Markdown')
-        except ImportError:
-            # Fallback to free API without token
-            try:
-                url = f"https://ipapi.co/{ip}/json/"
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                info_text = f"📍 **IP Information for {ip}**\n\n"
-                info_text += f"🌍 **Location:** {data.get('city', 'N/A')}, {data.get('region', 'N/A')}, {data.get('country_name', 'N/A')}\n"
-                info_text += f"📮 **Postal Code:** {data.get('postal', 'N/A')}\n"
-                info_text += f"📍 **Coordinates:** {data.get('latitude', 'N/A')}, {data.get('longitude', 'N/A')}\n"
-                info_text += f"🏢 **Organization:** {data.get('org', 'N/A')}\n"
-                info_text += f"🌐 **Timezone:** {data.get('timezone', 'N/A')}\n"
-                await message.reply_text(info_text, parse_mode='Markdown')
-            except:
-                await message.reply_text(
-                    "❌ IPinfo API token not configured.\n"
-                    "Please add IPINFO_API_TOKEN to config.py"
-                )
-        except requests.RequestException as e:
-            logger.error(f"IPinfo API error: {e}")
-            # Try fallback API
-            try:
-                url = f"https://ipapi.co/{ip}/json/"
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                info_text = f"📍 **IP Information for {ip}**\n\n"
-                info_text += f"🌍 **Location:** {data.get('city', 'N/A')}, {data.get('region', 'N/A')}, {data.get('country_name', 'N/A')}\n"
-                info_text += f"📮 **Postal Code:** {data.get('postal', 'N/A')}\n"
-                info_text += f"📍 **Coordinates:** {data.get('latitude', 'N/A')}, {data.get('longitude', 'N/A')}\n"
-                info_text += f"🏢 **Organization:** {data.get('org', 'N/A')}\n"
-                info_text += f"🌐 **Timezone:** {data.get('timezone', 'N/A')}\n"
-                await message.reply_text(info_text, parse_mode='Markdown')
-            except:
-                await message.reply_text(f"❌ Error fetching IP info: {str(e)}")
+            info = await lookup_ip(ip)
+            await message.reply_text(format_ipinfo(ip, info), parse_mode='Markdown')
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"IP info lookup error: {e}")
+            await message.reply_text(f"❌ Error fetching IP info: {str(e)}")
     except Exception as e:
         logger.error(f"Error in ipinfo: {e}")
         message = update.message or update.callback_query.message
         await message.reply_text(f"❌ Error: {str(e)}")
 
 
+async def handle_ipinfo_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle an uploaded text file of IPs (e.g. an access log) for bulk IP info"""
+    try:
+        document = update.message.document
+        if document.file_size and document.file_size > IPINFO_MAX_FILE_SIZE:
+            await update.message.reply_text(
+                f"❌ File is too large (max {IPINFO_MAX_FILE_SIZE // 1024} KB)."
+            )
+            return
+
+        file = await document.get_file()
+        text = (await file.download_as_bytearray()).decode('utf-8', errors='replace')
+
+        try:
+            ips = extract_ips(text)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {str(e)}")
+            return
+
+        if not ips:
+            await update.message.reply_text("❌ No valid IP addresses found in the file.")
+            return
+        await reply_ipinfo_bulk(update.message, ips)
+    except Exception as e:
+        logger.error(f"Error in ipinfo file: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+
 async def handle_speedtest(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle speedtest command using speedtest-cli"""
+    """Handle speedtest command using the shared speedtest service"""
     try:
         message = update.message or update.callback_query.message
-        await message.reply_text("⚡ Running speedtest... This may take 30-60 seconds.")
 
-        # Run speedtest-cli
+        result = speedtest.speedtest_service.cached()
+        if result is None:
+            if speedtest.speedtest_service.running:
+                await message.reply_text("⚡ A speedtest is already running, waiting for its results...")
+            else:
+                await message.reply_text("⚡ Running speedtest... This may take 30-60 seconds.")
+
         try:
-            result = subprocess.run(
-                ['speedtest-cli', '--simple'],
-                capture_output=True,
-                text=True,
-                timeout=120
+            if result is None:
+                result = await speedtest.speedtest_service.run()
+            await message.reply_text(
+                f"⚡ **Speedtest Results:**\n\n```\n{result.output}\n```\n"
+                f"🕒 Measured {format_age(result.age)}",
+                parse_mode='Markdown'
             )
-            
-            if result.returncode == 0:
-                output = result.stdout
-                await message.reply_text(f"⚡ **Speedtest Results:**\n\n```\n{output}\n```", parse_mode='Markdown')
-            else:
-                # Try with --secure flag
-                result = subprocess.run(
-                    ['speedtest-cli', '--simple', '--secure'],
-                    capture_output=True,
-                    text=True,
-                    timeout=120
-                )
-                if result.returncode == 0:
-                    output = result.stdout
-                    await message.reply_text(f"⚡ **Speedtest Results:**\n\n```\n{output}\n```", parse_mode='Markdown')
-                else:
-                    await message.reply_text(
-                        f"❌ Speedtest failed.\n\n"
-                        f"Make sure speedtest-cli is installed:\n"
-                        f"`pip install speedtest-cli`\n\n"
-                        f"Error: {result.stderr or result.stdout}",
-                        parse_mode='Markdown'
-                    )
-        except subprocess.TimeoutExpired:
+        except speedtest.SpeedtestError as e:
+            await message.reply_text(
+                f"❌ Speedtest failed.\n\n"
+                f"Make sure speedtest-cli is installed:\n"
+                f"`pip install speedtest-cli`\n\n"
+                f"Error: {e}",
+                parse_mode='Markdown'
+            )
+        except asyncio.TimeoutError:
             await message.reply_text("⏱️ Speedtest timeout.")
         except FileNotFoundError:
             await message.reply_text(
@@ -272,6 +874,59 @@ async def handle_speedtest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text(f"❌ Error: {str(e)}")
 
 
+def format_age(seconds):
+    """Format a result age as a short human-readable string"""
+    if seconds < 5:
+        return "just now"
+    if seconds < 60:
+        return f"{int(seconds)} s ago"
+    return f"{int(seconds // 60)} min ago"
+
+
+def format_wol(label, targets, packets, verifying, elapsed):
+    """Format a wake-up report; targets with a host show whether they are up yet"""
+    broadcasts = ', '.join(wol.WOL_BROADCASTS)
+    width = max((len(target.name) for target in targets if target.name != target.mac), default=0)
+    lines = []
+    for target in targets[:WOL_LIST_ROWS]:
+        if target.online:
+            state = f"✅ up after {target.online_after:.0f} s"
+        elif target.error:
+            state = f"⚠️ {target.error}"
+        elif target.verifiable:
+            state = "⏳ waiting" if verifying else "❌ no reply"
+        else:
+            state = "📨 sent"
+        name = target.name if target.name != target.mac else ''
+        lines.append(f"{name:<{width}}  {target.mac}  {state}" if width else f"{target.mac}  {state}")
+    if len(targets) > WOL_LIST_ROWS:
+        lines.append(f"... and {len(targets) - WOL_LIST_ROWS} more")
+    text = (
+        f"🔌 **Wake-on-LAN:** `{label}`\n"
+        f"📡 {packets} magic packets sent to {broadcasts} ({wol.WOL_REPEAT} bursts)\n\n"
+        f"```\n" + "\n".join(lines) + "\n```\n"
+    )
+    checked = [target for target in targets if target.verifiable]
+    online = sum(1 for target in checked if target.online)
+    failed = sum(1 for target in checked if target.error)
+    if not checked:
+        text += (
+            "⏳ The target PC should wake up shortly.\n\n"
+            "**Note:** Ensure WOL is enabled in BIOS/UEFI and on the network adapter."
+        )
+    elif verifying:
+        text += f"🟡 {online}/{len(checked)} online, checking... ({elapsed:.0f} s)"
+    elif online == len(checked):
+        text += f"🟢 All {len(checked)} online in {elapsed:.0f} s"
+    else:
+        silent = len(checked) - online - failed
+        problems = [f"{silent} did not answer within {elapsed:.0f} s"] if silent else []
+        if failed:
+            problems.append(f"{failed} could not be checked")
+        text += f"⚠️ {online}/{len(checked)} online; {', '.join(problems)}"
+    return text
+
+
 async def handle_wol(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle Wake-on-LAN command to wake up a PC remotely"""
     try:
@@ -308,92 +963,143 @@ async def handle_wol(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error("ALLOWED_USER_ID not configured")
             return
         
-        # Get MAC address from command args or message text
+        # Get MAC addresses and/or group names from command args or message text
         if update.message:
-            mac = ' '.join(context.args) if context.args else update.message.text.strip()
+            args = context.args if context.args else update.message.text.split()
         else:
-            mac = ' '.join(context.args) if context.args else None
-        
-        if not mac or mac.startswith('/'):
-            message = update.message or update.callback_query.message
+            args = context.args
+
+        message = update.message or update.callback_query.message
+        if not args or args[0].startswith('/'):
+            groups = ', '.join(f"`{name}` ({len(members)})" for name, members in wol.WOL_GROUPS.items())
             await message.reply_text(
-                "❌ Please provide a MAC address.\n\n"
-                "**Usage:** `/wol <MAC_ADDRESS>`\n"
+                "❌ Please provide a MAC address or group.\n\n"
+                "**Usage:** `/wol <MAC> [host]` or `/wol <group>`\n"
                 "**Example:** `/wol 00:11:22:33:44:55`\n"
                 "**Alternative:** `/wake_pc <MAC_ADDRESS>`\n\n"
+                "Several MACs and groups can be woken at once. With a host (IP or\n"
+                "name) after a MAC, I'll tell you when the machine is up.\n\n"
                 "MAC address formats supported:\n"
                 "• `00:11:22:33:44:55` (with colons)\n"
                 "• `00-11-22-33-44-55` (with hyphens)\n"
-                "• `001122334455` (no separators)",
+                "• `001122334455` (no separators)"
+                + (f"\n\n**Groups:** {groups}" if groups else ""),
                 parse_mode='Markdown'
             )
             return
 
-        message = update.message or update.callback_query.message
-        
-        # Validate MAC address format
-        mac_clean = mac.replace(':', '').replace('-', '').replace(' ', '').upper()
-        
-        # Check if MAC address is valid (12 hex characters)
-        if not re.match(r'^[0-9A-F]{12}$', mac_clean):
-            await message.reply_text(
-                "❌ **Invalid MAC Address Format**\n\n"
-                "Please provide a valid MAC address.\n\n"
-                "**Valid formats:**\n"
-                "• `00:11:22:33:44:55`\n"
-                "• `00-11-22-33-44-55`\n"
-                "• `001122334455`",
-                parse_mode='Markdown'
-            )
+        targets = []
+        labels = []
+        for arg in args:
+            mac = wol.parse_mac(arg)
+            members = None if mac else wol.group_targets(arg)
+            if mac:
+                targets.append(wol.Target(mac))
+                labels.append(mac)
+            elif members is not None:
+                targets.extend(members)
+                labels.append(arg)
+            elif targets and labels[-1] == targets[-1].mac and targets[-1].host is None:
+                # A host right after a MAC is polled once the machine is woken
+                targets[-1].host = targets[-1].name = arg
+            else:
+                await message.reply_text(
+                    "❌ **Invalid MAC Address or Group**\n\n"
+                    f"`{arg}` is neither a MAC address nor a configured group.\n\n"
+                    "**Valid formats:**\n"
+                    "• `00:11:22:33:44:55`\n"
+                    "• `00-11-22-33-44-55`\n"
+                    "• `001122334455`",
+                    parse_mode='Markdown'
+                )
+                return
+        if not targets:
+            await message.reply_text("❌ That group has no machines configured.")
             return
-        
-        # Format MAC address with colons for wakeonlan library
-        mac_formatted = ':'.join([mac_clean[i:i+2] for i in range(0, 12, 2)])
-        
-        await message.reply_text(f"🔌 Sending Wake-on-LAN packet to {mac_formatted}...")
 
+        label = ', '.join(labels)
+        status_message = await message.reply_text(f"🔌 Sending Wake-on-LAN packets to {len(targets)} machine(s)...")
         try:
-            from wakeonlan import send_magic_packet
-            
-            # Send magic packet
-            # Default broadcast address (255.255.255.255) works from anywhere
-            # if router is properly configured with port forwarding
-            send_magic_packet(mac_formatted)
-            
-            await message.reply_text(
-                f"✅ **Wake-on-LAN Packet Sent!**\n\n"
-                f"📡 **MAC Address:** `{mac_formatted}`\n"
-                f"🌐 **Broadcast:** 255.255.255.255\n\n"
-                f"⏳ The target PC should wake up shortly.\n\n"
-                f"**Note:** Ensure:\n"
-                f"• WOL is enabled in BIOS/UEFI\n"
-                f"• Network adapter allows WOL\n"
-                f"• Router has port forwarding (UDP port 9)\n"
-                f"• Static IP or Dynamic DNS configured",
-                parse_mode='Markdown'
-            )
-            logger.info(f"WOL packet sent to {mac_formatted} by user {user_id}")
-            
-        except ImportError:
-            await message.reply_text(
-                "❌ **Library Not Installed**\n\n"
-                "Please install wakeonlan library:\n"
-                "`pip install wakeonlan`",
-                parse_mode='Markdown'
-            )
-        except Exception as e:
+            packets = await wol.send(list(dict.fromkeys(target.mac for target in targets)))
+        except OSError as e:
             logger.error(f"WOL error: {e}")
-            await message.reply_text(
+            await _edit_reply(
+                status_message,
                 f"❌ **Error sending WOL packet**\n\n"
                 f"Error: {str(e)}\n\n"
                 f"Please check:\n"
-                f"• MAC address is correct\n"
-                f"• Network connectivity\n"
-                f"• WOL configuration",
-                parse_mode='Markdown'
+                f"• `WOL_BROADCASTS` in config.py\n"
+                f"• Network connectivity"
+            )
+            return
+        logger.info(f"WOL packets sent to {label} by user {user_id}")
+
+        start = time.perf_counter()
+        verifying = any(target.verifiable for target in targets)
+        await _edit_reply(status_message, format_wol(label, targets, packets, verifying, 0))
+        if verifying:
+            async def redraw():
+                await _edit_reply(
+                    status_message, format_wol(label, targets, packets, True, time.perf_counter() - start)
+                )
+            await wol.verify(targets, on_change=redraw)
+            await _edit_reply(
+                status_message, format_wol(label, targets, packets, False, time.perf_counter() - start)
             )
     except Exception as e:
         logger.error(f"Error in WOL handler: {e}")
         message = update.message or update.callback_query.message
         await message.reply_text(f"❌ Error: {str(e)}")
 
+
+# Tools this module offers, in menu and /help order (see registry.py)
+registry.register(registry.Tool(
+    'ping', 'network_tools', handle_ping, commands=('ping',), button="📡 Ping",
+    prompt="📡 **Ping Tool**\n\nSend me an IP address or hostname to ping.\n\n"
+           "Example: `8.8.8.8` or `google.com`",
+    help=("• `/ping <host>` - Ping an IP address or hostname",), rate_limited=True,
+))
+registry.register(registry.Tool(
+    'pingsweep', 'network_tools', handle_pingsweep, commands=('pingsweep',),
+    help=("• `/pingsweep <cidr>` - Find which hosts in a network range are up",), rate_limited=True,
+))
+registry.register(registry.Tool(
+    'portcheck', 'network_tools', handle_portcheck, commands=('portcheck',), button="🔌 Port Check",
+    prompt="🔌 **Port Check Tool**\n\nSend me a host and the TCP ports to check.\n\n"
+           "Example: `example.com 22,80,443` or `10.0.0.5 8000-8100`",
+    help=("• `/portcheck <host> <ports>` - Check which TCP ports are open",), rate_limited=True,
+))
+registry.register(registry.Tool(
+    'dns', 'network_tools', handle_dns, commands=('dns',),
+    help=("• `/dns <name> [type]` - Look up DNS records (A, AAAA, MX, TXT, ...)",),
+))
+registry.register(registry.Tool(
+    'traceroute', 'network_tools', handle_traceroute, commands=('traceroute',), button="🛤️ Traceroute",
+    prompt="🛤️ **Traceroute Tool**\n\nSend me an IP address or hostname for traceroute.\n\n"
+           "Example: `8.8.8.8` or `google.com`",
+    help=("• `/traceroute <host>` - Perform traceroute to a host",), rate_limited=True,
+))
+registry.register(registry.Tool(
+    'ipinfo', 'network_tools', handle_ipinfo, commands=('ipinfo',), button="📍 IP Info",
+    prompt="📍 **IP Info Tool**\n\nSend me an IP address to get information.\n"
+           "You can also send several IPs, a CIDR range, pasted log lines or a text file.\n\n"
+           "Example: `8.8.8.8` or `8.8.8.8 1.1.1.1` or `192.0.2.0/28`",
+    help=("• `/ipinfo <ip> [ip ...]` - Get IP geolocation and ASN info (IPs, CIDR or a text file)",),
+    rate_limited=True,
+))
+# Shares the single-flight speedtest service with /speedtest
+registry.register(registry.Tool(
+    'speedtest', 'network_tools', handle_speedtest, commands=('speedtest',), button="⚡ Speedtest",
+    prompt="⚡ **Speedtest**\n\nResults will appear below.", runs_on_button=True,
+    help=("• `/speedtest` - Run internet speed test",), rate_limited=True,
+))
+registry.register(registry.Tool(
+    'wol', 'network_tools', handle_wol, commands=('wol', 'wake_pc'), button="🔌 Wake-on-LAN",
+    prompt="🔌 **Wake-on-LAN Tool**\n\n"
+           "Send me a MAC address to wake up a PC, or a group name to wake them all.\n"
+           "Add the PC's IP after the MAC to be told when it is up.\n\n"
+           "**Format:** `00:11:22:33:44:55 [host]`\n"
+           "**Example:** `00:1B:44:11:3A:B7 192.168.1.20` or `lab`\n\n"
+           "**Note:** Only authorized users can use this command.",
+    help=("• `/wol <MAC|group> [host]` - Wake up PCs remotely (authorized users only)",),
+))
@@ -0,0 +1,177 @@
+"""
+Persistence Module
+python-telegram-bot persistence that keeps user_data and chat_data as one
+small JSON record per user/chat in the bot's SQLite database, written behind
+in batches so pending prompts (waiting_for) survive a restart
+"""
+
+import asyncio
+import json
+import logging
+import storage
+import tracing
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import PERSISTENCE_FLUSH_MS
+except ImportError:
+    PERSISTENCE_FLUSH_MS = 500  # Milliseconds between write-behind flushes of changed records
+
+USER_DATA = 'user_data'
+CHAT_DATA = 'chat_data'
+CONVERSATIONS = 'conversations'
+
+
+def _encode(data):
+    """Record value for a dict; None (delete the record) when it is empty"""
+    if not data:
+        return None
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Write-behind persistence for user and chat data.
+
+    The application hands over the data of every user and chat that sent an
+    update, every flush interval. Records whose JSON has not changed are
+    skipped; changed ones are marked dirty and written in one transaction in
+    a worker thread, so each flush costs the number of changed records, not
+    the number of users. flush() writes whatever is still dirty at shutdown.
+    bot_data and callback_data are not stored.
+
+    With shared=True (multi-process mode, where a user's chats may be served
+    by different workers) a record changed by another process is reloaded
+    before each update that uses it.
+    """
+
+    def __init__(self, flush_interval=PERSISTENCE_FLUSH_MS / 1000, shared=False):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self._written = {}  # (namespace, key) -> value as last loaded or written
+        self._dirty = {}    # (namespace, key) -> value to write, None to delete
+        self._write_task = None
+        self.shared = shared
+
+    def _load(self, namespace, parse_key=int):
+        records = storage.kv_load(namespace)
+        data = {}
+        for key, value in records.items():
+            try:
+                data[parse_key(key)] = json.loads(value)
+            except ValueError as e:
+                logger.error(f"Skipping unreadable {namespace} record {key}: {e}")
+                continue
+            self._written[(namespace, key)] = value
+        logger.info(f"Loaded {len(data)} {namespace} records")
+        return data
+
+    def _mark(self, namespace, key, data):
+        """Mark a record dirty if it changed, and schedule a write"""
+        try:
+            value = _encode(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Cannot persist {namespace} of {key}: {e}")
+            return
+        record = (namespace, str(key))
+        current = self._dirty[record] if record in self._dirty else self._written.get(record)
+        if value == current:
+            return
+        self._dirty[record] = value
+        if self._write_task is None or self._write_task.done():
+            # Runs once the application has handed over all of this round's records
+            self._write_task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        while self._dirty:
+            dirty, self._dirty = self._dirty, {}
+            changes = [(namespace, key, value) for (namespace, key), value in dirty.items()]
+            with tracing.span('persistence flush', records=len(changes)):
+                try:
+                    await asyncio.to_thread(storage.kv_write, changes)
+                except Exception as e:
+                    logger.error(f"Persistence flush of {len(changes)} records failed: {e}")
+                    # Keep them dirty (unless changed again since) for the next flush
+                    for record, value in dirty.items():
+                        self._dirty.setdefault(record, value)
+                    return
+            for record, value in dirty.items():
+                if value is None:
+                    self._written.pop(record, None)
+                else:
+                    self._written[record] = value
+
+    async def get_user_data(self):
+        return await asyncio.to_thread(self._load, USER_DATA)
+
+    async def get_chat_data(self):
+        return await asyncio.to_thread(self._load, CHAT_DATA)
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        records = await asyncio.to_thread(self._load, f"{CONVERSATIONS}:{name}", lambda key: tuple(json.loads(key)))
+        return {key: value['state'] for key, value in records.items()}
+
+    async def update_user_data(self, user_id, data):
+        self._mark(USER_DATA, user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark(CHAT_DATA, chat_id, data)
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        state = None if new_state is None else {'state': new_state}
+        self._mark(f"{CONVERSATIONS}:{name}", json.dumps(list(key)), state)
+
+    async def drop_user_data(self, user_id):
+        self._mark(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark(CHAT_DATA, chat_id, None)
+
+    def _refresh(self, namespace, key, data):
+        record = (namespace, str(key))
+        if record in self._dirty:
+            return  # Ours is newer than the stored record
+        value = storage.kv_get(namespace, record[1])
+        if value == self._written.get(record):
+            return
+        data.clear()
+        if value is None:
+            self._written.pop(record, None)
+        else:
+            data.update(json.loads(value))
+            self._written[record] = value
+
+    async def refresh_user_data(self, user_id, user_data):
+        if self.shared:
+            self._refresh(USER_DATA, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        if self.shared:
+            self._refresh(CHAT_DATA, chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write every dirty record; called by the application at shutdown"""
+        if self._write_task is not None:
+            await self._write_task
+        if self._dirty:
+            await self._write()
+        logger.info(f"Persistence flushed ({len(self._written)} records stored)")
@@ -0,0 +1,251 @@
+"""
+Ping Module
+Native asyncio ping engine: ICMP echo over unprivileged datagram sockets,
+falling back to raw ICMP sockets and then to TCP connect probes
+"""
+
+import asyncio
+import dns_resolver
+import ipaddress
+import itertools
+import logging
+import math
+import os
+import socket
+import struct
+import time
+import tracing
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import PING_COUNT
+except ImportError:
+    PING_COUNT = 4  # Probes per /ping
+
+try:
+    from config import PING_TIMEOUT
+except ImportError:
+    PING_TIMEOUT = 2.0  # Seconds to wait for each reply
+
+MAX_PING_COUNT = 20
+
+# Ping sweeps: one probe per address, this many in flight at once
+SWEEP_TIMEOUT = 1.0
+SWEEP_CONCURRENCY = 256
+
+# Ports tried by TCP probes when ICMP sockets are not available
+TCP_PROBE_PORTS = (443, 80)
+
+ICMP_HEADER = struct.Struct('!BBHHH')
+ICMP_ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ICMP_ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+ICMP_PROTOCOL = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+PAYLOAD = bytes(range(56))
+RECEIVE_BUFFER = 4 * 1024 * 1024
+
+
+class PingResult:
+    """Round-trip times of a set of probes to one address"""
+
+    def __init__(self, host, address, method, sent, rtts):
+        self.host = host
+        self.address = address
+        self.method = method
+        self.sent = sent
+        self.rtts = rtts  # Seconds, one per reply received
+
+    @property
+    def received(self):
+        return len(self.rtts)
+
+    @property
+    def loss(self):
+        """Packet loss in percent"""
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 100.0
+
+    @property
+    def alive(self):
+        return self.received > 0
+
+    def stats_ms(self):
+        """Return (min, avg, max, mdev) in milliseconds, as reported by ping(8)"""
+        if not self.rtts:
+            return None
+        rtts = [rtt * 1000 for rtt in self.rtts]
+        avg = sum(rtts) / len(rtts)
+        mdev = math.sqrt(max(0.0, sum(rtt * rtt for rtt in rtts) / len(rtts) - avg * avg))
+        return min(rtts), avg, max(rtts), mdev
+
+
+def checksum(data):
+    """Internet checksum (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpPinger:
+    """
+    One ICMP socket per address family shared by every probe in flight.
+
+    Replies are dispatched to waiting probes by (identifier, sequence) from a
+    reader callback on the event loop, so hundreds of pings can be
+    outstanding at once without a task or socket each. On datagram ("ping")
+    sockets the kernel picks the identifier and only delivers our replies.
+    """
+
+    def __init__(self, family, sock_type):
+        self.family = family
+        self.raw = sock_type == socket.SOCK_RAW
+        self.method = 'ICMP (raw)' if self.raw else 'ICMP'
+        self.sock = socket.socket(family, sock_type, ICMP_PROTOCOL[family])
+        self.sock.setblocking(False)
+        # Room for bursts of replies (raw sockets also see every other ICMP packet)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self.identifier = os.getpid() & 0xFFFF
+        self._sequence = itertools.count(1)
+        # (identifier, sequence) -> (send time, future)
+        self._pending = {}
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def close(self):
+        self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        for _, future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP receive error: {e}")
+                return
+            received_at = time.perf_counter()
+            if self.raw and self.family == socket.AF_INET:
+                # Raw IPv4 sockets include the IP header
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < ICMP_HEADER.size:
+                continue
+            icmp_type, _, _, identifier, sequence = ICMP_HEADER.unpack_from(data)
+            if icmp_type != ICMP_ECHO_REPLY[self.family]:
+                continue
+            # Datagram sockets rewrite the identifier; match on sequence alone
+            key = (identifier if self.raw else None, sequence)
+            entry = self._pending.pop(key, None)
+            if entry is not None and not entry[1].done():
+                entry[1].set_result(received_at - entry[0])
+
+    async def probe(self, address, timeout):
+        """Send one echo request; return the round-trip time or None on timeout"""
+        sequence = next(self._sequence) & 0xFFFF
+        key = (self.identifier if self.raw else None, sequence)
+        header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST[self.family], 0, 0, self.identifier, sequence)
+        packet = header + PAYLOAD
+        if self.family == socket.AF_INET:
+            # ICMPv6 checksums are filled in by the kernel
+            packet = header[:2] + struct.pack('!H', checksum(packet)) + header[4:] + PAYLOAD
+
+        future = self._loop.create_future()
+        self._pending[key] = (time.perf_counter(), future)
+        try:
+            self.sock.sendto(packet, (address, 0))
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self._pending.pop(key, None)
+
+
+_pingers = {}
+
+
+def get_pinger(family):
+    """Return the shared ICMP pinger for a family, or None if ICMP sockets are unavailable"""
+    pinger = _pingers.get(family)
+    if pinger is not None and pinger._loop is not asyncio.get_running_loop():
+        # Created on an event loop that has since been replaced
+        pinger.close()
+        del _pingers[family]
+    if family not in _pingers:
+        _pingers[family] = None
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                _pingers[family] = IcmpPinger(family, sock_type)
+                break
+            except OSError:
+                continue
+        if _pingers[family] is None:
+            logger.warning(
+                f"No ICMP socket for {family.name} (check net.ipv4.ping_group_range); "
+                "using TCP connect probes"
+            )
+    return _pingers[family]
+
+
+def close():
+    """Close the shared ICMP sockets"""
+    for pinger in _pingers.values():
+        if pinger is not None:
+            pinger.close()
+    _pingers.clear()
+
+
+async def tcp_probe(address, timeout, ports=TCP_PROBE_PORTS):
+    """Time a TCP handshake; a refused connection also proves the host is up"""
+    for port in ports:
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+            rtt = time.perf_counter() - start
+            writer.close()
+            return rtt
+        except ConnectionRefusedError:
+            return time.perf_counter() - start
+        except (asyncio.TimeoutError, OSError):
+            continue
+    return None
+
+
+async def ping_address(address, count=PING_COUNT, timeout=PING_TIMEOUT, host=None):
+    """Send count probes to an IP address at once and collect their round-trip times"""
+    family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+    pinger = get_pinger(family)
+    if pinger is not None:
+        method = pinger.method
+        results = await asyncio.gather(*(pinger.probe(address, timeout) for _ in range(count)))
+    else:
+        method = 'TCP'
+        results = await asyncio.gather(*(tcp_probe(address, timeout) for _ in range(count)))
+    return PingResult(host or address, address, method, count, [rtt for rtt in results if rtt is not None])
+
+
+async def ping(host, count=PING_COUNT, timeout=PING_TIMEOUT):
+    """Resolve host and ping it; raises socket.gaierror if it does not resolve"""
+    with tracing.span('ping', host=host, count=count) as span:
+        address = await dns_resolver.resolve(host)
+        result = await ping_address(address, count, timeout, host=host)
+        if span is not None:
+            span.attributes.update(method=result.method, received=result.received)
+        return result
+
+
+async def sweep(addresses, timeout=SWEEP_TIMEOUT, concurrency=SWEEP_CONCURRENCY):
+    """Ping many IP addresses once each, with bounded concurrency; results keep input order"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(address):
+        async with semaphore:
+            return await ping_address(address, count=1, timeout=timeout)
+
+    with tracing.span('pingsweep', addresses=len(addresses)):
+        return await asyncio.gather(*(probe(address) for address in addresses))
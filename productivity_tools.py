@@ -3,35 +3,47 @@ Productivity Tools Module
 Handles reminder, todo, weather, and quote commands
 """
 
-import json
-import os
-import requests
+import httpx
+import storage
 import logging
+import registry
+import time
 from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import ContextTypes
+from reminders import reminder_scheduler
+from quote_service import quote_service
+from weather_service import get_many, parse_locations, DEFAULT_LOCATION, LocationNotFound
 
 logger = logging.getLogger(__name__)
 
-# File to store todos
-TODO_FILE = "todos.json"
 
+def parse_reminder(args):
+    """Parse reminder args into (datetime, message); raise ValueError if invalid"""
+    reminder_text = ' '.join(args)
 
-def load_todos():
-    """Load todos from file"""
-    if os.path.exists(TODO_FILE):
-        try:
-            with open(TODO_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
+    # Try to parse "in X minutes/hours message"
+    if reminder_text.lower().startswith('in '):
+        parts = reminder_text.split()
+        if len(parts) >= 4:
+            try:
+                amount = int(parts[1])
+            except ValueError:
+                amount = None
+            unit = parts[2].lower()
+            if amount is not None:
+                if unit in ['minute', 'minutes', 'min', 'mins']:
+                    return datetime.now() + timedelta(minutes=amount), ' '.join(parts[3:])
+                if unit in ['hour', 'hours', 'hr', 'hrs']:
+                    return datetime.now() + timedelta(hours=amount), ' '.join(parts[3:])
 
-def save_todos(todos):
-    """Save todos to file"""
-    with open(TODO_FILE, 'w') as f:
-        json.dump(todos, f, indent=2)
+    # Format: YYYY-MM-DD HH:MM message
+    date_str = f"{args[0]} {args[1]}"
+    message = ' '.join(args[2:])
+    reminder_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M")
+    if not message:
+        raise ValueError("Missing reminder message")
+    return reminder_time, message
 
 
 async def handle_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -48,60 +60,13 @@ async def handle_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "Usage: `/reminder <date/time> <message>`\n\n"
                 "Examples:\n"
                 "• `/reminder 2024-12-25 10:00 Buy gifts`\n"
-                "• `/reminder in 30 minutes Call mom`\n"
-                "• `/reminder tomorrow 15:00 Meeting`",
+                "• `/reminder in 30 minutes Call mom`",
                 parse_mode='Markdown'
             )
             return
 
-        # Parse reminder time
-        reminder_text = ' '.join(args)
-        
-        # Simple reminder storage (in production, use a proper scheduler)
-        # For now, just acknowledge the reminder
-        try:
-            # Try to parse "in X minutes/hours"
-            if reminder_text.lower().startswith('in '):
-                parts = reminder_text.split()
-                if len(parts) >= 4:
-                    amount = int(parts[1])
-                    unit = parts[2].lower()
-                    message = ' '.join(parts[3:])
-                    
-                    if unit in ['minute', 'minutes', 'min', 'mins']:
-                        reminder_time = datetime.now() + timedelta(minutes=amount)
-                    elif unit in ['hour', 'hours', 'hr', 'hrs']:
-                        reminder_time = datetime.now() + timedelta(hours=amount)
-                    else:
-                        raise ValueError("Unknown time unit")
-                    
-                    await update.message.reply_text(
-                        f"✅ Reminder set!\n\n"
-                        f"⏰ Time: {reminder_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                        f"📝 Message: {message}\n\n"
-                        f"⚠️ Note: This is a basic implementation. "
-                        f"For production use, integrate with a proper task scheduler.",
-                        parse_mode='Markdown'
-                    )
-                    return
-        except (ValueError, IndexError):
-            pass
-        
-        # Try to parse date/time format
         try:
-            # Format: YYYY-MM-DD HH:MM message
-            date_str = f"{args[0]} {args[1]}"
-            message = ' '.join(args[2:])
-            reminder_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M")
-            
-            await update.message.reply_text(
-                f"✅ Reminder set!\n\n"
-                f"⏰ Time: {reminder_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"📝 Message: {message}\n\n"
-                f"⚠️ Note: This is a basic implementation. "
-                f"For production use, integrate with a proper task scheduler.",
-                parse_mode='Markdown'
-            )
+            reminder_time, message = parse_reminder(args)
         except ValueError:
             await update.message.reply_text(
                 "❌ Could not parse date/time format.\n\n"
@@ -110,21 +75,77 @@ async def handle_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "• `in X minutes/hours message`",
                 parse_mode='Markdown'
             )
+            return
+
+        due_at = reminder_time.timestamp()
+        if due_at <= time.time():
+            await update.message.reply_text("❌ That time is in the past. Please choose a future time.")
+            return
+
+        reminder_id = storage.add_reminder(
+            update.effective_user.id, update.effective_chat.id, due_at, message
+        )
+        reminder_scheduler.schedule(reminder_id, due_at)
+
+        await update.message.reply_text(
+            f"✅ Reminder #{reminder_id} set!\n\n"
+            f"⏰ Time: {reminder_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"📝 Message: {message}\n\n"
+            f"Use /reminders to list or cancel reminders."
+        )
     except Exception as e:
         logger.error(f"Error in reminder: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
 
+async def handle_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle reminders command (list and cancel pending reminders)"""
+    try:
+        user_id = update.effective_user.id
+        action = context.args[0].lower() if context.args else 'list'
+
+        if action == 'list':
+            reminders = storage.list_reminders(user_id)
+            if not reminders:
+                await update.message.reply_text("⏰ You have no pending reminders.")
+                return
+            reminder_list = "⏰ Your pending reminders:\n\n"
+            for reminder_id, due_at, text in reminders:
+                due = datetime.fromtimestamp(due_at).strftime('%Y-%m-%d %H:%M')
+                reminder_list += f"#{reminder_id} • {due} • {text}\n"
+            await update.message.reply_text(reminder_list[:4000])
+
+        elif action == 'cancel':
+            if len(context.args) < 2:
+                await update.message.reply_text("❌ Please provide a reminder number to cancel.")
+                return
+            try:
+                reminder_id = int(context.args[1].lstrip('#'))
+            except ValueError:
+                await update.message.reply_text("❌ Please provide a valid reminder number.")
+                return
+            if storage.cancel_reminder(user_id, reminder_id):
+                await update.message.reply_text(f"✅ Reminder #{reminder_id} cancelled.")
+            else:
+                await update.message.reply_text("❌ No pending reminder with that number.")
+
+        else:
+            await update.message.reply_text(
+                "❌ Unknown action.\n\n"
+                "Usage:\n"
+                "• `/reminders list` - List pending reminders\n"
+                "• `/reminders cancel <number>` - Cancel a reminder",
+                parse_mode='Markdown'
+            )
+    except Exception as e:
+        logger.error(f"Error in reminders: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+
 async def handle_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle todo command"""
     try:
-        user_id = str(update.effective_user.id)
-        todos = load_todos()
-        
-        if user_id not in todos:
-            todos[user_id] = []
-        
-        user_todos = todos[user_id]
+        user_id = update.effective_user.id
         
         if not context.args:
             await update.message.reply_text(
@@ -145,8 +166,7 @@ async def handle_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
             
             task = ' '.join(context.args[1:])
-            user_todos.append(task)
-            save_todos(todos)
+            storage.add_todo(user_id, task)
             await update.message.reply_text(f"✅ Task added: {task}")
         
         elif action == 'remove':
@@ -156,9 +176,8 @@ async def handle_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             try:
                 index = int(context.args[1]) - 1
-                if 0 <= index < len(user_todos):
-                    removed = user_todos.pop(index)
-                    save_todos(todos)
+                removed = storage.remove_todo(user_id, index)
+                if removed is not None:
                     await update.message.reply_text(f"✅ Task removed: {removed}")
                 else:
                     await update.message.reply_text("❌ Invalid task number.")
@@ -166,6 +185,7 @@ async def handle_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text("❌ Please provide a valid task number.")
         
         elif action == 'list':
+            user_todos = storage.list_todos(user_id)
             if not user_todos:
                 await update.message.reply_text("📋 Your todo list is empty!")
             else:
@@ -184,49 +204,80 @@ async def handle_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
 
+def format_weather(data):
+    """Format a detailed weather report for one location"""
+    location = data.get('location', {})
+    current = data.get('current', {})
+
+    weather_text = f"🌤️ **Weather in {location.get('name', 'N/A')}, {location.get('country', 'N/A')}**\n\n"
+    weather_text += f"🌡️ **Temperature:** {current.get('temp_c', 'N/A')}°C ({current.get('temp_f', 'N/A')}°F)\n"
+    weather_text += f"🌡️ **Feels like:** {current.get('feelslike_c', 'N/A')}°C ({current.get('feelslike_f', 'N/A')}°F)\n"
+    weather_text += f"☁️ **Condition:** {current.get('condition', {}).get('text', 'N/A')}\n"
+    weather_text += f"💨 **Wind:** {current.get('wind_kph', 'N/A')} km/h ({current.get('wind_mph', 'N/A')} mph)\n"
+    weather_text += f"🧭 **Wind Direction:** {current.get('wind_dir', 'N/A')}\n"
+    weather_text += f"💧 **Humidity:** {current.get('humidity', 'N/A')}%\n"
+    weather_text += f"📊 **Pressure:** {current.get('pressure_mb', 'N/A')} mb\n"
+    weather_text += f"👁️ **Visibility:** {current.get('vis_km', 'N/A')} km\n"
+    weather_text += f"☀️ **UV Index:** {current.get('uv', 'N/A')}\n"
+    weather_text += f"🌡️ **Dew Point:** {current.get('dewpoint_c', 'N/A')}°C\n"
+    return weather_text
+
+
+def format_weather_summary(data):
+    """Format a one-line weather summary for multi-city replies"""
+    location = data.get('location', {})
+    current = data.get('current', {})
+    return (
+        f"🌍 **{location.get('name', 'N/A')}, {location.get('country', 'N/A')}:** "
+        f"{current.get('temp_c', 'N/A')}°C, {current.get('condition', {}).get('text', 'N/A')}, "
+        f"💨 {current.get('wind_kph', 'N/A')} km/h, 💧 {current.get('humidity', 'N/A')}%"
+    )
+
+
 async def handle_weather(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle weather command - Always returns weather for Ethiopia Addis Ababa"""
+    """Handle weather command for one or more cities (default: Addis Ababa, Ethiopia)"""
     try:
+        # Get cities from command args or message text
+        if context.args:
+            text = ' '.join(context.args)
+        elif update.message and not update.message.text.startswith('/'):
+            text = update.message.text
+        else:
+            text = ''
+        locations = parse_locations(text) or [DEFAULT_LOCATION]
+
         message = update.message or update.callback_query.message
-        await message.reply_text("🌤️ Fetching weather for Addis Ababa, Ethiopia...")
+        await message.reply_text(f"🌤️ Fetching weather for {', '.join(locations)}...")
 
         try:
-            from config import WEATHERAPI_KEY
-            url = "https://api.weatherapi.com/v1/current.json"
-            params = {
-                'key': WEATHERAPI_KEY,
-                'q': 'Addis Ababa, Ethiopia',
-                'aqi': 'no'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Format weather information
-            location = data.get('location', {})
-            current = data.get('current', {})
-            
-            weather_text = f"🌤️ **Weather in {location.get('name', 'Addis Ababa')}, {location.get('country', 'Ethiopia')}**\n\n"
-            weather_text += f"🌡️ **Temperature:** {current.get('temp_c', 'N/A')}°C ({current.get('temp_f', 'N/A')}°F)\n"
-            weather_text += f"🌡️ **Feels like:** {current.get('feelslike_c', 'N/A')}°C ({current.get('feelslike_f', 'N/A')}°F)\n"
-            weather_text += f"☁️ **Condition:** {current.get('condition', {}).get('text', 'N/A')}\n"
-            weather_text += f"💨 **Wind:** {current.get('wind_kph', 'N/A')} km/h ({current.get('wind_mph', 'N/A')} mph)\n"
-            weather_text += f"🧭 **Wind Direction:** {current.get('wind_dir', 'N/A')}\n"
-            weather_text += f"💧 **Humidity:** {current.get('humidity', 'N/A')}%\n"
-            weather_text += f"📊 **Pressure:** {current.get('pressure_mb', 'N/A')} mb\n"
-            weather_text += f"👁️ **Visibility:** {current.get('vis_km', 'N/A')} km\n"
-            weather_text += f"☀️ **UV Index:** {current.get('uv', 'N/A')}\n"
-            weather_text += f"🌡️ **Dew Point:** {current.get('dewpoint_c', 'N/A')}°C\n"
-            
-            await message.reply_text(weather_text, parse_mode='Markdown')
+            results = await get_many(locations)
+
+            if len(locations) == 1:
+                data = results[0]
+                if isinstance(data, Exception):
+                    raise data
+                await message.reply_text(format_weather(data), parse_mode='Markdown')
+                return
+
+            lines = []
+            for location, data in zip(locations, results):
+                if isinstance(data, LocationNotFound):
+                    lines.append(f"❌ {location}: location not found")
+                elif isinstance(data, Exception):
+                    logger.error(f"WeatherAPI error for {location}: {data}")
+                    lines.append(f"❌ {location}: {str(data)}")
+                else:
+                    lines.append(format_weather_summary(data))
+            await message.reply_text("🌤️ **Current Weather**\n\n" + "\n".join(lines), parse_mode='Markdown')
         except ImportError:
             await message.reply_text(
                 "❌ WeatherAPI key not configured.\n"
                 "Please add WEATHERAPI_KEY to config.py\n"
                 "Get a free key at: https://www.weatherapi.com/"
             )
-        except requests.RequestException as e:
+        except LocationNotFound as e:
+            await message.reply_text(f"❌ {str(e)}")
+        except httpx.HTTPError as e:
             logger.error(f"WeatherAPI error: {e}")
             await message.reply_text(f"❌ Error fetching weather: {str(e)}")
     except Exception as e:
@@ -236,32 +287,58 @@ async def handle_weather(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def handle_quote(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle quote command using a free public API"""
+    """Handle quote command from the prefetched quote pool"""
     try:
         message = update.message or update.callback_query.message
-        await message.reply_text("💬 Fetching a motivational quote...")
 
-        # Using quotable.io (free, no API key required)
-        try:
-            response = requests.get("https://api.quotable.io/random", timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            quote_text = f"💬 **Quote of the Day**\n\n"
-            quote_text += f"\"{data['content']}\"\n\n"
-            quote_text += f"— {data['author']}"
-            
-            await message.reply_text(quote_text, parse_mode='Markdown')
-        except requests.RequestException as e:
-            logger.error(f"Quote API error: {e}")
-            # Fallback quote
-            await message.reply_text(
-                "💬 **Quote of the Day**\n\n"
-                "\"The only way to do great work is to love what you do.\"\n\n"
-                "— Steve Jobs"
-            )
+        # Served from memory: the pool is refilled from quotable.io in the background
+        content, author = quote_service.get_quote()
+
+        quote_text = f"💬 **Quote of the Day**\n\n"
+        quote_text += f"\"{content}\"\n\n"
+        quote_text += f"— {author}"
+
+        await message.reply_text(quote_text, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error in quote: {e}")
         message = update.message or update.callback_query.message
         await message.reply_text(f"❌ Error: {str(e)}")
 
+
+# Tools this module offers, in menu and /help order (see registry.py)
+registry.register(registry.Tool(
+    'reminder', 'productivity_tools', handle_reminder, commands=('reminder',), button="⏰ Reminder",
+    prompt="⏰ **Reminder Tool**\n\n"
+           "Format: `<date/time> <message>`\n\n"
+           "Example: `2024-12-25 10:00 Buy gifts`\n"
+           "Or: `in 30 minutes Call mom`\n\n"
+           "Use /reminders to list or cancel reminders.",
+    help=("• `/reminder <time> <message>` - Set a reminder",),
+))
+registry.register(registry.Tool(
+    'reminders', 'productivity_tools', handle_reminders, commands=('reminders',),
+    help=("• `/reminders [list|cancel <number>]` - Manage pending reminders",),
+))
+registry.register(registry.Tool(
+    'todo', 'productivity_tools', handle_todo, commands=('todo',), button="✅ Todo",
+    prompt="✅ **Todo Tool**\n\n"
+           "Commands:\n"
+           "• `/todo add <task>` - Add a task\n"
+           "• `/todo remove <number>` - Remove a task\n"
+           "• `/todo list` - List all tasks",
+    awaits_reply=False,
+    help=("• `/todo <add|remove|list> [task]` - Manage todo list",),
+))
+registry.register(registry.Tool(
+    'weather', 'productivity_tools', handle_weather, commands=('weather',), button="🌤️ Weather",
+    prompt="🌤️ **Weather Tool**\n\nSend me a city name to get weather information.\n"
+           "Separate several cities with `;`.\n\n"
+           "Example: `London` or `New York; Tokyo; Nairobi`",
+    help=("• `/weather [city; city...]` - Get weather (default: Addis Ababa, Ethiopia)",),
+    rate_limited=True,
+))
+registry.register(registry.Tool(
+    'quote', 'productivity_tools', handle_quote, commands=('quote',), button="💬 Quote",
+    prompt="💬 Here's a motivational quote:", runs_on_button=True,
+    help=("• `/quote` - Get a motivational quote",),
+))
@@ -0,0 +1,113 @@
+"""
+Quote Service Module
+Serves quotes from a prefetched pool, refilled in the background, with a bundled offline corpus
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+import httpx
+import http_client
+
+logger = logging.getLogger(__name__)
+
+QUOTES_URL = "https://api.quotable.io/quotes/random"
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quotes.json")
+
+POOL_SIZE = 50      # Ring buffer capacity
+LOW_WATER = 10      # Refill when fewer quotes than this are left
+BATCH_SIZE = 20     # Quotes fetched per upstream request
+RETRY_DELAY = 300   # Seconds to wait after a failed refill
+
+
+class LocalCorpus:
+    """
+    Bundled quotes picked in shuffled order.
+
+    Quotes are drawn from a shuffled list of indices, so each pick is O(1)
+    and no quote repeats until the whole corpus has been served.
+    """
+
+    def __init__(self, path=CORPUS_FILE):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.quotes = [tuple(quote) for quote in json.load(f)]
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load quote corpus {path}: {e}")
+            self.quotes = [("The only way to do great work is to love what you do.", "Steve Jobs")]
+        self._order = []
+
+    def pick(self):
+        """Return the next (content, author) from the shuffled corpus"""
+        if not self._order:
+            self._order = list(range(len(self.quotes)))
+            random.shuffle(self._order)
+        return self.quotes[self._order.pop()]
+
+
+class QuoteService:
+    """Ring buffer of prefetched quotes, topped up by a background task"""
+
+    def __init__(self, pool_size=POOL_SIZE, low_water=LOW_WATER, batch_size=BATCH_SIZE):
+        self.pool = deque(maxlen=pool_size)
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.corpus = LocalCorpus()
+        self._refill_task = None
+        self._next_attempt = 0.0
+
+    def start(self):
+        """Start filling the pool in the background"""
+        self._maybe_refill()
+
+    async def stop(self):
+        """Cancel a refill in progress"""
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+
+    def get_quote(self):
+        """Return (content, author) immediately, from the pool or the local corpus"""
+        quote = self.pool.popleft() if self.pool else self.corpus.pick()
+        self._maybe_refill()
+        return quote
+
+    def _maybe_refill(self):
+        if len(self.pool) >= self.low_water:
+            return
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        if time.monotonic() < self._next_attempt:
+            return
+        try:
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+        except RuntimeError:
+            # No running event loop (e.g. called from a script); serve from the corpus
+            pass
+
+    async def _refill(self):
+        """Fetch batches until the pool is full"""
+        try:
+            while len(self.pool) < self.pool.maxlen:
+                response = await http_client.get(
+                    QUOTES_URL, params={'limit': self.batch_size}, timeout=10
+                )
+                response.raise_for_status()
+                quotes = response.json()
+                if not quotes:
+                    break
+                for quote in quotes[:self.pool.maxlen - len(self.pool)]:
+                    self.pool.append((quote['content'], quote['author']))
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Quote refill failed, using local corpus: {e}")
+            self._next_attempt = time.monotonic() + RETRY_DELAY
+
+
+quote_service = QuoteService()
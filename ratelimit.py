@@ -0,0 +1,237 @@
+"""
+Rate Limit Module
+Per-user token buckets, global concurrency limits and bounded wait queues
+for expensive tools
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from telegram.error import TelegramError
+from metrics import Counter, Gauge
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Tool -> limits. per_minute/burst: per-user token bucket; concurrency: runs
+# allowed at once across all users; queue: callers that may wait for a slot.
+DEFAULT_LIMITS = {
+    'ping': {'per_minute': 10, 'burst': 5, 'concurrency': 10, 'queue': 50},
+    'pingsweep': {'per_minute': 2, 'burst': 2, 'concurrency': 2, 'queue': 10},
+    'portcheck': {'per_minute': 6, 'burst': 3, 'concurrency': 4, 'queue': 20},
+    'traceroute': {'per_minute': 3, 'burst': 2, 'concurrency': 4, 'queue': 20},
+    'ipinfo': {'per_minute': 10, 'burst': 5, 'concurrency': 8, 'queue': 50},
+    'speedtest': {'per_minute': 2, 'burst': 2, 'concurrency': 1, 'queue': 20},
+    'weather': {'per_minute': 20, 'burst': 5, 'concurrency': 10, 'queue': 50},
+    'ai': {'per_minute': 6, 'burst': 3, 'concurrency': 5, 'queue': 20},
+}
+
+try:
+    from config import RATE_LIMITS
+except ImportError:
+    RATE_LIMITS = {}  # Per-tool overrides of DEFAULT_LIMITS; None disables a tool's limits
+
+# Idle users whose buckets have refilled are forgotten past this many entries
+MAX_TRACKED_USERS = 10000
+
+# Seconds between tries for a slot held by another worker process
+SHARED_POLL_INTERVAL = 0.1
+
+REJECTED = Counter('bot_ratelimit_rejected_total', 'Calls rejected by rate limits', ('tool', 'reason'))
+QUEUED = Gauge('bot_ratelimit_queued', 'Calls waiting for a free slot', ('tool',))
+
+
+class ToolLimiter:
+    """
+    Token buckets per user plus a FIFO-fair concurrency limit for one tool.
+
+    In multi-process mode (see use_shared_slots) every run also holds a slot
+    of a semaphore shared by all workers, and buckets live in the shared
+    database, so the limits apply to the whole bot rather than per process.
+    """
+
+    def __init__(self, name, per_minute, burst, concurrency, queue):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.concurrency = concurrency
+        self.queue_size = queue
+        self.active = 0
+        # user_id -> [tokens, last refill time]
+        self._buckets = {}
+        self._waiters = deque()
+        self.shared_slots = None
+        self._poller = None
+
+    def take_token(self, user_id):
+        """Spend one of the user's tokens; return seconds to wait if none is left"""
+        if self.shared_slots is not None:
+            return storage.take_token(self.name, user_id, self.rate, self.burst)
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._prune(now)
+            bucket = self._buckets[user_id] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+    def _prune(self, now):
+        full_after = self.burst / self.rate
+        for user_id, (tokens, last) in list(self._buckets.items()):
+            if now - last >= full_after:
+                del self._buckets[user_id]
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    @property
+    def queue_full(self):
+        return self.waiting >= self.queue_size
+
+    def try_acquire(self):
+        """Take a slot without waiting if one is free and nobody is queued"""
+        if self.active < self.concurrency and not self._waiters and self._take_shared_slot():
+            self.active += 1
+            return True
+        return False
+
+    def _take_shared_slot(self):
+        return self.shared_slots is None or self.shared_slots.acquire(False)
+
+    def enqueue(self):
+        """Join the wait queue; the returned future resolves when a slot is handed over"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        QUEUED.inc(self.name)
+        if self.shared_slots is not None and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.create_task(self._poll_shared_slots())
+        return future
+
+    async def _poll_shared_slots(self):
+        """Take slots freed by other worker processes for queued callers"""
+        while self._waiters:
+            if self.active < self.concurrency and self.shared_slots.acquire(False):
+                self.active += 1
+                self.release()
+            else:
+                await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+    async def wait(self, future):
+        """Wait for a queued slot, leaving the queue if cancelled"""
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.abandon(future)
+            raise
+        finally:
+            QUEUED.dec(self.name)
+
+    def abandon(self, future):
+        """Leave the queue, passing on a slot that was already handed over"""
+        if future in self._waiters:
+            self._waiters.remove(future)
+        elif future.done() and not future.cancelled():
+            self.release()
+        future.cancel()
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+        if self.shared_slots is not None:
+            self.shared_slots.release()
+
+
+_limiters = {}
+
+
+def get_limiter(tool):
+    """Return the limiter for a tool, or None if the tool is not limited"""
+    if tool not in _limiters:
+        limits = DEFAULT_LIMITS.get(tool)
+        if tool in RATE_LIMITS:
+            override = RATE_LIMITS[tool]
+            limits = None if override is None else {**(limits or {}), **override}
+        _limiters[tool] = ToolLimiter(tool, **limits) if limits else None
+    return _limiters[tool]
+
+
+def create_shared_slots(context):
+    """Multi-process mode: a semaphore per limited tool, sized to its concurrency, for the workers"""
+    tools = set(DEFAULT_LIMITS) | set(RATE_LIMITS)
+    return {
+        tool: context.BoundedSemaphore(get_limiter(tool).concurrency)
+        for tool in tools if get_limiter(tool) is not None
+    }
+
+
+def use_shared_slots(slots):
+    """Multi-process mode: limit concurrency and per-user rates across all worker processes"""
+    for tool, semaphore in slots.items():
+        get_limiter(tool).shared_slots = semaphore
+
+
+def format_wait(seconds):
+    if seconds < 60:
+        return f"{max(1, round(seconds))} s"
+    return f"{round(seconds / 60)} min"
+
+
+def limited(tool, callback):
+    """Wrap a handler so calls are rate limited and queued per the tool's limits"""
+    limiter = get_limiter(tool)
+    if limiter is None:
+        return callback
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        message = update.message or update.callback_query.message
+        user = update.effective_user
+
+        if user is not None:
+            retry_after = limiter.take_token(user.id)
+            if retry_after:
+                REJECTED.inc(tool, 'user_rate')
+                await message.reply_text(
+                    f"⏳ You're using {tool} too often. Please try again in {format_wait(retry_after)}."
+                )
+                return
+
+        if not limiter.try_acquire():
+            if limiter.queue_full:
+                REJECTED.inc(tool, 'queue_full')
+                await message.reply_text(f"🚦 {tool} is busy right now. Please try again in a minute.")
+                return
+            # Queue before replying so a slot freed meanwhile is handed to us
+            future = limiter.enqueue()
+            try:
+                await message.reply_text(
+                    f"🕒 {tool} is busy: you're #{limiter.waiting} in the queue. "
+                    "I'll start as soon as a slot is free."
+                )
+            except TelegramError as e:
+                logger.warning(f"Could not send queue position for {tool}: {e}")
+            except asyncio.CancelledError:
+                limiter.abandon(future)
+                QUEUED.dec(tool)
+                raise
+            await limiter.wait(future)
+
+        try:
+            return await callback(update, context)
+        finally:
+            limiter.release()
+    return wrapper
@@ -0,0 +1,125 @@
+"""
+Tool Registry Module
+Tools declare their commands, menu button, prompt and handler here; the bot
+dispatches buttons and replies through lookup tables and reuses prebuilt
+keyboards instead of walking if/elif chains
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from ratelimit import limited
+
+# Menu key -> (button label on the main menu, title shown above the menu)
+CATEGORIES = {
+    'network_tools': ("🌐 Network Tools", "🌐 **Network Tools**\n\nSelect a tool:"),
+    'productivity_tools': ("📋 Productivity Tools", "📋 **Productivity Tools**\n\nSelect a tool:"),
+}
+MAIN_MENU = 'main_menu'
+MAIN_MENU_TITLE = "🤖 Choose a category:"
+
+
+class Tool:
+    """
+    One user-facing tool.
+
+    name: waiting_for key and rate limit name; the button sends "cmd_<name>".
+    category: key in CATEGORIES of the menu the button appears in.
+    commands: slash commands that run the handler.
+    button: menu button label (None for no button).
+    prompt: Markdown shown when the button is pressed. The user's next text
+        message goes to the handler if awaits_reply, and the handler runs
+        straight away if runs_on_button.
+    help: lines for /help.
+    rate_limited: wrap the handler in the tool's rate limits (ratelimit.py).
+    """
+
+    def __init__(self, name, category, handler, commands=(), button=None, prompt=None,
+                 awaits_reply=True, runs_on_button=False, help=(), rate_limited=False):
+        self.name = name
+        self.category = category
+        self.handler = handler
+        self.commands = tuple(commands)
+        self.button = button
+        self.prompt = prompt
+        self.awaits_reply = awaits_reply and not runs_on_button
+        self.runs_on_button = runs_on_button
+        self.help = tuple(help)
+        # Rate limits apply wherever the tool is called from: commands, buttons and replies
+        self.callback = limited(name, handler) if rate_limited else handler
+
+    @property
+    def callback_data(self):
+        return f"cmd_{self.name}"
+
+    async def on_button(self, update, context):
+        """Show the tool's prompt, then wait for a reply or run the tool"""
+        query = update.callback_query
+        await query.edit_message_text(self.prompt, parse_mode='Markdown')
+        if self.awaits_reply:
+            context.user_data['waiting_for'] = self.name
+        if self.runs_on_button:
+            await self.callback(update, context)
+
+
+# Registration order is menu and /help order
+tools = {}
+_by_callback_data = {}
+_by_waiting_for = {}
+_keyboards = {}
+
+
+def register(tool):
+    """Add a tool; keyboards are rebuilt on next use"""
+    if tool.category not in CATEGORIES:
+        raise ValueError(f"unknown category {tool.category!r} for tool {tool.name!r}")
+    if tool.name in tools:
+        raise ValueError(f"tool {tool.name!r} is already registered")
+    tools[tool.name] = tool
+    if tool.button:
+        _by_callback_data[tool.callback_data] = tool
+    if tool.button and tool.awaits_reply:
+        _by_waiting_for[tool.name] = tool
+    _keyboards.clear()
+    return tool
+
+
+def for_button(data):
+    """The tool a button's callback data belongs to, or None"""
+    return _by_callback_data.get(data)
+
+
+def for_reply(waiting_for):
+    """The tool waiting for the user's next message, or None"""
+    return _by_waiting_for.get(waiting_for)
+
+
+def _build_keyboard(menu):
+    if menu == MAIN_MENU:
+        rows = [[InlineKeyboardButton(label, callback_data=key)] for key, (label, _) in CATEGORIES.items()]
+    else:
+        rows = [
+            [InlineKeyboardButton(tool.button, callback_data=tool.callback_data)]
+            for tool in tools.values() if tool.category == menu and tool.button
+        ]
+        rows.append([InlineKeyboardButton("🔙 Back to Main Menu", callback_data=MAIN_MENU)])
+    return InlineKeyboardMarkup(rows)
+
+
+def keyboard(menu=MAIN_MENU):
+    """The inline keyboard of the main menu or a category, built once"""
+    markup = _keyboards.get(menu)
+    if markup is None:
+        markup = _keyboards[menu] = _build_keyboard(menu)
+    return markup
+
+
+def menu_title(menu):
+    """Title of a menu, or None if menu is not a menu key"""
+    if menu == MAIN_MENU:
+        return MAIN_MENU_TITLE
+    category = CATEGORIES.get(menu)
+    return category[1] if category else None
+
+
+def help_lines(category):
+    """/help lines of a category's tools, in registration order"""
+    return [line for tool in tools.values() if tool.category == category for line in tool.help]
@@ -0,0 +1,112 @@
+"""
+Reminder Scheduler Module
+Delivers stored reminders on time using an in-memory min-heap of deadlines
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from telegram.error import BadRequest, Forbidden, TelegramError
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a reminder that failed with a transient error
+RETRY_DELAY = 60
+
+
+class ReminderScheduler:
+    """
+    Fires pending reminders at their due time.
+
+    Only (due_at, id) pairs are kept in memory; reminder text is read from
+    storage when it fires. The scheduler task sleeps until the earliest
+    deadline and is woken early only when a sooner reminder is added.
+    Cancelled reminders stay in the heap and are skipped when they come due.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._bot = None
+        self._deliveries = set()
+
+    async def start(self, application, owns_chat=None):
+        """
+        Load pending reminders from storage and start the scheduler task.
+
+        owns_chat(chat_id) limits the scheduler to some chats' reminders, so
+        in multi-process mode each is delivered by its chat's worker only.
+        """
+        self._bot = application.bot
+        self._heap = [
+            (due_at, reminder_id)
+            for reminder_id, due_at, chat_id in await asyncio.to_thread(storage.pending_reminders)
+            if owns_chat is None or owns_chat(chat_id)
+        ]
+        heapq.heapify(self._heap)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Reminder scheduler started with {len(self._heap)} pending reminders")
+
+    async def stop(self):
+        """Stop the scheduler task; pending reminders stay in storage"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, reminder_id, due_at):
+        """Add a stored reminder to the heap"""
+        heapq.heappush(self._heap, (due_at, reminder_id))
+        if self._heap[0][1] == reminder_id:
+            # New earliest deadline: wake the scheduler to re-arm its timer
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            due_at, reminder_id = self._heap[0]
+            delay = due_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            heapq.heappop(self._heap)
+            # Deliver in the background so a burst of due reminders isn't sent serially
+            task = asyncio.create_task(self._deliver(reminder_id))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, reminder_id):
+        """Send one reminder and record the outcome"""
+        reminder = storage.get_reminder(reminder_id)
+        if reminder is None or reminder[2] != 'pending':
+            return
+        chat_id, text, _ = reminder
+        try:
+            await self._bot.send_message(chat_id, f"⏰ Reminder: {text}")
+            status = 'sent'
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Reminder {reminder_id} could not be delivered: {e}")
+            status = 'failed'
+        except TelegramError as e:
+            logger.error(f"Reminder {reminder_id} delivery error, retrying: {e}")
+            self.schedule(reminder_id, time.time() + RETRY_DELAY)
+            return
+        storage.set_reminder_status(reminder_id, status)
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,120 @@
+"""
+Speedtest Service Module
+Runs speedtest-cli as an asyncio subprocess with single-flight runs and cached results
+"""
+
+import asyncio
+import json
+import logging
+import time
+import storage
+import tracing
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import SPEEDTEST_CACHE_TTL
+except ImportError:
+    SPEEDTEST_CACHE_TTL = 300  # Seconds a result is served from cache
+
+SPEEDTEST_TIMEOUT = 120
+SPEEDTEST_COMMANDS = [
+    ['speedtest-cli', '--simple'],
+    ['speedtest-cli', '--simple', '--secure'],
+]
+
+
+class SpeedtestError(Exception):
+    """Raised when every speedtest-cli attempt fails"""
+
+
+class SpeedtestResult:
+    """Output of a finished speedtest and when it was taken"""
+
+    def __init__(self, output, finished_at):
+        self.output = output
+        self.finished_at = finished_at
+
+    @property
+    def age(self):
+        """Seconds since the test finished"""
+        return time.time() - self.finished_at
+
+
+class SpeedtestService:
+    """
+    Single-flight speedtest runner: concurrent callers share one run.
+
+    With shared set (multi-process mode) the last result is also kept in the
+    database, so a result from any worker process is served by all of them.
+    """
+
+    def __init__(self, ttl=SPEEDTEST_CACHE_TTL, timeout=SPEEDTEST_TIMEOUT, commands=None):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.commands = commands or SPEEDTEST_COMMANDS
+        self._result = None
+        self._task = None
+        self.shared = False
+
+    @property
+    def running(self):
+        """True while a speedtest is in flight"""
+        return self._task is not None and not self._task.done()
+
+    def cached(self):
+        """Return the last result if it is still fresh, else None"""
+        if self.shared and (self._result is None or self._result.age >= self.ttl):
+            stored = storage.kv_get('speedtest', 'result')
+            if stored is not None:
+                self._result = SpeedtestResult(**json.loads(stored))
+        if self._result is not None and self._result.age < self.ttl:
+            return self._result
+        return None
+
+    async def run(self, force=False):
+        """Return a fresh cached result, or join (or start) the in-flight run"""
+        if not force:
+            result = self.cached()
+            if result is not None:
+                return result
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+        # Shield so one caller being cancelled doesn't abort the shared run
+        return await asyncio.shield(self._task)
+
+    async def _run(self):
+        """Try each speedtest-cli command in turn until one succeeds"""
+        error = None
+        for command in self.commands:
+            returncode, stdout, stderr = await self._exec(command)
+            if returncode == 0:
+                self._result = SpeedtestResult(stdout, time.time())
+                if self.shared:
+                    value = json.dumps({'output': stdout, 'finished_at': self._result.finished_at})
+                    await asyncio.to_thread(storage.kv_write, [('speedtest', 'result', value)])
+                return self._result
+            error = stderr or stdout
+            logger.warning(f"{' '.join(command)} failed: {error.strip()}")
+        raise SpeedtestError(error)
+
+    async def _exec(self, command):
+        """Run one command, killing it if it exceeds the timeout"""
+        with tracing.span('subprocess', command=' '.join(command)) as span:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+            if span is not None:
+                span.attributes['returncode'] = process.returncode
+        return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+speedtest_service = SpeedtestService()
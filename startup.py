@@ -0,0 +1,172 @@
+"""
+Startup Module
+Startup profiler (time per import and init phase, time to first update),
+lazy module loading and a background warm-up once the bot accepts updates
+
+Run `python startup.py` to see how long each module takes to import.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import re
+import sys
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Imported first by bot.py, so this is close to process start
+STARTED = time.perf_counter()
+
+STARTUP_SECONDS = metrics.Gauge(
+    'bot_startup_seconds', 'Seconds spent in each startup phase, and until ready/first update', ('phase',)
+)
+
+# (phase, seconds) in the order they happened
+phases = []
+# Modules returned by lazy_import, loaded by warm_up() if nothing used them first
+lazy_modules = []
+_last_mark = STARTED
+_first_update_seen = False
+
+
+def record(phase, seconds):
+    """Record how long a startup phase took"""
+    phases.append((phase, seconds))
+    STARTUP_SECONDS.set(round(seconds, 6), phase)
+
+
+def mark(phase):
+    """Record the time since the previous mark as a phase"""
+    global _last_mark
+    now = time.perf_counter()
+    record(phase, now - _last_mark)
+    _last_mark = now
+
+
+def ready():
+    """Log the startup breakdown once the bot is accepting updates"""
+    elapsed = time.perf_counter() - STARTED
+    STARTUP_SECONDS.set(round(elapsed, 6), 'ready')
+    breakdown = ', '.join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in phases)
+    logger.info(f"Startup: accepting updates {elapsed:.2f}s after start ({breakdown})")
+
+
+def first_update():
+    """Record time to first update; called for every update, so the common path is one check"""
+    global _first_update_seen
+    if _first_update_seen:
+        return
+    _first_update_seen = True
+    elapsed = time.perf_counter() - STARTED
+    STARTUP_SECONDS.set(round(elapsed, 6), 'first_update')
+    logger.info(f"Startup: first update handled {elapsed:.2f}s after start")
+
+
+def lazy_import(name):
+    """
+    Return module name without executing it until an attribute is first used.
+
+    Warm lazy modules from the event loop thread only (see warm_up):
+    importlib's LazyLoader is not thread-safe before Python 3.12.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    lazy_modules.append(name)
+    return module
+
+
+async def warm_up(blocking=()):
+    """
+    Load lazy modules and run slow initializers in the background.
+
+    Lazy modules are loaded one at a time on the event loop, yielding in
+    between; blocking is a list of (name, function) run in a worker thread,
+    e.g. heavy SDK imports, so the loop keeps serving updates meanwhile.
+    """
+    start = time.perf_counter()
+    timings = []
+    for name in lazy_modules:
+        step = time.perf_counter()
+        try:
+            getattr(sys.modules[name], '__name__')  # First attribute access executes the module
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            continue
+        timings.append((name, time.perf_counter() - step))
+        await asyncio.sleep(0)
+    for name, function in blocking:
+        step = time.perf_counter()
+        try:
+            await asyncio.to_thread(function)
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            continue
+        timings.append((name, time.perf_counter() - step))
+    for name, seconds in timings:
+        record(f"warm {name}", seconds)
+    breakdown = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings)
+    logger.info(f"Startup: warm-up done in {time.perf_counter() - start:.2f}s ({breakdown})")
+
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def profile_imports(target='bot'):
+    """Import target in a fresh interpreter; return [(module, self µs, cumulative µs, depth)]"""
+    import subprocess  # Profiling only; kept off the bot's own import path
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    if result.returncode and not rows:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    return rows
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Report how long each module takes to import")
+    parser.add_argument('--target', default='bot', help="module to import (default: bot)")
+    parser.add_argument('--top', type=int, default=15, help="slowest modules to list")
+    args = parser.parse_args(argv)
+
+    rows = profile_imports(args.target)
+    total = next((cumulative for module, _, cumulative, _ in rows if module == args.target), 0)
+    print(f"import {args.target}: {total / 1000:.1f} ms\n")
+
+    # Direct imports of the target (listed just before it, one level deeper),
+    # then the slowest modules anywhere in the tree
+    index = next((i for i, row in enumerate(rows) if row[0] == args.target), 0)
+    direct = []
+    for row in reversed(rows[:index]):
+        if row[3] <= rows[index][3]:
+            break
+        if row[3] == rows[index][3] + 1:
+            direct.append(row)
+    print("Direct imports (cumulative):")
+    for module, _, cumulative, _ in sorted(direct, key=lambda row: -row[2]):
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+    print(f"\nSlowest modules (self time, top {args.top}):")
+    for module, self_us, _, _ in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {module}")
+
+
+if __name__ == '__main__':
+    main()
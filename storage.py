@@ -0,0 +1,283 @@
+"""
+Storage Module
+SQLite storage backend (WAL mode) for per-user bot data
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import DB_FILE
+except ImportError:
+    DB_FILE = "bot.db"
+
+# Pre-SQLite todo file, imported once on first use
+LEGACY_TODO_FILE = "todos.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS todos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS todos_user ON todos (user_id, id);
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    due_at REAL NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminders_pending ON reminders (status, due_at);
+CREATE INDEX IF NOT EXISTS reminders_user ON reminders (user_id, status, due_at);
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    tool TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (tool, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_buckets_updated ON rate_buckets (tool, updated_at);
+"""
+
+_connection = None
+_lock = threading.RLock()
+
+
+def get_connection():
+    """Return the shared SQLite connection, creating the schema on first use"""
+    global _connection
+    with _lock:
+        if _connection is None:
+            conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            _connection = conn
+            _migrate_legacy_todos()
+        return _connection
+
+
+@contextmanager
+def transaction():
+    """Run a block inside a write transaction, rolling back on error"""
+    conn = get_connection()
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def close():
+    """Close the shared connection"""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+
+def _migrate_legacy_todos():
+    """Import todos.json into SQLite once, then rename the old file"""
+    if not os.path.exists(LEGACY_TODO_FILE):
+        return
+    with transaction() as conn:
+        done = conn.execute(
+            "SELECT 1 FROM migrations WHERE name = 'todos_json'"
+        ).fetchone()
+        if done:
+            return
+        try:
+            with open(LEGACY_TODO_FILE, 'r') as f:
+                todos = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read {LEGACY_TODO_FILE} for migration: {e}")
+            return
+        now = time.time()
+        rows = [
+            (str(user_id), task, now)
+            for user_id, tasks in todos.items()
+            for task in tasks
+        ]
+        conn.executemany(
+            "INSERT INTO todos (user_id, task, created_at) VALUES (?, ?, ?)", rows
+        )
+        conn.execute(
+            "INSERT INTO migrations (name, applied_at) VALUES ('todos_json', ?)", (now,)
+        )
+    os.replace(LEGACY_TODO_FILE, f"{LEGACY_TODO_FILE}.migrated")
+    logger.info(f"Migrated {len(rows)} todos from {LEGACY_TODO_FILE}")
+
+
+def add_todo(user_id, task):
+    """Append a task to a user's todo list"""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO todos (user_id, task, created_at) VALUES (?, ?, ?)",
+            (str(user_id), task, time.time())
+        )
+
+
+def list_todos(user_id):
+    """Return a user's tasks in the order they were added"""
+    conn = get_connection()
+    with _lock:
+        rows = conn.execute(
+            "SELECT task FROM todos WHERE user_id = ? ORDER BY id", (str(user_id),)
+        ).fetchall()
+    return [task for (task,) in rows]
+
+
+def remove_todo(user_id, index):
+    """Remove a user's task by zero-based position; return it, or None if out of range"""
+    if index < 0:
+        return None
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT id, task FROM todos WHERE user_id = ? ORDER BY id LIMIT 1 OFFSET ?",
+            (str(user_id), index)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM todos WHERE id = ?", (row[0],))
+    return row[1]
+
+
+def add_reminder(user_id, chat_id, due_at, text):
+    """Store a pending reminder and return its id"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO reminders (user_id, chat_id, due_at, text, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (str(user_id), chat_id, due_at, text, time.time())
+        )
+    return cursor.lastrowid
+
+
+def get_reminder(reminder_id):
+    """Return (chat_id, text, status) for a reminder, or None"""
+    conn = get_connection()
+    with _lock:
+        return conn.execute(
+            "SELECT chat_id, text, status FROM reminders WHERE id = ?", (reminder_id,)
+        ).fetchone()
+
+
+def pending_reminders():
+    """Return (id, due_at, chat_id) for every pending reminder"""
+    conn = get_connection()
+    with _lock:
+        return conn.execute(
+            "SELECT id, due_at, chat_id FROM reminders WHERE status = 'pending'"
+        ).fetchall()
+
+
+def list_reminders(user_id):
+    """Return (id, due_at, text) for a user's pending reminders, soonest first"""
+    conn = get_connection()
+    with _lock:
+        return conn.execute(
+            "SELECT id, due_at, text FROM reminders "
+            "WHERE user_id = ? AND status = 'pending' ORDER BY due_at",
+            (str(user_id),)
+        ).fetchall()
+
+
+def set_reminder_status(reminder_id, status):
+    """Mark a reminder as sent, failed or cancelled"""
+    with transaction() as conn:
+        conn.execute("UPDATE reminders SET status = ? WHERE id = ?", (status, reminder_id))
+
+
+def cancel_reminder(user_id, reminder_id):
+    """Cancel one of a user's pending reminders; return True if it was pending"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE reminders SET status = 'cancelled' "
+            "WHERE id = ? AND user_id = ? AND status = 'pending'",
+            (reminder_id, str(user_id))
+        )
+    return cursor.rowcount > 0
+
+
+def take_token(tool, user_id, rate, burst):
+    """
+    Spend one of a user's tokens in a token bucket shared by all processes;
+    return seconds to wait if none is left. Refilled buckets are removed.
+    """
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM rate_buckets WHERE tool = ? AND user_id = ?",
+            (tool, str(user_id))
+        ).fetchone()
+        tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        conn.execute(
+            "INSERT OR REPLACE INTO rate_buckets (tool, user_id, tokens, updated_at) VALUES (?, ?, ?, ?)",
+            (tool, str(user_id), tokens - 1, now)
+        )
+        conn.execute(
+            "DELETE FROM rate_buckets WHERE tool = ? AND updated_at < ?", (tool, now - burst / rate)
+        )
+    return 0
+
+
+def kv_load(namespace):
+    """Return {key: value} for every record in a namespace"""
+    conn = get_connection()
+    with _lock:
+        return dict(conn.execute(
+            "SELECT key, value FROM kv WHERE namespace = ?", (namespace,)
+        ).fetchall())
+
+
+def kv_get(namespace, key):
+    """Return a record's value, or None"""
+    conn = get_connection()
+    with _lock:
+        row = conn.execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def kv_write(changes):
+    """Apply (namespace, key, value) changes in one transaction; a value of None deletes the record"""
+    now = time.time()
+    puts = [(namespace, key, value, now) for namespace, key, value in changes if value is not None]
+    deletes = [(namespace, key) for namespace, key, value in changes if value is None]
+    with transaction() as conn:
+        if puts:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)", puts
+            )
+        if deletes:
+            conn.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", deletes)
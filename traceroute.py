@@ -0,0 +1,265 @@
+"""
+Traceroute Module
+In-process traceroute that probes every hop at once with TTL-limited UDP
+datagrams, so a trace takes about one round trip instead of one per hop
+
+ICMP replies are read from each probe socket's error queue (IP_RECVERR, no
+privileges needed on Linux), or from a raw ICMP socket where that is not
+available.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import struct
+import time
+import ping
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import TRACEROUTE_MAX_HOPS
+except ImportError:
+    TRACEROUTE_MAX_HOPS = 30  # Highest TTL probed
+
+try:
+    from config import TRACEROUTE_TIMEOUT
+except ImportError:
+    TRACEROUTE_TIMEOUT = 3.0  # Seconds to wait for replies
+
+PROBES_PER_HOP = 2
+BASE_PORT = 33434
+PAYLOAD = b'rgpt-traceroute'.ljust(32, b'\x00')
+
+# Not exported by the socket module on every Python version
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+EXTENDED_ERROR = struct.Struct('=IBBBBII')
+
+# (family) -> ICMP type of "time exceeded" and of "destination unreachable"
+TIME_EXCEEDED = {socket.AF_INET: 11, socket.AF_INET6: 3}
+UNREACHABLE = {socket.AF_INET: 3, socket.AF_INET6: 1}
+PORT_UNREACHABLE = {socket.AF_INET: 3, socket.AF_INET6: 4}
+# Unreachable codes other than "port unreachable", shown like traceroute(8)
+UNREACHABLE_NOTES = {
+    socket.AF_INET: {0: '!N', 1: '!H', 2: '!P', 9: '!X', 10: '!X', 13: '!X'},
+    socket.AF_INET6: {0: '!N', 1: '!X', 3: '!H'},
+}
+
+
+class TracerouteError(Exception):
+    """Raised when no probe sockets can be opened"""
+
+
+class Hop:
+    """Replies received for one TTL"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.address = None
+        self.rtts = []
+        self.note = ''
+        self.reached = False
+        self.final = False  # Destination or an unreachable error: no hops beyond this
+
+    @property
+    def answered(self):
+        return self.address is not None
+
+
+class Traceroute:
+    """
+    One trace: a UDP socket per probe, all sent at once.
+
+    Each probe socket has its own TTL and source port, so a reply is matched
+    to its probe by the socket it arrives on (error queue) or by the source
+    port quoted in the ICMP payload (raw socket).
+    """
+
+    def __init__(self, address, max_hops=TRACEROUTE_MAX_HOPS, timeout=TRACEROUTE_TIMEOUT,
+                 probes=PROBES_PER_HOP):
+        self.address = address
+        self.family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+        self.max_hops = max_hops
+        self.timeout = timeout
+        self.probes = probes
+        self.hops = {ttl: Hop(ttl) for ttl in range(1, max_hops + 1)}
+        self.method = None
+        self.version = 0        # Bumped on every reply, so callers can redraw
+        self._sockets = {}      # source port -> (socket, hop, send time)
+        self._outstanding = 0
+        self._done = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._raw = None
+
+    async def run(self):
+        """Send every probe and wait until the path is known or the timeout passes"""
+        try:
+            self._open_sockets()
+            for port, (sock, hop, _) in list(self._sockets.items()):
+                try:
+                    sock.send(PAYLOAD)
+                    self._sockets[port] = (sock, hop, time.perf_counter())
+                except OSError as e:
+                    # e.g. no route: this probe will never be answered
+                    logger.debug(f"Traceroute probe (TTL {hop.ttl}) not sent: {e}")
+                    self._outstanding -= 1
+            try:
+                await asyncio.wait_for(self._done.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.close()
+        return self.result()
+
+    def _open_sockets(self):
+        level, option = (
+            (socket.IPPROTO_IP, IP_RECVERR) if self.family == socket.AF_INET
+            else (socket.IPPROTO_IPV6, IPV6_RECVERR)
+        )
+        ttl_option = (
+            (socket.IPPROTO_IP, socket.IP_TTL) if self.family == socket.AF_INET
+            else (socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS)
+        )
+        use_errqueue = True
+        try:
+            for ttl, hop in self.hops.items():
+                for n in range(self.probes):
+                    sock = socket.socket(self.family, socket.SOCK_DGRAM)
+                    try:
+                        sock.setblocking(False)
+                        if use_errqueue:
+                            try:
+                                sock.setsockopt(level, option, 1)
+                            except OSError:
+                                use_errqueue = False
+                        sock.setsockopt(*ttl_option, ttl)
+                        sock.connect((self.address, BASE_PORT + ttl * self.probes + n))
+                        port = sock.getsockname()[1]
+                    except OSError:
+                        sock.close()
+                        raise
+                    self._sockets[port] = (sock, hop, None)
+                    if use_errqueue:
+                        self._loop.add_reader(sock.fileno(), self._on_error, port)
+            self._outstanding = len(self._sockets)
+            if use_errqueue:
+                self.method = 'UDP'
+            else:
+                self._raw = socket.socket(self.family, socket.SOCK_RAW, ping.ICMP_PROTOCOL[self.family])
+                self._raw.setblocking(False)
+                self._loop.add_reader(self._raw.fileno(), self._on_raw)
+                self.method = 'UDP (raw ICMP)'
+        except OSError as e:
+            self.close()
+            raise TracerouteError(f"cannot open probe sockets: {e}") from e
+
+    def close(self):
+        for sock, _, _ in self._sockets.values():
+            try:
+                self._loop.remove_reader(sock.fileno())
+            except (ValueError, OSError):
+                pass
+            sock.close()
+        self._sockets.clear()
+        if self._raw is not None:
+            self._loop.remove_reader(self._raw.fileno())
+            self._raw.close()
+            self._raw = None
+
+    def _on_error(self, port):
+        """Read an ICMP error from a probe socket's error queue"""
+        sock = self._sockets[port][0]
+        while True:
+            try:
+                _, ancdata, _, _ = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # A plain error (e.g. ECONNREFUSED) is reported once; drain it
+                try:
+                    sock.recv(512)
+                except OSError:
+                    pass
+                return
+            for _, _, data in ancdata:
+                if len(data) < EXTENDED_ERROR.size:
+                    continue
+                _, origin, icmp_type, code, _, _, _ = EXTENDED_ERROR.unpack_from(data)
+                if origin not in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+                    continue
+                offender = data[EXTENDED_ERROR.size:]
+                if self.family == socket.AF_INET:
+                    responder = socket.inet_ntop(socket.AF_INET, offender[4:8])
+                else:
+                    responder = socket.inet_ntop(socket.AF_INET6, offender[8:24])
+                self._record(port, responder, icmp_type, code)
+
+    def _on_raw(self):
+        """Match ICMP errors from the raw socket to probes by quoted source port"""
+        while True:
+            try:
+                data, peer = self._raw.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if self.family == socket.AF_INET:
+                data = data[(data[0] & 0x0F) * 4:]          # Outer IP header
+                if len(data) < 28:
+                    continue
+                inner = 8 + (data[8] & 0x0F) * 4             # Quoted IP header
+            else:
+                inner = 8 + 40                               # Quoted IPv6 header
+            if len(data) < inner + 4:
+                continue
+            port = struct.unpack_from('!H', data, inner)[0]
+            if port in self._sockets:
+                self._record(port, peer[0], data[0], data[1])
+
+    def _record(self, port, responder, icmp_type, code):
+        sock, hop, sent_at = self._sockets[port]
+        if sent_at is None or icmp_type not in (TIME_EXCEEDED[self.family], UNREACHABLE[self.family]):
+            return
+        hop.rtts.append(time.perf_counter() - sent_at)
+        hop.address = hop.address or responder
+        if icmp_type == UNREACHABLE[self.family]:
+            hop.final = True
+            if code == PORT_UNREACHABLE[self.family]:
+                hop.reached = True
+            else:
+                hop.note = UNREACHABLE_NOTES[self.family].get(code, f'!<{code}>')
+        # Each probe gets one answer
+        self._sockets[port] = (sock, hop, None)
+        self._outstanding -= 1
+        self.version += 1
+        if self._complete():
+            self._done.set()
+
+    def _complete(self):
+        if self._outstanding == 0:
+            return True
+        last = self.last_hop()
+        if last is None or not last.final:
+            return False
+        # Path is known once every hop up to the final one has answered
+        return all(self.hops[ttl].answered for ttl in range(1, last.ttl + 1))
+
+    def last_hop(self):
+        """The final hop if one has answered, else None"""
+        finals = [hop for hop in self.hops.values() if hop.final]
+        return min(finals, key=lambda hop: hop.ttl) if finals else None
+
+    def result(self):
+        """Hops up to the destination (or the last hop that answered)"""
+        last = self.last_hop()
+        if last is None:
+            answered = [hop.ttl for hop in self.hops.values() if hop.answered]
+            end = max(answered) if answered else 0
+        else:
+            end = last.ttl
+        return [self.hops[ttl] for ttl in range(1, end + 1)]
+
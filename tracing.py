@@ -0,0 +1,169 @@
+"""
+Tracing Module
+Per-update spans with child spans for outbound calls and subprocesses,
+a structured slow-update log and sampled trace export
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import TRACE_SLOW_MS
+except ImportError:
+    TRACE_SLOW_MS = 3000  # Updates slower than this are written to the slow log
+
+try:
+    from config import TRACE_SLOW_LOG_FILE
+except ImportError:
+    TRACE_SLOW_LOG_FILE = "slow_updates.log"  # JSON lines; set to None to log only
+
+try:
+    from config import TRACE_SAMPLE_RATE
+except ImportError:
+    TRACE_SAMPLE_RATE = 0.01  # Fraction of updates exported to TRACE_FILE
+
+try:
+    from config import TRACE_FILE
+except ImportError:
+    TRACE_FILE = "traces.jsonl"  # Set to None to disable trace export
+
+# Span of the update being handled by the current task
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed operation with attributes and child spans"""
+
+    __slots__ = ('name', 'attributes', 'start', 'wall_start', 'duration', 'error', 'children')
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+        self.error = None
+        self.children = []
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self, origin=None):
+        """Serialize the span tree; offsets are relative to the root span"""
+        origin = self.start if origin is None else origin
+        data = {
+            'name': self.name,
+            'offset_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+        }
+        if self.attributes:
+            data['attributes'] = self.attributes
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+def start_span(name, **attributes):
+    """
+    Start a child of the current span without making it current.
+
+    Returns None outside of a traced update. Used where the timed work spans
+    yields to other code (e.g. a streaming generator); call finish() when done.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    child = Span(name, attributes)
+    parent.children.append(child)
+    return child
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as a child of the current update's span.
+
+    Outside of a traced update this does nothing, so library code can be
+    instrumented unconditionally. Yields the span (or None) so callers can
+    add attributes once they are known.
+    """
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def _append_json_line(path, data):
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        logger.error(f"Could not write {path}: {e}")
+
+
+def _export(root):
+    slow = TRACE_SLOW_MS is not None and root.duration * 1000 >= TRACE_SLOW_MS
+    sampled = TRACE_FILE and random.random() < TRACE_SAMPLE_RATE
+    if not slow and not sampled:
+        return
+    record = {
+        'time': root.wall_start,
+        'pid': os.getpid(),
+        **root.to_dict(),
+    }
+    if slow:
+        breakdown = ', '.join(
+            f"{child.name} {(child.duration or 0) * 1000:.0f}ms" for child in root.children
+        )
+        logger.warning(
+            f"Slow update: {root.name} took {root.duration * 1000:.0f}ms"
+            + (f" ({breakdown})" if breakdown else "")
+        )
+        if TRACE_SLOW_LOG_FILE:
+            _append_json_line(TRACE_SLOW_LOG_FILE, record)
+    if sampled:
+        _append_json_line(TRACE_FILE, record)
+
+
+def traced(name, callback):
+    """Wrap a handler callback so each update it handles is recorded as a root span"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        attributes = {'handler': name}
+        if update is not None:
+            attributes['update_id'] = update.update_id
+            if update.effective_user:
+                attributes['user_id'] = update.effective_user.id
+            if update.effective_chat:
+                attributes['chat_id'] = update.effective_chat.id
+        root = Span(name, attributes)
+        token = _current_span.set(root)
+        try:
+            return await callback(update, context)
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            root.finish()
+            _current_span.reset(token)
+            _export(root)
+    return wrapper
@@ -0,0 +1,86 @@
+"""
+Weather Service Module
+Cached, coalesced lookups of current weather from WeatherAPI.com
+"""
+
+import asyncio
+import logging
+import re
+import time
+import http_client
+from cache import TTLCache
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WEATHER_URL = "https://api.weatherapi.com/v1/current.json"
+DEFAULT_LOCATION = "Addis Ababa, Ethiopia"
+
+# WeatherAPI refreshes current conditions every 15 minutes
+UPDATE_INTERVAL = 15 * 60
+MIN_TTL = 60
+
+# Maximum number of cities in one command
+MAX_LOCATIONS = 10
+
+
+class LocationNotFound(Exception):
+    """Raised when WeatherAPI does not recognise a location"""
+
+
+# Normalized location -> WeatherAPI current.json response
+weather_cache = TTLCache(maxsize=2048, ttl=UPDATE_INTERVAL)
+metrics.register_cache('weather', weather_cache)
+
+
+def normalize_location(location):
+    """Normalize a location name so equivalent spellings share a cache entry"""
+    return re.sub(r'\s+', ' ', location.casefold()).strip()
+
+
+def parse_locations(text):
+    """Split user input into locations; cities are separated by ';' or new lines"""
+    locations = []
+    seen = set()
+    for part in re.split(r'[;\n]', text or ''):
+        part = part.strip()
+        if part and normalize_location(part) not in seen:
+            seen.add(normalize_location(part))
+            locations.append(part)
+    return locations[:MAX_LOCATIONS]
+
+
+def _ttl_for(data):
+    """Expire an entry when the provider is due to publish its next update"""
+    updated = data.get('current', {}).get('last_updated_epoch')
+    if not updated:
+        return UPDATE_INTERVAL
+    return max(MIN_TTL, updated + UPDATE_INTERVAL - time.time())
+
+
+async def get_current(location):
+    """Return current weather data for a location, from cache when fresh"""
+    from config import WEATHERAPI_KEY
+
+    async def fetch():
+        params = {
+            'key': WEATHERAPI_KEY,
+            'q': location,
+            'aqi': 'no'
+        }
+        response = await http_client.get(WEATHER_URL, params=params, timeout=10)
+        if response.status_code == 400:
+            error = response.json().get('error', {})
+            raise LocationNotFound(error.get('message', f"No matching location for {location}"))
+        response.raise_for_status()
+        return response.json()
+
+    return await weather_cache.get_or_fetch(normalize_location(location), fetch, ttl=_ttl_for)
+
+
+async def get_many(locations):
+    """Fetch several locations concurrently; failures are returned as exceptions"""
+    return await asyncio.gather(
+        *(get_current(location) for location in locations),
+        return_exceptions=True
+    )
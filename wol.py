@@ -0,0 +1,157 @@
+"""
+Wake-on-LAN Module
+Magic packets for single machines or named groups, sent in repeated bursts
+from one async UDP socket, and polling until the woken machines answer
+"""
+
+import asyncio
+import logging
+import re
+import socket
+import time
+import dns_resolver
+import ping
+import tracing
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import WOL_BROADCASTS
+except ImportError:
+    WOL_BROADCASTS = ['255.255.255.255']  # Broadcast addresses, e.g. ['192.168.1.255']
+
+try:
+    from config import WOL_GROUPS
+except ImportError:
+    WOL_GROUPS = {}  # Group name -> list of {'mac': ..., 'host': ..., 'name': ...}
+
+try:
+    from config import WOL_PORT
+except ImportError:
+    WOL_PORT = 9  # UDP port magic packets are sent to
+
+try:
+    from config import WOL_REPEAT
+except ImportError:
+    WOL_REPEAT = 3  # Bursts sent, in case a packet is dropped
+
+try:
+    from config import WOL_VERIFY_TIMEOUT
+except ImportError:
+    WOL_VERIFY_TIMEOUT = 180  # Seconds to wait for woken machines to answer
+
+# Seconds between bursts, and between verification rounds
+WOL_REPEAT_INTERVAL = 0.2
+WOL_VERIFY_INTERVAL = 5.0
+WOL_VERIFY_PROBE_TIMEOUT = 1.0
+
+MAC_RE = re.compile(r'^[0-9A-F]{12}$')
+
+
+class Target:
+    """A machine to wake, with an optional host to poll once it is awake"""
+
+    def __init__(self, mac, host=None, name=None):
+        self.mac = mac
+        self.host = host
+        self.name = name or host or mac
+        self.online = False
+        self.online_after = None  # Seconds from wake to first reply
+        self.error = None         # Why the target cannot be checked, e.g. 'cannot resolve'
+
+    @property
+    def verifiable(self):
+        return self.host is not None
+
+
+def parse_mac(text):
+    """Return the MAC as 'AA:BB:CC:DD:EE:FF', or None if it is not a MAC address"""
+    mac = text.replace(':', '').replace('-', '').replace('.', '').replace(' ', '').upper()
+    if not MAC_RE.match(mac):
+        return None
+    return ':'.join(mac[i:i + 2] for i in range(0, 12, 2))
+
+
+def group_targets(name):
+    """Targets of a configured group (case-insensitive), or None if there is no such group"""
+    for group, members in WOL_GROUPS.items():
+        if group.lower() == name.lower():
+            targets = []
+            for member in members:
+                if isinstance(member, str):
+                    member = {'mac': member}
+                mac = parse_mac(member['mac'])
+                if mac is None:
+                    logger.error(f"Invalid MAC {member['mac']} in WOL_GROUPS[{group!r}]")
+                    continue
+                targets.append(Target(mac, member.get('host'), member.get('name')))
+            return targets
+    return None
+
+
+def magic_packet(mac):
+    """Six 0xFF bytes followed by the MAC sixteen times"""
+    return b'\xff' * 6 + bytes.fromhex(mac.replace(':', '')) * 16
+
+
+async def send(macs, broadcasts=None, repeat=WOL_REPEAT, interval=WOL_REPEAT_INTERVAL):
+    """Send magic packets for every MAC to every broadcast address, repeat times; return packets sent"""
+    broadcasts = broadcasts or WOL_BROADCASTS
+    packets = [magic_packet(mac) for mac in macs]
+    loop = asyncio.get_running_loop()
+    sent = 0
+    with tracing.span('wol send', machines=len(macs), repeat=repeat), \
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.setblocking(False)
+        for burst in range(repeat):
+            if burst:
+                await asyncio.sleep(interval)
+            for packet in packets:
+                for address in broadcasts:
+                    try:
+                        await loop.sock_sendto(sock, packet, (address, WOL_PORT))
+                        sent += 1
+                    except OSError as e:
+                        logger.warning(f"WOL packet to {address} failed: {e}")
+    if not sent:
+        raise OSError(f"no magic packets could be sent to {', '.join(broadcasts)}")
+    return sent
+
+
+async def verify(targets, on_change=None, timeout=WOL_VERIFY_TIMEOUT, interval=WOL_VERIFY_INTERVAL):
+    """
+    Poll every verifiable target at once each interval until all answer or timeout passes.
+
+    Hosts are resolved once, and targets that do not resolve are not polled
+    (their error is set); on_change() is awaited whenever a target comes online.
+    """
+    verifiable = [target for target in targets if target.verifiable]
+    addresses = {}
+    resolved = await asyncio.gather(
+        *(dns_resolver.resolve(target.host) for target in verifiable), return_exceptions=True
+    )
+    for target, address in zip(verifiable, resolved):
+        if isinstance(address, Exception):
+            logger.warning(f"Cannot resolve WOL target {target.host}: {address}")
+            target.error = 'cannot resolve'
+        else:
+            addresses[target] = address
+    pending = [target for target in verifiable if target in addresses]
+    start = time.perf_counter()
+    with tracing.span('wol verify', machines=len(pending)):
+        while pending and time.perf_counter() - start < timeout:
+            round_start = time.perf_counter()
+            results = await asyncio.gather(*(
+                ping.ping_address(addresses[target], count=1, timeout=WOL_VERIFY_PROBE_TIMEOUT)
+                for target in pending
+            ))
+            woke = [target for target, result in zip(pending, results) if result.alive]
+            for target in woke:
+                target.online = True
+                target.online_after = time.perf_counter() - start
+                pending.remove(target)
+            if woke and on_change is not None:
+                await on_change()
+            if pending:
+                await asyncio.sleep(max(0, interval - (time.perf_counter() - round_start)))
@@ -0,0 +1,258 @@
+"""
+Workers Module
+Multi-process mode: a front process receives updates (polling or webhook)
+and routes each one by chat id to one of WORKERS worker processes over a
+socketpair, so every chat is served by the same worker, in order
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import socket
+import struct
+import httpx
+import http_client
+import metrics
+import ratelimit
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import WORKERS
+except ImportError:
+    WORKERS = 0  # Worker processes (e.g. one per core); 0 or 1 runs everything in one process
+
+TELEGRAM_API = 'https://api.telegram.org'
+POLL_TIMEOUT = 30   # Seconds Telegram holds a getUpdates long poll open
+POLL_RETRY = 5      # Seconds to wait after a failed poll
+STOP_TIMEOUT = 30   # Seconds workers get to finish their pending updates at shutdown
+METRICS_INTERVAL = 5  # Seconds between metrics snapshots sent by each worker to the front
+
+# Updates waiting for their chat's turn hold a slot too, so allow plenty
+MAX_CONCURRENT_UPDATES = 4096
+
+# Frames on the worker sockets: 4-byte big-endian length, then JSON (updates
+# to the worker, metrics snapshots back to the front)
+FRAME = struct.Struct('!I')
+
+
+def route_key(data):
+    """Chat id of a raw update (user id for chatless updates such as inline queries), or None"""
+    for field, value in data.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+    return None
+
+
+def worker_for(key, count):
+    """Index of the worker that serves a chat (or user) id"""
+    return key % count
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    """
+    Processes updates of different chats concurrently and the updates of one
+    chat one at a time, in the order they arrived.
+    """
+
+    def __init__(self, max_concurrent_updates=MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}  # Chat id -> [lock, updates holding or waiting for it]
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None) or getattr(update, 'effective_user', None)
+        if chat is None:
+            await coroutine
+            return
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters first in, first out
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def _write_frame(writer, data):
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    writer.write(FRAME.pack(len(payload)) + payload)
+
+
+async def _read_frames(reader):
+    """Yield decoded frames until the other end closes the socket"""
+    while True:
+        try:
+            header = await reader.readexactly(FRAME.size)
+            payload = await reader.readexactly(FRAME.unpack(header)[0])
+        except asyncio.IncompleteReadError:
+            return
+        yield json.loads(payload)
+
+
+async def _send_metrics(writer, index):
+    """Send this worker's metrics to the front process every METRICS_INTERVAL"""
+    while True:
+        _write_frame(writer, metrics.collect((('worker', index),)))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            return  # The front is shutting down
+        await asyncio.sleep(METRICS_INTERVAL)
+
+
+async def receive(sock, index):
+    """
+    Yield the updates (raw dicts) the front process sends until it closes the
+    socket; meanwhile report this worker's metrics back over the same socket.
+    """
+    reader, writer = await asyncio.open_connection(sock=sock)
+    reporter = asyncio.create_task(_send_metrics(writer, index))
+    try:
+        async for data in _read_frames(reader):
+            yield data
+    finally:
+        reporter.cancel()
+        writer.close()
+
+
+def _worker_main(target, index, count, sock, slots):
+    """Worker process entry point"""
+    # Ctrl+C reaches the whole process group; workers stop when the front closes their socket
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ratelimit.use_shared_slots(slots)
+    asyncio.run(target(index, count, receive(sock, index)))
+
+
+class Worker:
+    """The front process's handle on one worker process"""
+
+    def __init__(self, index, process, reader, writer):
+        self.index = index
+        self.process = process
+        self.writer = writer
+        self.metrics = []  # Latest metrics families reported by the worker
+        self._reader = asyncio.create_task(self._read_metrics(reader))
+
+    async def _read_metrics(self, reader):
+        async for families in _read_frames(reader):
+            self.metrics = families
+
+
+class Front:
+    """
+    Starts the worker processes and routes updates to them.
+
+    target(index, count, updates) is the coroutine function each worker runs;
+    updates is an async iterator of raw update dicts. It must be importable
+    by name, as workers are started with the 'spawn' method.
+
+    Workers' metrics are exported with this process's on /metrics, labelled
+    worker="<index>" and at most METRICS_INTERVAL old.
+    """
+
+    def __init__(self, count, target):
+        self.count = count
+        self.target = target
+        self.workers = []
+        self.slots = {}
+        metrics.add_source(self.worker_metrics)
+
+    async def start(self):
+        context = multiprocessing.get_context('spawn')
+        # Rate limit concurrency caps are shared by all workers; kept here, as
+        # the semaphores are destroyed when no process references them
+        self.slots = ratelimit.create_shared_slots(context)
+        for index in range(self.count):
+            parent, child = socket.socketpair()
+            process = context.Process(
+                target=_worker_main, args=(self.target, index, self.count, child, self.slots), name=f"worker-{index}"
+            )
+            process.start()
+            child.close()
+            reader, writer = await asyncio.open_connection(sock=parent)
+            self.workers.append(Worker(index, process, reader, writer))
+        logger.info(f"Started {self.count} worker processes")
+
+    async def dispatch(self, data):
+        """Send a raw update to the worker of its chat"""
+        key = route_key(data)
+        worker = self.workers[worker_for(data.get('update_id', 0) if key is None else key, self.count)]
+        _write_frame(worker.writer, data)
+        await worker.writer.drain()
+
+    def worker_metrics(self):
+        """Latest metrics families of all workers (see metrics.add_source)"""
+        return [family for worker in self.workers for family in worker.metrics]
+
+    async def wait_exited(self):
+        """Return the first worker whose process exits"""
+        sentinels = {worker.process.sentinel: worker for worker in self.workers}
+        ready = await asyncio.to_thread(multiprocessing.connection.wait, list(sentinels))
+        return sentinels[ready[0]]
+
+    async def stop(self):
+        """Close the worker sockets and wait for the workers to finish their pending updates"""
+        for worker in self.workers:
+            worker.writer.close()
+        await asyncio.gather(*(asyncio.to_thread(worker.process.join, STOP_TIMEOUT) for worker in self.workers))
+        for worker in self.workers:
+            worker._reader.cancel()
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.index} did not stop within {STOP_TIMEOUT}s, terminating it")
+                worker.process.terminate()
+        self.workers = []
+
+
+async def poll(token, dispatch, allowed_updates=None):
+    """
+    Long-poll getUpdates and dispatch every update in order, until cancelled.
+
+    Raw JSON is passed on without building telegram objects; parsing happens
+    in the workers. Updates already dispatched are confirmed when cancelled.
+    """
+    url = f"{TELEGRAM_API}/bot{token}/getUpdates"
+    client = http_client.get_client()
+    params = {'timeout': POLL_TIMEOUT}
+    if allowed_updates is not None:
+        params['allowed_updates'] = json.dumps(list(allowed_updates))
+    try:
+        while True:
+            try:
+                response = await client.get(url, params=params, timeout=POLL_TIMEOUT + 10)
+                result = response.json()
+                if not result.get('ok'):
+                    raise ValueError(result.get('description', response.status_code))
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"getUpdates failed: {e!r}")
+                await asyncio.sleep(POLL_RETRY)
+                continue
+            for data in result['result']:
+                await dispatch(data)
+                params['offset'] = data['update_id'] + 1
+    finally:
+        if 'offset' in params:
+            try:
+                await client.get(url, params={'offset': params['offset'], 'timeout': 0}, timeout=10)
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not confirm the last updates: {e!r}")